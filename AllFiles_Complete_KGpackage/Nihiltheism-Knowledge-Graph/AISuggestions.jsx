@@ -21,6 +21,7 @@ import {
   FileText
 } from 'lucide-react';
 import graphStore from '../store/graphStore'; // Import the graph store
+import graphSync from '../store/graphSync'; // Server copy of the graph, referenced by id and version
 
 const AISuggestions = ({ onClose }) => {
   const [isVisible, setIsVisible] = useState(true);
@@ -66,12 +67,13 @@ const AISuggestions = ({ onClose }) => {
     setError(null);
     
     try {
+      const graph = await graphSync.reference();
       const response = await fetch("http://localhost:5000/api/suggest", {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
         },
-        body: JSON.stringify({ graphData: graphStore.toVisualizationFormat() })
+        body: JSON.stringify({ graph_id: graph.graph_id, version: graph.version })
       });
       
       if (!response.ok) {
@@ -95,6 +97,7 @@ const AISuggestions = ({ onClose }) => {
     setError(null);
     
     try {
+      const graph = await graphSync.reference();
       const response = await fetch("http://localhost:5000/api/analyze-text", {
         method: 'POST',
         headers: {
@@ -102,7 +105,8 @@ const AISuggestions = ({ onClose }) => {
         },
         body: JSON.stringify({
           text: customText,
-          graphData: graphStore.toVisualizationFormat()
+          graph_id: graph.graph_id,
+          version: graph.version
         })
       });
       
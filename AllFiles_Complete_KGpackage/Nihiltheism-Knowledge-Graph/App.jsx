@@ -12,6 +12,7 @@ import WelcomePanel from './components/WelcomePanel';
 import ExpansionControls from './components/ExpansionControls';
 import AIBrainChat from './components/AIBrainChat';
 import graphStore from './store/graphStore';
+import graphSync from './store/graphSync';
 
 function App() {
   const [selectedNode, setSelectedNode] = useState(null);
@@ -24,6 +25,7 @@ function App() {
   const [showExpansion, setShowExpansion] = useState(false);
   const [showAIBrain, setShowAIBrain] = useState(false);
   const [graphData, setGraphData] = useState(graphStore.toVisualizationFormat());
+  const [layout, setLayout] = useState(null);
 
   useEffect(() => {
     const unsubscribe = graphStore.subscribe(() => {
@@ -32,6 +34,41 @@ function App() {
     return () => unsubscribe();
   }, []);
 
+  // Server-computed positions for the current graph, so the browser renders instead of
+  // simulating; a large first layout answers 202 while it is built, so poll until it is ready.
+  // The previous layout stays up meanwhile, and without one the graph falls back to simulating
+  useEffect(() => {
+    let cancelled = false;
+    let retry = null;
+
+    const fetchLayout = async () => {
+      try {
+        const graph = await graphSync.reference();
+        if (cancelled) return;
+        const response = await fetch(
+          `http://localhost:5000/api/brain/graph/${graph.graph_id}/layout?version=${graph.version}`
+        );
+        if (cancelled) return;
+        if (response.status === 202) {
+          const seconds = Number(response.headers.get('Retry-After')) || 2;
+          retry = setTimeout(fetchLayout, seconds * 1000);
+          return;
+        }
+        if (!response.ok) throw new Error('Failed to fetch layout');
+        const data = await response.json();
+        if (!cancelled) setLayout(data.layout);
+      } catch (err) {
+        console.error('Error fetching graph layout:', err);
+      }
+    };
+
+    fetchLayout();
+    return () => {
+      cancelled = true;
+      clearTimeout(retry);
+    };
+  }, [graphData]);
+
   const handleNodeClick = (node) => {
     setSelectedNode(node);
     setShowWelcome(false);
@@ -77,6 +114,7 @@ function App() {
           showLabels={showLabels}
           onRandomNode={handleRandomNode}
           onCenterGraph={handleCenterGraph}
+          layout={layout}
         />
       </div>
 
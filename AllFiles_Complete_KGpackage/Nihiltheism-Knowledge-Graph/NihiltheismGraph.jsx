@@ -1,4 +1,4 @@
-import React, { useRef, useEffect, useState, useCallback } from 'react';
+import React, { useRef, useEffect, useState, useCallback, useMemo } from 'react';
 import ForceGraph2D from 'react-force-graph-2d';
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from '@/components/ui/card';
 import { Button } from '@/components/ui/button';
@@ -15,7 +15,8 @@ const NihiltheismGraph = ({
   showLabels = true,
   onRandomNode,
   onCenterGraph,
-  onGraphDataUpdate // New prop to notify parent of graph data changes
+  onGraphDataUpdate, // New prop to notify parent of graph data changes
+  layout // Optional server-computed positions { ids, x, y } from /api/brain/graph/<id>/layout
 }) => {
   const fgRef = useRef();
   const [graphData, setGraphData] = useState(graphStore.toVisualizationFormat());
@@ -52,18 +53,38 @@ const NihiltheismGraph = ({
     return () => unsubscribe();
   }, [onGraphDataUpdate]);
 
+  // Copies of the nodes pinned at server-computed positions, so the browser does not simulate
+  // the layout; links are copied too and refer to nodes by id, so they bind to the copies
+  const positionedData = useMemo(() => {
+    if (!layout) return graphData;
+    const positions = new Map(layout.ids.map((id, i) => [id, [layout.x[i], layout.y[i]]]));
+    return {
+      nodes: graphData.nodes.map(node => {
+        const position = positions.get(node.id);
+        return position
+          ? { ...node, x: position[0], y: position[1], fx: position[0], fy: position[1] }
+          : { ...node };
+      }),
+      links: graphData.links.map(link => ({
+        ...link,
+        source: link.source.id || link.source,
+        target: link.target.id || link.target
+      }))
+    };
+  }, [layout, graphData]);
+
   // Filter data based on category filters
   const filteredData = {
     nodes: categoryFilters.length > 0
-      ? graphData.nodes.filter(node => categoryFilters.includes(node.category))
-      : graphData.nodes,
+      ? positionedData.nodes.filter(node => categoryFilters.includes(node.category))
+      : positionedData.nodes,
     links: categoryFilters.length > 0
-      ? graphData.links.filter(link => {
-          const sourceNode = graphData.nodes.find(n => n.id === (link.source.id || link.source));
-          const targetNode = graphData.nodes.find(n => n.id === (link.target.id || link.target));
+      ? positionedData.links.filter(link => {
+          const sourceNode = positionedData.nodes.find(n => n.id === (link.source.id || link.source));
+          const targetNode = positionedData.nodes.find(n => n.id === (link.target.id || link.target));
           return categoryFilters.includes(sourceNode?.category) && categoryFilters.includes(targetNode?.category);
         })
-      : graphData.links
+      : positionedData.links
   };
 
   // Search functionality
@@ -142,7 +163,7 @@ const NihiltheismGraph = ({
       const connectedNodes = new Set([node.id]);
       const connectedLinks = new Set();
 
-      graphData.links.forEach(link => {
+      positionedData.links.forEach(link => {
         const sourceId = link.source.id || link.source;
         const targetId = link.target.id || link.target;
 
@@ -159,7 +180,7 @@ const NihiltheismGraph = ({
       setHighlightNodes(new Set());
       setHighlightLinks(new Set());
     }
-  }, [graphData]);
+  }, [positionedData]);
 
   const paintNode = useCallback((node, ctx, globalScale) => {
     const isHighlighted = highlightNodes.has(node.id);
@@ -468,7 +489,7 @@ const NihiltheismGraph = ({
         linkDirectionalParticleWidth={2}
         d3AlphaDecay={0.02}
         d3VelocityDecay={0.3}
-        cooldownTicks={100}
+        cooldownTicks={layout ? 0 : 100}
         backgroundColor="#0f172a"
         width={window.innerWidth}
         height={window.innerHeight}
@@ -1,7 +1,12 @@
 from flask import Blueprint, request, jsonify
+from werkzeug.exceptions import HTTPException
 import json
 import re
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+
+from ..store.graph_store import graph_store, GraphVersion, GraphNotFoundError, VersionConflictError
+from ..core.link_prediction import LinkPredictor
+from ..core.compact_graph import CompactGraph
 
 ai_bp = Blueprint('ai_suggestions', __name__)
 
@@ -58,9 +63,10 @@ class PhilosophicalAnalyzer:
             "presupposes", "implies", "entails", "grounds", "undermines", "supports"
         ]
 
-    def analyze_graph_gaps(self, graph_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    def analyze_graph_gaps(self, graph_data: Dict[str, Any], graph: Optional[GraphVersion] = None) -> List[Dict[str, Any]]:
         """Analyze the current graph to identify conceptual gaps and suggest new nodes."""
-        existing_concepts = {node['label'].lower() for node in graph_data['nodes']}
+        graph = graph or GraphVersion.from_data(graph_data)
+        existing_concepts = set(CompactGraph.for_graph(graph).labels_lower) - {''}
         suggestions = []
         
         # Analyze missing core philosophical concepts
@@ -79,7 +85,7 @@ class PhilosophicalAnalyzer:
                     })
         
         # Suggest connections between existing nodes
-        connection_suggestions = self._suggest_connections(graph_data)
+        connection_suggestions = self._suggest_connections(graph_data, graph)
         suggestions.extend(connection_suggestions)
         
         # Sort by relevance score
@@ -152,28 +158,37 @@ class PhilosophicalAnalyzer:
         else:
             return f"This concept would expand the nihiltheistic framework by introducing {concept} as a key philosophical dimension."
 
-    def _suggest_connections(self, graph_data: Dict[str, Any]) -> List[Dict[str, Any]]:
-        """Suggest new connections between existing nodes."""
-        nodes = graph_data['nodes']
-        existing_links = {(link['source'], link['target']) for link in graph_data['links']}
+    def _suggest_connections(
+        self,
+        graph_data: Dict[str, Any],
+        graph: Optional[GraphVersion] = None,
+        limit: int = 10
+    ) -> List[Dict[str, Any]]:
+        """Suggest new connections between existing nodes from link prediction scores."""
+        graph = graph or GraphVersion.from_data(graph_data)
+        predictor = LinkPredictor.for_graph(graph)
+        candidates = predictor.predict(limit, metric='adamic_adar')
+        scores = predictor.score_pairs([(source, target) for source, target, _ in candidates])
         suggestions = []
         
-        # Suggest connections based on philosophical relationships
-        for i, node1 in enumerate(nodes):
-            for j, node2 in enumerate(nodes[i+1:], i+1):
-                if (node1['id'], node2['id']) not in existing_links and (node2['id'], node1['id']) not in existing_links:
-                    relationship = self._infer_relationship(node1, node2)
-                    if relationship:
-                        suggestions.append({
-                            'type': 'connection',
-                            'source': node1['id'],
-                            'target': node2['id'],
-                            'source_label': node1['label'],
-                            'target_label': node2['label'],
-                            'relationship': relationship['type'],
-                            'relevance_score': relationship['score'],
-                            'reasoning': relationship['reasoning']
-                        })
+        for (source, target, _), score in zip(candidates, scores):
+            node1, node2 = graph.get_node(source), graph.get_node(target)
+            structural_score = min(0.4 + 0.1 * score['common_neighbors'] + 0.3 * score['jaccard'], 0.9)
+            reasoning = f"They share {int(score['common_neighbors'])} neighbouring concept(s) in the graph"
+            
+            # Name the relationship when a philosophical pattern applies
+            relationship = self._infer_relationship(node1, node2)
+            suggestions.append({
+                'type': 'connection',
+                'source': source,
+                'target': target,
+                'source_label': node1['label'],
+                'target_label': node2['label'],
+                'relationship': relationship['type'] if relationship else 'relates to',
+                'relevance_score': round(max(structural_score, relationship['score'] if relationship else 0), 3),
+                'scores': score,
+                'reasoning': f"{relationship['reasoning']}. {reasoning}" if relationship else reasoning
+            })
         
         return suggestions
 
@@ -202,15 +217,26 @@ class PhilosophicalAnalyzer:
         
         return None
 
+def resolve_request_graph(data: Dict[str, Any]):
+    """Resolve the request graph from the graph store (graph_id/version/patch) or inline graphData."""
+    graph = graph_store.resolve(
+        data.get('graphData'),
+        data.get('graph_id'),
+        data.get('version'),
+        data.get('patch')
+    )
+    return graph or GraphVersion.from_data({})
+
 @ai_bp.route('/suggest', methods=['POST'])
 def get_suggestions():
     """Get AI-powered suggestions for new nodes and connections."""
     try:
         data = request.get_json()
-        graph_data = data.get('graphData', {})
+        graph = resolve_request_graph(data)
         
+        # Gap analysis depends only on the graph, so stored versions compute it once
         analyzer = PhilosophicalAnalyzer()
-        suggestions = analyzer.analyze_graph_gaps(graph_data)
+        suggestions = graph.derived('gap_suggestions', lambda g: analyzer.analyze_graph_gaps(g.data, g))
         
         return jsonify({
             'success': True,
@@ -218,6 +244,21 @@ def get_suggestions():
             'total': len(suggestions)
         })
     
+    except GraphNotFoundError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 404
+    except VersionConflictError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 409
+    except HTTPException as e:
+        return jsonify({
+            'success': False,
+            'error': e.description
+        }), e.code
     except Exception as e:
         return jsonify({
             'success': False,
@@ -230,11 +271,11 @@ def analyze_text():
     try:
         data = request.get_json()
         text = data.get('text', '')
-        graph_data = data.get('graphData', {})
+        graph = resolve_request_graph(data)
         
         # Extract concepts from text using simple NLP
         concepts = extract_concepts_from_text(text)
-        existing_concepts = {node['label'].lower() for node in graph_data.get('nodes', [])}
+        existing_concepts = set(CompactGraph.for_graph(graph).labels_lower)
         
         new_concepts = []
         for concept in concepts:
@@ -254,6 +295,21 @@ def analyze_text():
             'total': len(new_concepts)
         })
     
+    except GraphNotFoundError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 404
+    except VersionConflictError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 409
+    except HTTPException as e:
+        return jsonify({
+            'success': False,
+            'error': e.description
+        }), e.code
     except Exception as e:
         return jsonify({
             'success': False,
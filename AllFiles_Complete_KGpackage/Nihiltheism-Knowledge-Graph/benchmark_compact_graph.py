@@ -0,0 +1,77 @@
+"""
+Compact Graph Memory Benchmark
+Compares bytes per node and per link of the JSON dict form against CompactGraph
+Usage: python benchmark_compact_graph.py [node_count]
+"""
+
+import sys
+import os
+import json
+import random
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from src.core.compact_graph import CompactGraph, deep_sizeof
+
+CATEGORIES = ['core', 'sub_concept', 'thinker', 'theme', 'text', 'tradition']
+COLORS = {'core': '#ef4444', 'sub_concept': '#3b82f6', 'thinker': '#10b981', 'theme': '#f59e0b', 'text': '#8b5cf6', 'tradition': '#6b7280'}
+RELATIONSHIPS = ['explores', 'critiques', 'leads to', 'confronts', 'reveals', 'influences']
+WORDS = ['void', 'nothingness', 'dread', 'transcendence', 'despair', 'divine', 'absurd', 'meaning', 'ego', 'silence']
+
+
+def synthetic_graph(node_count: int, links_per_node: int = 2, seed: int = 0):
+    """Graph data in the client JSON schema, as it arrives from JSON (no shared strings)"""
+    rng = random.Random(seed)
+    nodes = []
+    for i in range(node_count):
+        category = rng.choice(CATEGORIES)
+        words = rng.sample(WORDS, 2)
+        nodes.append({
+            'id': f'concept-{i}',
+            'label': f'{words[0].title()} {words[1].title()} {i}',
+            'description': f'How {words[0]} bears on {words[1]} in nihiltheistic thought',
+            'category': category,
+            'size': rng.choice([10, 15, 20, 25]),
+            'color': COLORS[category]
+        })
+    links = [
+        {
+            'source': f'concept-{i}',
+            'target': f'concept-{rng.randrange(node_count)}',
+            'relationship': rng.choice(RELATIONSHIPS)
+        }
+        for i in range(node_count) for _ in range(links_per_node)
+    ]
+    # Round trip through JSON so strings are not shared, as with a parsed request
+    return json.loads(json.dumps({'nodes': nodes, 'links': links}))
+
+
+def main(node_count: int = 50000):
+    """Print bytes per node and per link for both representations"""
+    print(f"📏 Compact graph memory benchmark ({node_count} nodes)...\n")
+
+    graph_data = synthetic_graph(node_count)
+    node_bytes = deep_sizeof(graph_data['nodes'])
+    link_bytes = deep_sizeof(graph_data['links'])
+
+    start = time.perf_counter()
+    compact = CompactGraph.from_data(graph_data)
+    build_seconds = time.perf_counter() - start
+    compact_bytes = compact.memory_usage()
+    # Attribute node and link columns separately for the per-item figures
+    link_columns = sum(deep_sizeof(column) for column in (
+        compact.sources, compact.targets, compact.link_positions, compact.relationship_codes, compact.link_extras
+    ))
+
+    assert compact.to_data() == graph_data
+
+    link_count = len(graph_data['links'])
+    print(f"{'':24}{'dict form':>12}{'compact':>12}")
+    print(f"{'bytes per node':24}{node_bytes / node_count:>12.1f}{(compact_bytes - link_columns) / node_count:>12.1f}")
+    print(f"{'bytes per link':24}{link_bytes / link_count:>12.1f}{link_columns / link_count:>12.1f}")
+    print(f"{'total MB':24}{(node_bytes + link_bytes) / 2 ** 20:>12.1f}{compact_bytes / 2 ** 20:>12.1f}")
+    print(f"\n✅ Built in {build_seconds:.2f}s (includes lowercase and normalised labels); round trip is lossless")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50000)
@@ -0,0 +1,205 @@
+"""
+Conversation Context Memory Benchmark
+Compares bytes per session of the former list-of-dicts history (copied on every message
+past max_history) against the ring buffer of slotted messages, and of full node-id graph
+snapshots against delta-encoded ones
+Usage: python benchmark_context_memory.py [session_count] [messages_per_session] [graph_nodes]
+"""
+
+import sys
+import os
+import json
+import random
+from itertools import chain
+import time
+from datetime import datetime
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from src.core.context_manager import ConversationContext, MAX_SNAPSHOTS, PHILOSOPHICAL_KEYWORDS
+from src.store.graph_store import GraphVersion
+from src.core.compact_graph import deep_sizeof
+
+ROLES = ['user', 'assistant']
+WORDS = ['void', 'nothingness', 'dread', 'transcendence', 'despair', 'divine', 'absurd', 'meaning', 'ego', 'silence']
+
+
+def synthetic_messages(count: int, seed: int = 0):
+    """(role, content, metadata) triples; roles arrive as fresh strings, as parsed from JSON"""
+    rng = random.Random(seed)
+    return [
+        (
+            ''.join(ROLES[i % 2]),
+            ' '.join(rng.choice(WORDS) for _ in range(rng.randint(5, 40))),
+            {'intent': 'analyze'} if i % 2 else None
+        )
+        for i in range(count)
+    ]
+
+
+class ListHistory:
+    """The former history: a list of message dicts, rebuilt by slicing once over max_history"""
+
+    def __init__(self, max_history: int = 50):
+        self.max_history = max_history
+        self.messages = []
+
+    def add_message(self, role, content, metadata=None):
+        self.messages.append({
+            'role': role,
+            'content': content,
+            'timestamp': datetime.now().isoformat(),
+            'metadata': metadata or {}
+        })
+        if len(self.messages) > self.max_history:
+            self.messages = self.messages[-self.max_history:]
+
+    def get_conversation_summary(self):
+        """The former summary: parses both end timestamps and rescans every message for topics"""
+        duration = (datetime.fromisoformat(self.messages[-1]['timestamp']) -
+                    datetime.fromisoformat(self.messages[0]['timestamp'])).total_seconds() / 60
+        topics = set()
+        for message in self.messages:
+            content_lower = message['content'].lower()
+            for keyword in PHILOSOPHICAL_KEYWORDS:
+                if keyword in content_lower:
+                    topics.add(keyword)
+        return {'message_count': len(self.messages), 'session_duration': f"{int(duration)} minutes", 'topics_discussed': list(topics)}
+
+
+def fill(factory, sessions: int, messages):
+    """
+    Sessions of the given history type, each fed the same messages and asked for a summary
+    after each one, as the message routes do; returns them and seconds per message
+    """
+    start = time.perf_counter()
+    histories = []
+    for _ in range(sessions):
+        history = factory()
+        for role, content, metadata in messages:
+            history.add_message(role, content, metadata)
+            history.get_conversation_summary()
+        histories.append(history)
+    return histories, (time.perf_counter() - start) / (sessions * len(messages))
+
+
+class ListSnapshots:
+    """The former snapshots: every one kept the full list of node ids and its id diff"""
+
+    def __init__(self):
+        self.graph_state_snapshots = []
+
+    def add_graph_snapshot(self, graph_data, operation, graph=None):
+        nodes = [node['id'] for node in graph_data.get('nodes', [])]
+        if self.graph_state_snapshots:
+            current, last = set(nodes), set(self.graph_state_snapshots[-1]['nodes'])
+            changes = {
+                'added_nodes': list(current - last),
+                'removed_nodes': list(last - current),
+                'node_count_delta': len(current) - len(last)
+            }
+        else:
+            changes = {'type': 'initial_state'}
+        self.graph_state_snapshots.append({
+            'timestamp': datetime.now().isoformat(),
+            'operation': operation,
+            'node_count': len(graph_data.get('nodes', [])),
+            'edge_count': len(graph_data.get('links', [])),
+            'nodes': nodes,
+            'recent_changes': changes
+        })
+        if len(self.graph_state_snapshots) > MAX_SNAPSHOTS:
+            self.graph_state_snapshots = self.graph_state_snapshots[-MAX_SNAPSHOTS:]
+
+
+def snapshot_sessions(factory, sessions: int, payload: str, steps: int):
+    """
+    Sessions that each parse their own copy of the graph and snapshot it after every patch;
+    returns them and seconds per first and per later snapshot. The last few versions stay
+    alive outside the sessions, as the graph store keeps them, and are not measured
+    """
+    contexts, first, later = [], 0.0, 0.0
+    for session in range(sessions):
+        rng = random.Random(session)
+        versions = [GraphVersion.from_data(json.loads(payload))]
+        context = factory()
+        for step in range(steps):
+            graph = versions[-1]
+            ids = rng.sample(list(graph.node_index), 5)
+            graph = graph.apply_patch({'nodes': {
+                'add': [{'id': f'session-{session}-{step}-{i}', 'label': 'New concept'} for i in range(20)],
+                'remove': ids
+            }}, step + 1)
+            versions = versions[-4:] + [graph]
+            start = time.perf_counter()
+            context.add_graph_snapshot(graph.data, 'user_query', graph)
+            if step:
+                later += time.perf_counter() - start
+            else:
+                first += time.perf_counter() - start
+        contexts.append(context)
+    return contexts, first / sessions, later / (sessions * (steps - 1))
+
+
+def session_bytes(contexts) -> float:
+    """Average bytes held by one whole session object, measured on its own (node-id strings and change summaries included)"""
+    return sum(deep_sizeof(context) for context in contexts) / len(contexts)
+
+
+def id_bytes(contexts) -> float:
+    """Average bytes of the node-id strings a session references"""
+    total = 0
+    for context in contexts:
+        seen = set()
+        for snapshot in context.graph_state_snapshots:
+            for node_id in chain(snapshot.get('nodes', ()), snapshot.get('nodes_added', ()), snapshot.get('nodes_removed', ())):
+                total += deep_sizeof(node_id, seen)
+    return total / len(contexts)
+
+
+def main(session_count: int = 200, messages_per_session: int = 500, graph_nodes: int = 50000):
+    """Print bytes per session and time per update for histories and graph snapshots"""
+    print(f"💬 Conversation context memory benchmark ({session_count} sessions x {messages_per_session} messages)...\n")
+
+    messages = synthetic_messages(messages_per_session)
+    # Message texts are shared by both histories; measure only what each adds around them
+    shared = set()
+    for _, content, _ in messages:
+        deep_sizeof(content, shared)
+
+    old, old_seconds = fill(ListHistory, session_count, messages)
+    new, new_seconds = fill(ConversationContext, session_count, messages)
+    old_bytes = deep_sizeof([history.messages for history in old], set(shared))
+    new_bytes = deep_sizeof([context.messages for context in new], set(shared))
+
+    assert [m['content'] for m in old[0].messages] == [m.content for m in new[0].messages]
+
+    print(f"{'':28}{'list of dicts':>16}{'ring buffer':>16}")
+    print(f"{'bytes per session':28}{old_bytes / session_count:>16.0f}{new_bytes / session_count:>16.0f}")
+    print(f"{'bytes per message':28}{old_bytes / (session_count * len(old[0].messages)):>16.1f}{new_bytes / (session_count * len(new[0].messages)):>16.1f}")
+    print(f"{'µs per message + summary':28}{old_seconds * 1e6:>16.2f}{new_seconds * 1e6:>16.2f}")
+    print(f"\n✅ Both keep the last {len(new[0].messages)} messages per session (message text excluded)")
+
+    sessions = 4
+    print(f"\n📸 Graph snapshot memory ({sessions} sessions, {graph_nodes} nodes, {MAX_SNAPSHOTS + 2} patches each)...\n")
+    payload = json.dumps({
+        'nodes': [{'id': f'concept-{i}', 'label': f'Concept {i}'} for i in range(graph_nodes)],
+        'links': []
+    })
+    old, old_first, old_later = snapshot_sessions(ListSnapshots, sessions, payload, MAX_SNAPSHOTS + 2)
+    new, new_first, new_later = snapshot_sessions(ConversationContext, sessions, payload, MAX_SNAPSHOTS + 2)
+    assert new[0].snapshot_nodes() == set(old[0].graph_state_snapshots[-1]['nodes'])
+
+    print(f"{'':28}{'full id lists':>16}{'deltas':>16}")
+    print(f"{'bytes per session':28}{session_bytes(old):>16.0f}{session_bytes(new):>16.0f}")
+    print(f"{'  of which node-id strings':28}{id_bytes(old):>16.0f}{id_bytes(new):>16.0f}")
+    print(f"{'ms for the first snapshot':28}{old_first * 1e3:>16.2f}{new_first * 1e3:>16.2f}")
+    print(f"{'ms per later snapshot':28}{old_later * 1e3:>16.2f}{new_later * 1e3:>16.2f}")
+    print(f"\n✅ Both keep {len(new[0].graph_state_snapshots)} snapshots per session (whole session objects measured)")
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 200,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 500,
+        int(sys.argv[3]) if len(sys.argv) > 3 else 50000
+    )
@@ -0,0 +1,128 @@
+"""
+Process Message Benchmark
+Time and traced memory per AIBrain.process_message call on a stored graph, the size of
+the timestamped session state it maintains (context bookkeeping and provenance records)
+and the cost of one stored timestamp as an epoch float against an ISO string
+Given a checkout of the tree before epoch timestamps (e.g. made with
+`git worktree add /tmp/before 34eb345^`), the same calls are measured in both trees
+Usage: python benchmark_process_message.py [call_count] [node_count] [baseline_dir]
+"""
+
+import sys
+import os
+import json
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime
+# The tree under test (BENCHMARK_SOURCE, set for baseline runs) takes precedence over this one
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.environ.get('BENCHMARK_SOURCE') or HERE)
+
+MESSAGES = [
+    "Brainstorm ideas about the void and transcendence",
+    "Analyze the relationship between despair and the divine",
+    "Evaluate the quality of these concepts",
+    "What about nothingness as a ground of meaning?"
+]
+
+
+def per_timestamp(make, count: int = 100000):
+    """Microseconds and traced bytes per timestamp kept by make()"""
+    start = time.perf_counter()
+    for _ in range(count):
+        make()
+    seconds = (time.perf_counter() - start) / count
+    tracemalloc.start()
+    kept = [make() for _ in range(count)]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return seconds * 1e6, size / len(kept)
+
+
+def measure(call_count: int, node_count: int):
+    """Time, traced and retained memory of process_message calls in the tree on sys.path"""
+    from src.core.ai_brain import AIBrain
+    from src.core.compact_graph import deep_sizeof
+    from src.core.provenance_tracker import provenance_tracker
+    from src.store.graph_store import graph_store
+    from benchmark_compact_graph import synthetic_graph
+
+    graph = graph_store.put_graph('benchmark-process-message', synthetic_graph(node_count))
+    brain = AIBrain("benchmark_process_message")
+    # Warm up derived indexes so only per-message work is measured
+    for message in MESSAGES:
+        brain.process_message(message, graph_id=graph.graph_id)
+
+    start = time.perf_counter()
+    for i in range(call_count):
+        brain.process_message(MESSAGES[i % len(MESSAGES)], graph_id=graph.graph_id)
+    seconds = (time.perf_counter() - start) / call_count
+
+    # Memory still traced after the calls is what they left behind (history, snapshots, provenance)
+    tracemalloc.start()
+    for i in range(call_count):
+        brain.process_message(MESSAGES[i % len(MESSAGES)], graph_id=graph.graph_id)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    context = brain.context
+    # The message text and graph are shared with the caller; count only the bookkeeping around them
+    shared = set()
+    for message in context.messages:
+        deep_sizeof(message.content, shared)
+    # Operations moved from a list of dicts to a registry; measure whichever the tree has
+    operations = getattr(context, 'operations', None) or context.active_operations
+    session_bytes = deep_sizeof([context.metadata, context.graph_state_snapshots, operations], set(shared))
+    session_bytes += sum(deep_sizeof((message.timestamp, message.metadata), set(shared)) for message in context.messages)
+    records = provenance_tracker.records.values()
+    record_bytes = deep_sizeof([(r.metadata, r.lineage, r.reviews) for r in records], set())
+
+    return {
+        'µs per call': seconds * 1e6,
+        'peak traced KB during the run': peak / 1024,
+        'retained traced bytes per call': retained / call_count,
+        'session bookkeeping bytes': session_bytes,
+        'bytes per provenance record': record_bytes / max(1, len(records))
+    }
+
+
+def measure_in(source: str, call_count: int, node_count: int):
+    """measure() run in a fresh interpreter against the tree at source"""
+    result = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--measure', str(call_count), str(node_count)],
+        env={**os.environ, 'BENCHMARK_SOURCE': source},
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main(call_count: int = 2000, node_count: int = 200, baseline: str = None):
+    """Print time, peak and retained memory per process_message call, before and after if given a baseline"""
+    print(f"🧠 process_message benchmark ({call_count} calls, {node_count}-node stored graph)...\n")
+
+    columns = [('before', measure_in(os.path.abspath(baseline), call_count, node_count))] if baseline else []
+    columns.append(('after' if baseline else 'current', measure_in(HERE, call_count, node_count)))
+
+    print(f"{'':40}" + ''.join(f"{name:>12}" for name, _ in columns))
+    for metric in columns[0][1]:
+        print(f"{metric:40}" + ''.join(f"{values[metric]:>12.1f}" for _, values in columns))
+
+    print()
+    for name, make in (('ISO string', lambda: datetime.now().isoformat()), ('epoch float', time.time)):
+        micros, size = per_timestamp(make)
+        print(f"{name + ' timestamp: µs / bytes':40}{micros:>12.2f}{size:>8.0f}")
+    print(f"\n✅ Measured {call_count} process_message calls per tree in a fresh interpreter")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ['--measure']:
+        print(json.dumps(measure(int(sys.argv[2]), int(sys.argv[3]))))
+    else:
+        main(
+            int(sys.argv[1]) if len(sys.argv) > 1 else 2000,
+            int(sys.argv[2]) if len(sys.argv) > 2 else 200,
+            sys.argv[3] if len(sys.argv) > 3 else None
+        )
@@ -0,0 +1,99 @@
+import graphStore from './graphStore';
+
+const GRAPH_API = 'http://localhost:5000/api/brain/graph';
+
+const linkKey = (link) => `${link.source}\u0000${link.target}\u0000${link.relationship}`;
+
+// Mirrors the local graph in the server-side graph store, so AI Brain requests can send a
+// graph_id and version instead of the whole graph and the server keeps its per-version indexes.
+// The first sync uploads the graph; later syncs PATCH only the nodes and links that changed.
+class GraphSync {
+  constructor(store) {
+    this.store = store;
+    this.graph = null; // { graph_id, version, node_count, edge_count } on the server
+    this.syncedVersion = null; // local store version the server graph reflects
+    this.syncedNodes = new Map(); // node id -> JSON as last sent
+    this.syncedLinks = new Map(); // link key -> JSON as last sent
+    this.queue = Promise.resolve();
+  }
+
+  // Reference to a server graph matching the local graph, syncing first if it changed.
+  // Calls are serialized, so concurrent requests never race each other's patches.
+  reference() {
+    const result = this.queue.then(() => this.sync());
+    this.queue = result.catch(() => {});
+    return result;
+  }
+
+  async sync() {
+    const localVersion = this.store.getState().version;
+    if (this.graph && localVersion === this.syncedVersion) return this.graph;
+
+    const data = this.store.toVisualizationFormat();
+    const nodes = new Map(data.nodes.map(node => [node.id, JSON.stringify(node)]));
+    const links = new Map(data.links.map(link => [linkKey(link), JSON.stringify(link)]));
+
+    if (this.graph) {
+      const patch = this.diff(data, nodes, links);
+      if (!patch) {
+        this.syncedVersion = localVersion;
+        return this.graph;
+      }
+      const response = await fetch(`${GRAPH_API}/${this.graph.graph_id}`, {
+        method: 'PATCH',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ base_version: this.graph.version, patch })
+      });
+      if (response.ok) {
+        this.remember((await response.json()).graph, localVersion, nodes, links);
+        return this.graph;
+      }
+      // The server lost the graph (restart, eviction) or it moved on: upload it afresh
+      if (response.status !== 404 && response.status !== 409) {
+        throw new Error('Failed to sync graph');
+      }
+    }
+
+    const response = await fetch(GRAPH_API, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ graph_data: data })
+    });
+    if (!response.ok) throw new Error('Failed to upload graph');
+    this.remember((await response.json()).graph, localVersion, nodes, links);
+    return this.graph;
+  }
+
+  // Patch from the last synced graph to the current one, or null if nothing changed.
+  // Changed nodes are re-added whole, so fields that were dropped do not linger.
+  diff(data, nodes, links) {
+    const changedNodes = data.nodes.filter(node => this.syncedNodes.get(node.id) !== nodes.get(node.id));
+    const removedNodes = [...this.syncedNodes.keys()].filter(id => !nodes.has(id));
+    const changedLinks = data.links.filter(link => this.syncedLinks.get(linkKey(link)) !== links.get(linkKey(link)));
+    const removedLinks = [...this.syncedLinks.keys()]
+      .filter(key => !links.has(key))
+      .map(key => {
+        const { source, target, relationship } = JSON.parse(this.syncedLinks.get(key));
+        return { source, target, relationship };
+      });
+
+    if (!changedNodes.length && !removedNodes.length && !changedLinks.length && !removedLinks.length) {
+      return null;
+    }
+    return {
+      nodes: { add: changedNodes, remove: removedNodes },
+      links: { add: changedLinks, remove: removedLinks }
+    };
+  }
+
+  remember(graph, localVersion, nodes, links) {
+    this.graph = graph;
+    this.syncedVersion = localVersion;
+    this.syncedNodes = nodes;
+    this.syncedLinks = links;
+  }
+}
+
+// Create singleton instance
+export const graphSync = new GraphSync(graphStore);
+export default graphSync;
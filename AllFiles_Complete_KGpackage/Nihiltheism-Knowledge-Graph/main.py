@@ -11,6 +11,7 @@ from src.routes.user import user_bp
 from src.routes.ai_suggestions import ai_bp
 # Import AI Brain routes
 from src.routes.ai_brain import ai_brain_bp, init_socketio
+from src.core.wire_format import init_wire_format
 
 app = Flask(__name__, static_folder='../static')
 app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
@@ -18,6 +19,9 @@ app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
 # Enable CORS for all routes
 CORS(app)
 
+# Accept and serve binary / compressed bodies when clients negotiate them
+init_wire_format(app)
+
 # Initialize SocketIO for WebSocket support
 socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading')
 
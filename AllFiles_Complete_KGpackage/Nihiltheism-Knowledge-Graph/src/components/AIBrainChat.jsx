@@ -20,6 +20,7 @@ import {
   AlertCircle
 } from 'lucide-react';
 import graphStore from '@/store/graphStore';
+import graphSync from '@/store/graphSync';
 
 const AIBrainChat = ({ onClose }) => {
   const [isVisible, setIsVisible] = useState(true);
@@ -31,18 +32,9 @@ const AIBrainChat = ({ onClose }) => {
   const [error, setError] = useState(null);
   const [suggestions, setSuggestions] = useState([]);
   const [contextSummary, setContextSummary] = useState(null);
-  const [graphData, setGraphData] = useState(graphStore.toVisualizationFormat());
   const messagesEndRef = useRef(null);
   const inputRef = useRef(null);
 
-  // Subscribe to graph updates
-  useEffect(() => {
-    const unsubscribe = graphStore.subscribe(() => {
-      setGraphData(graphStore.toVisualizationFormat());
-    });
-    return () => unsubscribe();
-  }, []);
-
   // Initialize session on mount
   useEffect(() => {
     initializeSession();
@@ -97,13 +89,16 @@ const AIBrainChat = ({ onClose }) => {
     setMessages(prev => [...prev, newUserMessage]);
 
     try {
+      // Reference the server's copy of the graph, so its indexes are reused between messages
+      const graph = await graphSync.reference();
       const response = await fetch('http://localhost:5000/api/brain/message', {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({
           session_id: sessionId,
           message: userMessage,
-          graph_data: graphData
+          graph_id: graph.graph_id,
+          version: graph.version
         })
       });
 
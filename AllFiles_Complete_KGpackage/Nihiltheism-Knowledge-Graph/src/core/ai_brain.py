@@ -14,6 +14,20 @@ from .provenance_tracker import (
     ProvenanceType, 
     QualityLevel
 )
+from ..store.graph_store import graph_store, GraphVersion
+from .graph_index import AdjacencyIndex
+from .search_index import SearchIndex
+from .trigram_index import TrigramIndex
+from .label_automaton import LabelAutomaton
+from .graph_analytics import GraphAnalytics
+from .graph_metrics import GraphMetrics
+from .community_detection import community_service, community_suggestions
+from .link_prediction import LinkPredictor
+from .expansion_service import expansion_service
+from .embedding_index import EmbeddingIndex
+from .ego_network import EgoNetworks
+from .path_finder import PathFinder
+from .compact_graph import CompactGraph
 
 
 class AIBrain:
@@ -25,6 +39,7 @@ class AIBrain:
     def __init__(self, session_id: str):
         self.session_id = session_id
         self.context = context_store.get_or_create_context(session_id)
+        self.graph: Optional[GraphVersion] = None
         self.capabilities = [
             'philosophical_analysis',
             'concept_extraction',
@@ -47,18 +62,26 @@ class AIBrain:
     def process_message(
         self,
         user_message: str,
-        graph_data: Optional[Dict[str, Any]] = None
+        graph_data: Optional[Dict[str, Any]] = None,
+        graph_id: Optional[str] = None,
+        version: Optional[int] = None
     ) -> Dict[str, Any]:
         """
         Process user message and generate response
         This is the main conversational interface
+        The graph is read from the graph store when graph_id is given,
+        otherwise inline graph_data is used
         """
         # Add user message to context
         self.context.add_message('user', user_message)
         
+        # Resolve the graph this message refers to
+        self.graph = graph_store.resolve(graph_data, graph_id, version)
+        graph_data = self.graph.data if self.graph else None
+        
         # Capture graph state if provided
         if graph_data:
-            self.context.add_graph_snapshot(graph_data, 'user_query')
+            self.context.add_graph_snapshot(graph_data, 'user_query', self.graph)
         
         # Analyze user intent
         intent = self._analyze_intent(user_message)
@@ -164,16 +187,28 @@ class AIBrain:
             }
         
         # Analyze graph structure
-        analysis = self._analyze_graph_structure(graph_data)
+        analysis = self._analyze_graph(graph_data)
         
         # Generate organization suggestions
         suggestions = self._generate_organization_suggestions(analysis)
         
+        # Thematic clusters drive re-categorisation and bridge-link suggestions; on large
+        # graphs they are detected in the background and join a later answer
+        graph = self._graph_version(graph_data)
+        partition = community_service.partition(graph)
+        if partition is not None:
+            analysis['communities'] = partition.summary()
+            suggestions.extend(community_suggestions(graph, partition))
+        else:
+            analysis['communities'] = {'pending': True}
+        
         return {
             'intent': 'organize',
             'message': f"I've analyzed the graph structure. It has {analysis['node_count']} nodes "
                       f"organized into {len(analysis['categories'])} categories. I have several "
-                      f"suggestions to improve organization and clarity.",
+                      f"suggestions to improve organization and clarity."
+                      + (" Thematic clusters are still being detected; ask again shortly for "
+                         "cluster-based suggestions." if partition is None else ''),
             'suggestions': suggestions,
             'analysis': analysis,
             'actions': ['apply_organization', 'view_structure', 'refine']
@@ -213,7 +248,7 @@ class AIBrain:
         # Generate expansion suggestions
         suggestions = self._generate_expansion_suggestions(target, graph_data)
         
-        return {
+        response = {
             'intent': 'expand',
             'message': f"I can expand '{target}' by adding related philosophical concepts, "
                       f"exploring sub-themes, and identifying key relationships. "
@@ -222,6 +257,16 @@ class AIBrain:
             'target': target,
             'actions': ['apply_expansion', 'customize_depth', 'select_direction']
         }
+        
+        # Explore the target's neighbourhood in the background; results stream by job id
+        node = self._find_node_by_label(target, graph_data) if graph_data else None
+        if node:
+            response['neighborhood'] = self._neighborhood(node['id'], graph_data)
+            job = expansion_service.start(self._graph_version(graph_data), node['id'])
+            response['expansion_job'] = job.to_dict()
+            response['actions'].append('cancel_expansion')
+        
+        return response
     
     def _handle_connect(
         self,
@@ -230,13 +275,22 @@ class AIBrain:
     ) -> Dict[str, Any]:
         """Handle connection/relationship requests"""
         
-        # Extract concepts to connect
+        # Extract concepts to connect, preferring graph concepts named in the message
         concepts = self._extract_concepts_from_message(message)
+        mentioned_ids: List[str] = []
+        if graph_data:
+            graph = self._graph_version(graph_data)
+            automaton = LabelAutomaton.for_graph(graph)
+            # Most specific labels win, then keep the order they appear in the message
+            positions = {node_id: start for node_id, start, _ in reversed(automaton.find_mentions(message))}
+            mentioned_ids = sorted(automaton.mentioned_nodes(message), key=positions.get)
+            mentioned = [graph.get_node(node_id).get('label', node_id) for node_id in mentioned_ids]
+            concepts = mentioned + [concept for concept in concepts if concept not in mentioned]
         
         # Generate relationship suggestions
         relationships = self._infer_relationships(concepts, graph_data)
         
-        return {
+        response = {
             'intent': 'connect',
             'message': f"I've analyzed potential relationships between {', '.join(concepts[:3])}. "
                       f"Here are the philosophical connections I've identified:",
@@ -244,6 +298,14 @@ class AIBrain:
             'concepts': concepts,
             'actions': ['add_connections', 'explain_relationship', 'find_more']
         }
+        
+        # Explain how the first two named concepts already relate through the graph
+        if len(mentioned_ids) >= 2:
+            connection = self._explain_connection(graph, mentioned_ids[0], mentioned_ids[1])
+            if connection:
+                response['connection'] = connection
+        
+        return response
     
     def _handle_write(
         self,
@@ -372,11 +434,12 @@ class AIBrain:
         graph_data: Optional[Dict[str, Any]]
     ) -> str:
         """Extract what to expand"""
-        # Look for node names or concepts in message
+        # Look for node names mentioned in the message, preferring the most specific
         if graph_data:
-            for node in graph_data.get('nodes', []):
-                if node['label'].lower() in message.lower():
-                    return node['label']
+            automaton = LabelAutomaton.for_graph(self._graph_version(graph_data))
+            mentioned = automaton.mentioned_nodes(message)
+            if mentioned:
+                return automaton.labels[mentioned[0]]
         
         return 'the graph'
     
@@ -440,7 +503,7 @@ class AIBrain:
             }
         ]
         
-        return [{
+        suggestions = [{
             'type': 'node',
             'label': concept['label'],
             'description': concept['description'],
@@ -448,38 +511,73 @@ class AIBrain:
             'relevance_score': concept['confidence'],
             'reasoning': f'Generated through philosophical brainstorming about {topic}'
         } for concept in concept_templates]
+        
+        if graph_data:
+            suggestions = self._ground_in_graph(suggestions, graph_data)
+        
+        return suggestions
     
-    def _analyze_graph_structure(self, graph_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Analyze graph structure"""
-        nodes = graph_data.get('nodes', [])
-        links = graph_data.get('links', [])
-        
-        # Count by category
-        categories = {}
-        for node in nodes:
-            cat = node.get('category', 'unknown')
-            categories[cat] = categories.get(cat, 0) + 1
-        
-        # Calculate connectivity
-        node_connections = {}
-        for link in links:
-            source = link['source']
-            target = link['target']
-            node_connections[source] = node_connections.get(source, 0) + 1
-            node_connections[target] = node_connections.get(target, 0) + 1
-        
-        avg_connections = sum(node_connections.values()) / len(node_connections) if node_connections else 0
+    def _ground_in_graph(
+        self,
+        suggestions: List[Dict[str, Any]],
+        graph_data: Dict[str, Any],
+        duplicate_similarity: float = 0.9
+    ) -> List[Dict[str, Any]]:
+        """
+        Drop suggested concepts the graph already has and attach the closest existing concepts
+        Stored graphs use their embedding index, which is kept up to date across versions; an
+        unstored graph is matched on label trigrams rather than embedding every node per request
+        """
+        graph = self._graph_version(graph_data)
+        semantic = graph.graph_id is not None or graph.cached('embedding_index') is not None
+        embeddings = EmbeddingIndex.for_graph(graph) if semantic else None
+        labels = None if semantic else TrigramIndex.for_graph(graph)
+        grounded = []
         
-        return {
-            'node_count': len(nodes),
-            'edge_count': len(links),
-            'categories': categories,
-            'avg_connections': avg_connections,
-            'isolated_nodes': [
-                node['id'] for node in nodes 
-                if node['id'] not in node_connections
-            ]
-        }
+        for suggestion in suggestions:
+            if embeddings is not None:
+                duplicates = embeddings.query(suggestion['label'], k=1, min_similarity=duplicate_similarity)
+                neighbours = embeddings.query(f"{suggestion['label']} {suggestion['description']}", k=3, min_similarity=0.2)
+            else:
+                duplicates = labels.similar(suggestion['label'], k=1, min_similarity=duplicate_similarity)
+                neighbours = labels.similar(suggestion['label'], k=3, min_similarity=0.2)
+            if duplicates:
+                continue
+            suggestion['related_nodes'] = [node_id for node_id, _ in neighbours]
+            grounded.append(suggestion)
+        
+        return grounded
+    
+    def _graph_version(self, graph_data: Dict[str, Any]) -> GraphVersion:
+        """Graph version backing graph_data, so derived indexes are shared across handlers"""
+        if self.graph is None or self.graph.data is not graph_data:
+            self.graph = GraphVersion.from_data(graph_data)
+        return self.graph
+    
+    def _adjacency(self, graph_data: Dict[str, Any]) -> AdjacencyIndex:
+        """Adjacency index for graph_data, built once per graph version"""
+        return AdjacencyIndex.for_graph(self._graph_version(graph_data))
+    
+    def _neighborhood(
+        self,
+        node_id: str,
+        graph_data: Dict[str, Any],
+        k: int = 1,
+        max_nodes: int = 25
+    ) -> Dict[str, Any]:
+        """Cached k-hop ego network of a node, small enough to return with a message"""
+        graph = self._graph_version(graph_data)
+        return EgoNetworks.for_graph(graph).query(graph, [node_id], k, max_nodes=max_nodes)
+    
+    def _analyze_graph_structure(self, graph_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Analyze graph structure from incrementally maintained metrics"""
+        return GraphMetrics.for_graph(self._graph_version(graph_data)).structure()
+    
+    def _analyze_graph(self, graph_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Structure analysis plus the per-version structural analytics summary"""
+        analysis = self._analyze_graph_structure(graph_data)
+        analysis['analytics'] = GraphAnalytics.for_graph(self._graph_version(graph_data)).summary()
+        return analysis
     
     def _generate_organization_suggestions(
         self,
@@ -512,6 +610,34 @@ class AIBrain:
                     'details': {'categories': analysis['categories']}
                 })
         
+        analytics = analysis.get('analytics', {})
+        
+        # Suggest bridging disconnected clusters
+        if analytics.get('component_count', 0) > 1:
+            suggestions.append({
+                'type': 'organization',
+                'action': 'bridge_components',
+                'description': f"Link {analytics['component_count']} disconnected clusters into the main graph",
+                'details': {
+                    'component_count': analytics['component_count'],
+                    'largest_component_size': analytics['largest_component_size'],
+                    'nodes': analytics['component_representatives']
+                }
+            })
+        
+        # Surface the structurally central concepts as organizing anchors
+        if analytics.get('central_concepts') and analysis['edge_count'] > 0:
+            suggestions.append({
+                'type': 'organization',
+                'action': 'anchor_central_concepts',
+                'description': 'Use the most central concepts as anchors when grouping related ideas',
+                'details': {
+                    'central_concepts': analytics['central_concepts'],
+                    'bridging_concepts': analytics['bridging_concepts'],
+                    'max_core_number': analytics['max_core_number']
+                }
+            })
+        
         return suggestions
     
     def _generate_philosophical_analysis(
@@ -528,13 +654,20 @@ class AIBrain:
             f"creating a paradoxical framework that challenges conventional philosophical boundaries."
         )
         
-        return {
+        analysis = {
             'subject': subject,
             'explanation': analysis_text,
             'key_themes': ['meaninglessness', 'transcendence', 'paradox', 'void'],
             'related_concepts': self._find_related_concepts(subject, graph_data),
             'philosophical_lineage': ['Nietzsche', 'Heidegger', 'Cioran']
         }
+        
+        # Ground the analysis in the subject's place in the graph
+        node = self._find_node_by_label(subject, graph_data) if graph_data else None
+        if node:
+            analysis['neighborhood'] = self._neighborhood(node['id'], graph_data)
+        
+        return analysis
     
     def _generate_expansion_suggestions(
         self,
@@ -542,7 +675,7 @@ class AIBrain:
         graph_data: Optional[Dict[str, Any]]
     ) -> List[Dict[str, Any]]:
         """Generate suggestions for expanding a concept"""
-        return [
+        suggestions = [
             {
                 'type': 'node',
                 'label': f'Phenomenological Aspects of {target}',
@@ -560,6 +693,96 @@ class AIBrain:
                 'reasoning': f'{target} naturally connects to existential anxiety themes'
             }
         ]
+        
+        if graph_data:
+            suggestions.extend(self._suggest_neighborhood_connections(target, graph_data))
+        
+        return suggestions
+    
+    def _suggest_neighborhood_connections(
+        self,
+        target: str,
+        graph_data: Dict[str, Any],
+        limit: int = 3
+    ) -> List[Dict[str, Any]]:
+        """Suggest links from a node to the nodes it reaches through shared neighbours"""
+        node = self._find_node_by_label(target, graph_data)
+        if not node:
+            return []
+        
+        graph = self._graph_version(graph_data)
+        return self._predicted_connections(graph, node['id'], limit)
+    
+    def _predicted_connections(
+        self,
+        graph: GraphVersion,
+        node_id: str,
+        limit: int
+    ) -> List[Dict[str, Any]]:
+        """Connection suggestions for a node from its top-ranked predicted links"""
+        predictor = LinkPredictor.for_graph(graph)
+        candidates = predictor.top_k([node_id], limit).get(node_id, [])
+        scores = predictor.score_pairs([(node_id, candidate_id) for candidate_id, _ in candidates])
+        return [
+            self._connection_suggestion(graph, node_id, candidate_id, score)
+            for (candidate_id, _), score in zip(candidates, scores)
+        ]
+    
+    def _connection_suggestion(
+        self,
+        graph: GraphVersion,
+        source_id: str,
+        target_id: str,
+        scores: Dict[str, float]
+    ) -> Dict[str, Any]:
+        """Connection suggestion backed by link prediction scores"""
+        source_label = graph.get_node(source_id).get('label', source_id)
+        target_label = graph.get_node(target_id).get('label', target_id)
+        shared = int(scores['common_neighbors'])
+        return {
+            'type': 'connection',
+            'source': source_id,
+            'target': target_id,
+            'target_label': target_label,
+            'relationship': 'relates to',
+            'relevance_score': round(min(0.5 + 0.1 * shared + 0.3 * scores['jaccard'], 0.9), 3),
+            'scores': scores,
+            'reasoning': f"{source_label} shares {shared} neighbouring concept(s) with {target_label}"
+        }
+    
+    def _explain_connection(
+        self,
+        graph: GraphVersion,
+        source_id: str,
+        target_id: str
+    ) -> Optional[Dict[str, Any]]:
+        """Shortest and alternative paths between two concepts, with the shortest spelled out"""
+        connection = PathFinder.for_graph(graph).paths(source_id, target_id, k=3)
+        if not connection['paths']:
+            return None
+        
+        shortest = connection['paths'][0]
+        steps = []
+        for i, link in enumerate(shortest['links']):
+            relationship = link.get('relationship', 'relates to')
+            # Links are followed in either direction; phrase each the way it points
+            if link['source'] == shortest['nodes'][i]:
+                steps.append(f"{shortest['labels'][i]} {relationship} {shortest['labels'][i + 1]}")
+            else:
+                steps.append(f"{shortest['labels'][i + 1]} {relationship} {shortest['labels'][i]}")
+        
+        return {**connection, 'explanation': '; '.join(steps)}
+    
+    def _find_node_by_label(
+        self,
+        label: str,
+        graph_data: Dict[str, Any]
+    ) -> Optional[Dict[str, Any]]:
+        """Find a node whose label matches (case-insensitively)"""
+        graph = self._graph_version(graph_data)
+        compact = CompactGraph.for_graph(graph)
+        i = compact.find_label(label)
+        return graph.get_node(compact.ids[i]) if i is not None else None
     
     def _infer_relationships(
         self,
@@ -569,6 +792,24 @@ class AIBrain:
         """Infer philosophical relationships between concepts"""
         relationships = []
         
+        if graph_data:
+            graph = self._graph_version(graph_data)
+            nodes = [self._find_node_by_label(concept, graph_data) for concept in concepts]
+            node_ids = list(dict.fromkeys(node['id'] for node in nodes if node))
+            
+            if len(node_ids) >= 2:
+                source_id, target_id = node_ids[:2]
+                if self._adjacency(graph_data).are_connected(source_id, target_id):
+                    # Already linked; nothing new to suggest
+                    return relationships
+                scores = LinkPredictor.for_graph(graph).score_pairs([(source_id, target_id)])[0]
+                relationships.append(self._connection_suggestion(graph, source_id, target_id, scores))
+                return relationships
+            
+            if node_ids:
+                # A single named concept: rank its likeliest new links
+                return self._predicted_connections(graph, node_ids[0], limit=5)
+        
         if len(concepts) >= 2:
             relationships.append({
                 'type': 'connection',
@@ -614,7 +855,7 @@ class AIBrain:
     def _evaluate_graph_quality(self, graph_data: Dict[str, Any]) -> Dict[str, Any]:
         """Evaluate overall graph quality"""
         
-        analysis = self._analyze_graph_structure(graph_data)
+        analysis = self._analyze_graph(graph_data)
         
         # Calculate quality score
         quality_score = 0.0
@@ -635,6 +876,14 @@ class AIBrain:
         else:
             issues.append(f"{len(analysis['isolated_nodes'])} isolated nodes need connections")
         
+        # Check fragmentation
+        if analysis['component_count'] > 1:
+            isolated = len(analysis['isolated_nodes'])
+            issues.append(
+                f"Graph is split into {analysis['component_count']} disconnected components"
+                + (f" ({isolated} of them isolated nodes)" if isolated else "")
+            )
+        
         # Check category distribution
         if len(analysis['categories']) >= 3:
             quality_score += 0.2
@@ -657,24 +906,33 @@ class AIBrain:
     def _search_graph(
         self,
         query: str,
-        graph_data: Optional[Dict[str, Any]]
+        graph_data: Optional[Dict[str, Any]],
+        limit: int = 20
     ) -> List[Dict[str, Any]]:
-        """Search graph for matching nodes"""
+        """Search graph for matching nodes, ranked by BM25 relevance"""
         if not graph_data:
             return []
         
+        graph = self._graph_version(graph_data)
+        matches = SearchIndex.for_graph(graph).search(query, k=limit)
+        
+        # Fall back to label substrings, then to typo-tolerant label similarity
+        if not matches:
+            trigram_index = TrigramIndex.for_graph(graph)
+            matches = [(node_id, 0.0) for node_id in trigram_index.substring(query)[:limit]]
+            if not matches:
+                matches = trigram_index.similar(query, k=limit)
+        
         results = []
-        query_lower = query.lower()
-        
-        for node in graph_data.get('nodes', []):
-            if (query_lower in node.get('label', '').lower() or
-                query_lower in node.get('description', '').lower()):
-                results.append({
-                    'id': node['id'],
-                    'label': node['label'],
-                    'description': node.get('description', ''),
-                    'category': node.get('category', '')
-                })
+        for node_id, score in matches:
+            node = graph.get_node(node_id)
+            results.append({
+                'id': node['id'],
+                'label': node['label'],
+                'description': node.get('description', ''),
+                'category': node.get('category', ''),
+                'score': round(score, 4)
+            })
         
         return results
     
@@ -687,15 +945,17 @@ class AIBrain:
         if not graph_data:
             return []
         
-        related = []
-        subject_lower = subject.lower()
+        graph = self._graph_version(graph_data)
         
-        for node in graph_data.get('nodes', []):
-            label_lower = node.get('label', '').lower()
-            if subject_lower in label_lower or label_lower in subject_lower:
-                related.append(node['label'])
+        # Labels containing the subject, then labels mentioned in the subject,
+        # then semantically similar concepts
+        related_ids = (
+            TrigramIndex.for_graph(graph).substring(subject) +
+            LabelAutomaton.for_graph(graph).mentioned_nodes(subject) +
+            [node_id for node_id, _ in EmbeddingIndex.for_graph(graph).query(subject, k=5, min_similarity=0.2)]
+        )
         
-        return related[:5]
+        return [graph.get_node(node_id)['label'] for node_id in dict.fromkeys(related_ids)][:5]
     
     def _get_general_suggestions(
         self,
@@ -723,7 +983,8 @@ class AIBrain:
     def _track_suggestions_provenance(self, suggestions: List[Dict[str, Any]]):
         """Track provenance for generated suggestions"""
         for suggestion in suggestions:
-            if suggestion.get('type') == 'node':
+            # Analysis responses list related concept labels rather than suggestion dicts
+            if isinstance(suggestion, dict) and suggestion.get('type') == 'node':
                 content_id = suggestion.get('label', '').lower().replace(' ', '-')
                 provenance_tracker.track_ai_content(
                     content_id,
@@ -739,6 +1000,10 @@ class AIBrain:
         """Get conversation context summary"""
         return self.context.get_conversation_summary()
     
+    def get_context_window(self, token_budget: int) -> Dict[str, Any]:
+        """Get the newest messages and earlier-history summary that fit a token budget"""
+        return self.context.get_context_window(token_budget)
+    
     def get_capabilities(self) -> List[str]:
         """Get AI Brain capabilities"""
         return self.capabilities
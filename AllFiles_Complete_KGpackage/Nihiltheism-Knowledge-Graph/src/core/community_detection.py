@@ -0,0 +1,319 @@
+"""
+Community Detection for AI Brain
+Partitions the concept graph into thematic clusters (Louvain or label propagation)
+and turns the partition into re-categorisation and bridge-link suggestions; large
+graphs are coarsened by label propagation first and partitioned in the background
+"""
+from typing import Dict, Any, List, Optional, Tuple
+from collections import Counter
+
+import numpy as np
+from scipy import sparse
+
+from ..store.graph_store import BackgroundBuilds, GraphVersion
+from .graph_analytics import GraphAnalytics
+from .compact_graph import CompactGraph
+
+
+def louvain(
+    node_count: int,
+    sources: np.ndarray,
+    targets: np.ndarray,
+    max_levels: int = 10,
+    weights: Optional[np.ndarray] = None
+) -> List[int]:
+    """
+    Louvain modularity optimisation over an undirected (optionally weighted) edge list
+    Returns a community label per node (labels are local to this call)
+    """
+    adjacency: List[Dict[int, float]] = [{} for _ in range(node_count)]
+    edge_weights = weights.tolist() if weights is not None else [1.0] * len(sources)
+    for source, target, weight in zip(sources.tolist(), targets.tolist(), edge_weights):
+        adjacency[source][target] = adjacency[source].get(target, 0.0) + weight
+        adjacency[target][source] = adjacency[target].get(source, 0.0) + weight
+
+    membership = list(range(node_count))
+    for _ in range(max_levels):
+        degrees = [sum(neighbours.values()) for neighbours in adjacency]
+        total_weight = sum(degrees)
+        if not total_weight:
+            break
+
+        communities, moved = _local_moving(adjacency, degrees, total_weight)
+        if not moved:
+            break
+
+        # Renumber communities and fold each into a supernode
+        renumber = {community: i for i, community in enumerate(dict.fromkeys(communities))}
+        communities = [renumber[community] for community in communities]
+        membership = [communities[community] for community in membership]
+
+        folded: List[Dict[int, float]] = [{} for _ in range(len(renumber))]
+        for node, neighbours in enumerate(adjacency):
+            community = communities[node]
+            for neighbour, weight in neighbours.items():
+                other = communities[neighbour]
+                folded[community][other] = folded[community].get(other, 0.0) + weight
+        adjacency = folded
+
+    return membership
+
+
+def _local_moving(
+    adjacency: List[Dict[int, float]],
+    degrees: List[float],
+    total_weight: float
+) -> Tuple[List[int], bool]:
+    """Move nodes to the neighbouring community with the best modularity gain until stable"""
+    communities = list(range(len(adjacency)))
+    community_totals = list(degrees)
+    moved_any = False
+
+    improved = True
+    while improved:
+        improved = False
+        for node, neighbours in enumerate(adjacency):
+            current = communities[node]
+            degree = degrees[node]
+
+            links_to: Dict[int, float] = {}
+            for neighbour, weight in neighbours.items():
+                if neighbour != node:
+                    links_to[communities[neighbour]] = links_to.get(communities[neighbour], 0.0) + weight
+
+            community_totals[current] -= degree
+            best = current
+            best_gain = links_to.get(current, 0.0) - community_totals[current] * degree / total_weight
+            for community, weight in links_to.items():
+                gain = weight - community_totals[community] * degree / total_weight
+                if gain > best_gain + 1e-12:
+                    best, best_gain = community, gain
+            community_totals[best] += degree
+
+            if best != current:
+                communities[node] = best
+                improved = True
+                moved_any = True
+
+    return communities, moved_any
+
+
+def label_propagation(matrix: sparse.csr_matrix, max_iterations: int = 30, seed: int = 0) -> np.ndarray:
+    """
+    Semi-synchronous label propagation: each round a random half of the nodes adopts
+    the label most common among its neighbours (random tie-breaking)
+    """
+    n = matrix.shape[0]
+    labels = np.arange(n)
+    if not matrix.nnz:
+        return labels
+
+    rng = np.random.default_rng(seed)
+    rows = np.repeat(np.arange(n), np.diff(matrix.indptr))
+    for _ in range(max_iterations):
+        keys = rows * n + labels[matrix.indices]
+        unique_keys, counts = np.unique(keys, return_counts=True)
+        nodes, candidate_labels = unique_keys // n, unique_keys % n
+        scores = counts + rng.random(len(counts)) * 0.5
+
+        order = np.lexsort((-scores, nodes))
+        first = order[np.r_[True, nodes[order][1:] != nodes[order][:-1]]]
+        best = labels.copy()
+        best[nodes[first]] = candidate_labels[first]
+
+        updated = np.where(rng.random(n) < 0.5, best, labels)
+        if np.array_equal(updated, labels) and np.array_equal(best, labels):
+            break
+        labels = updated
+    return labels
+
+
+class CommunityPartition:
+    """A partition of one graph version into communities"""
+
+    def __init__(self, ids: List[str], labels: np.ndarray, matrix: sparse.csr_matrix, method: str):
+        # Renumber so community 0 is the largest
+        _, labels, sizes = np.unique(labels, return_inverse=True, return_counts=True)
+        rank = np.empty(len(sizes), dtype=np.int64)
+        rank[np.argsort(-sizes, kind='stable')] = np.arange(len(sizes))
+        self.ids = ids
+        self.labels = rank[labels] if len(labels) else labels
+        self.sizes = np.sort(sizes)[::-1]
+        self.method = method
+        self.matrix = matrix
+        self.modularity = self._modularity()
+
+    def _modularity(self) -> float:
+        """Newman modularity of the partition"""
+        total = self.matrix.sum()
+        if not total:
+            return 0.0
+        degrees = np.asarray(self.matrix.sum(axis=1)).ravel()
+        coo = self.matrix.tocoo()
+        internal = np.bincount(self.labels[coo.row], weights=coo.data * (self.labels[coo.row] == self.labels[coo.col]),
+                               minlength=len(self.sizes))
+        community_degrees = np.bincount(self.labels, weights=degrees, minlength=len(self.sizes))
+        return float((internal / total - (community_degrees / total) ** 2).sum())
+
+    def summary(self, k: int = 5) -> Dict[str, Any]:
+        """JSON-friendly summary for the organize handler"""
+        return {
+            'method': self.method,
+            'community_count': int((self.sizes > 1).sum()),
+            'modularity': round(self.modularity, 4),
+            'largest_communities': [
+                {'size': int(self.sizes[community]), 'nodes': self.members(community)[:k]}
+                for community in range(min(k, len(self.sizes))) if self.sizes[community] > 1
+            ]
+        }
+
+    def members(self, community: int) -> List[str]:
+        """Node ids in a community"""
+        return [self.ids[i] for i in np.flatnonzero(self.labels == community)]
+
+    def community_links(self, k: int) -> np.ndarray:
+        """Link counts between the k largest communities (k x k)"""
+        k = min(k, len(self.sizes))
+        mask = self.labels < k
+        membership = sparse.csr_matrix(
+            (np.ones(mask.sum()), (np.flatnonzero(mask), self.labels[mask])),
+            shape=(len(self.labels), k)
+        )
+        return (membership.T @ self.matrix @ membership).toarray()
+
+
+class CommunityDetector:
+    """
+    Run community detection over a graph version
+    Louvain is pure Python, so above coarsen_node_limit nodes it runs on the graph folded
+    along label-propagation communities (vectorised) instead of on every node
+    """
+
+    coarsen_node_limit = 5000
+
+    def __init__(self, method: str = 'louvain'):
+        self.method = method
+
+    def detect(self, graph: GraphVersion) -> CommunityPartition:
+        """Partition a graph version"""
+        analytics = GraphAnalytics.for_graph(graph)
+        matrix = analytics.matrix
+
+        if self.method == 'label_propagation':
+            labels = label_propagation(matrix)
+        else:
+            labels = self._louvain(matrix)
+
+        return CommunityPartition(analytics.ids, labels, matrix, self.method)
+
+    def _louvain(self, matrix: sparse.csr_matrix) -> np.ndarray:
+        """Louvain over the graph, or over its label-propagation communities when it is large"""
+        n = matrix.shape[0]
+        upper = sparse.triu(matrix, k=1).tocsr()
+        upper.data = np.ones(len(upper.data))
+        if n <= self.coarsen_node_limit:
+            coo = upper.tocoo()
+            return np.asarray(louvain(n, coo.row, coo.col), dtype=np.int64)
+
+        # Fold each label-propagation community into a supernode; a supernode's self-loop
+        # carries its internal links, so modularity on the folded graph matches the original
+        _, coarse = np.unique(label_propagation(upper + upper.T), return_inverse=True)
+        membership = sparse.csr_matrix((np.ones(n), (np.arange(n), coarse)), shape=(n, int(coarse.max()) + 1))
+        between = membership.T @ upper @ membership
+        folded = sparse.triu(between + between.T).tocoo()
+        weights = np.where(folded.row == folded.col, folded.data / 2, folded.data)
+        supernode_labels = louvain(membership.shape[1], folded.row, folded.col, weights=weights)
+        return np.asarray(supernode_labels, dtype=np.int64)[coarse]
+
+    @classmethod
+    def for_graph(cls, graph: GraphVersion, method: str = 'louvain') -> CommunityPartition:
+        """Get the partition of a graph version, detecting it once per version and method"""
+        return graph.derived(f'communities:{method}', lambda g: cls(method).detect(g))
+
+
+class CommunityService(BackgroundBuilds):
+    """Community partitions for request handlers: small graphs inline, larger ones on a worker"""
+
+    # Roughly a quarter of a second of Louvain
+    inline_node_limit = 2000
+
+    def __init__(self, max_workers: int = 1):
+        super().__init__(max_workers, thread_name_prefix='communities')
+
+    def partition(self, graph: GraphVersion, method: str = 'louvain') -> Optional[CommunityPartition]:
+        """The graph's partition if it is ready or quick to make; otherwise start detecting it and return None"""
+        return self.get(
+            graph,
+            f'communities:{method}',
+            lambda g: CommunityDetector.for_graph(g, method),
+            len(graph.nodes) <= self.inline_node_limit
+        )
+
+
+community_service = CommunityService()
+
+
+def community_suggestions(
+    graph: GraphVersion,
+    partition: CommunityPartition,
+    min_size: int = 3,
+    majority: float = 0.6,
+    limit: int = 5
+) -> List[Dict[str, Any]]:
+    """Re-categorisation and bridge-link suggestions from a community partition"""
+    suggestions = []
+
+    # Nodes whose category disagrees with a clear majority of their community
+    compact = CompactGraph.for_graph(graph)
+    recategorize = []
+    for community, size in enumerate(partition.sizes):
+        if size < min_size:
+            break
+        members = partition.members(community)
+        rows = [compact.index[node_id] for node_id in members]
+        dominant, count = Counter(compact.category(i) for i in rows).most_common(1)[0]
+        if count / size < majority:
+            continue
+        for node_id, i in zip(members, rows):
+            current = compact.category(i)
+            if current != dominant:
+                recategorize.append({
+                    'node': node_id,
+                    'label': compact.labels[i] or node_id,
+                    'current_category': current,
+                    'suggested_category': dominant,
+                    'community': community
+                })
+    if recategorize:
+        suggestions.append({
+            'type': 'organization',
+            'action': 'recategorize',
+            'description': f"Re-categorise {len(recategorize)} concepts to match their thematic cluster",
+            'details': {'nodes': recategorize[:limit]}
+        })
+
+    # Bridge the most weakly linked pairs of large communities through their central concepts
+    large = int((partition.sizes >= min_size).sum())
+    if large >= 2:
+        links = partition.community_links(min(large, 8))
+        pagerank = GraphAnalytics.for_graph(graph).pagerank
+        anchors = []
+        for community in range(len(links)):
+            members = np.flatnonzero(partition.labels == community)
+            anchors.append(partition.ids[members[np.argmax(pagerank[members])]])
+
+        pairs = [
+            (links[a, b], a, b)
+            for a in range(len(links)) for b in range(a + 1, len(links))
+        ]
+        for count, a, b in sorted(pairs)[:min(limit, 3)]:
+            suggestions.append({
+                'type': 'connection',
+                'source': anchors[a],
+                'target': anchors[b],
+                'relationship': 'relates to',
+                'relevance_score': 0.6 if count == 0 else 0.5,
+                'reasoning': f"Bridges thematic clusters {a} and {b}, which share {int(count)} links"
+            })
+
+    return suggestions
@@ -0,0 +1,243 @@
+"""
+Compact Graph for AI Brain
+Columnar in-memory graph with interned ids and categories, integer node indices and
+precomputed lowercase and normalised labels, convertible to and from the JSON schema
+"""
+from typing import Dict, Any, List, Optional, Tuple
+from array import array
+from collections import Counter
+import math
+import re
+import sys
+
+from ..store.graph_store import GraphVersion
+
+NODE_FIELDS = ('id', 'label', 'description', 'category', 'size', 'color')
+LINK_FIELDS = ('source', 'target', 'relationship')
+
+WORD_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+
+def normalize(text: str) -> str:
+    """Lowercase text and collapse punctuation and whitespace to single spaces"""
+    return ' '.join(WORD_PATTERN.findall(text.lower()))
+
+
+class _Interner:
+    """Table of distinct strings addressed by small integer codes; code 0 means missing"""
+
+    def __init__(self):
+        self.values: List[Optional[str]] = [None]
+        self.codes: Dict[str, int] = {}
+
+    def code(self, value: Optional[str]) -> int:
+        """Code of a value, adding it to the table if new"""
+        if value is None:
+            return 0
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(sys.intern(value))
+        return code
+
+
+def deep_sizeof(item: Any, seen: Optional[set] = None) -> int:
+    """Bytes held by an object and everything it references (shared objects counted once)"""
+    seen = set() if seen is None else seen
+    if id(item) in seen:
+        return 0
+    seen.add(id(item))
+
+    size = sys.getsizeof(item)
+    if isinstance(item, dict):
+        size += sum(deep_sizeof(key, seen) + deep_sizeof(value, seen) for key, value in item.items())
+    elif isinstance(item, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(value, seen) for value in item)
+    elif hasattr(item, '__dict__'):
+        size += deep_sizeof(vars(item), seen)
+    elif hasattr(item, '__slots__'):
+        size += sum(deep_sizeof(getattr(item, name), seen) for name in item.__slots__ if hasattr(item, name))
+    return size
+
+
+class CompactGraph:
+    """
+    Graph stored as parallel columns indexed by node position
+    Edge j joins nodes sources[j] and targets[j]; link_positions[j] is its position in
+    the source link list. Attributes outside the standard schema are kept per row in
+    node_extras / link_extras, so conversion back to JSON is lossless
+    """
+
+    def __init__(self):
+        self.ids: List[str] = []
+        self.index: Dict[str, int] = {}
+        self.labels: List[Optional[str]] = []
+        self.labels_lower: List[str] = []
+        self.labels_normalized: List[str] = []
+        self.descriptions: List[Optional[str]] = []
+        self.category_codes = array('I')
+        self.color_codes = array('I')
+        # NaN marks a missing size
+        self.sizes = array('d')
+        self.node_extras: Dict[int, Dict[str, Any]] = {}
+
+        self.sources = array('l')
+        self.targets = array('l')
+        self.link_positions = array('l')
+        self.relationship_codes = array('I')
+        self.link_extras: Dict[int, Dict[str, Any]] = {}
+        # Links whose endpoints are not nodes of the graph, kept verbatim
+        self.unresolved_links: List[Tuple[int, Dict[str, Any]]] = []
+
+        self._categories = _Interner()
+        self._colors = _Interner()
+        self._relationships = _Interner()
+        self._label_index: Optional[Dict[str, int]] = None
+
+    @classmethod
+    def for_graph(cls, graph: GraphVersion) -> 'CompactGraph':
+        """Get the compact form of a graph version, building it on first use"""
+        return graph.derived('compact_graph', lambda g: cls.from_data(g.data))
+
+    @classmethod
+    def from_data(cls, graph_data: Dict[str, Any]) -> 'CompactGraph':
+        """Build from graph data in the client JSON schema"""
+        graph = cls()
+        for node in graph_data.get('nodes', []):
+            graph.add_node(node)
+        for position, link in enumerate(graph_data.get('links', [])):
+            graph.add_link(link, position)
+        return graph
+
+    def add_node(self, node: Dict[str, Any]) -> int:
+        """Append a node row and return its index"""
+        node_id = sys.intern(node['id'])
+        i = len(self.ids)
+        # Values that do not fit their column (non-strings, explicit nulls) go to extras
+        extras = {
+            key: value for key, value in node.items()
+            if key not in NODE_FIELDS or (key != 'id' and not self._fits_column(key, value))
+        }
+        label = node.get('label') if 'label' not in extras else None
+        description = node.get('description') if 'description' not in extras else None
+
+        self.ids.append(node_id)
+        self.index[node_id] = i
+        lowered = label.lower() if label else ''
+        normalized = normalize(lowered)
+        # Most labels need no normalising beyond lowercasing; share the string then
+        self.labels.append(label)
+        self.labels_lower.append(lowered)
+        self.labels_normalized.append(lowered if normalized == lowered else normalized)
+        self.descriptions.append(description)
+        self.category_codes.append(self._categories.code(node.get('category') if 'category' not in extras else None))
+        self.color_codes.append(self._colors.code(node.get('color') if 'color' not in extras else None))
+        self.sizes.append(node['size'] if 'size' in node and 'size' not in extras else math.nan)
+        if extras:
+            self.node_extras[i] = extras
+        self._label_index = None
+        return i
+
+    @staticmethod
+    def _fits_column(key: str, value: Any) -> bool:
+        """Whether a standard field's value can be stored in its column"""
+        if key == 'size':
+            return isinstance(value, (int, float)) and not isinstance(value, bool) and not math.isnan(value)
+        return isinstance(value, str)
+
+    def add_link(self, link: Dict[str, Any], position: Optional[int] = None):
+        """Append a link; links to unknown nodes are kept aside as unresolved"""
+        position = len(self.link_positions) + len(self.unresolved_links) if position is None else position
+        source = self.index.get(link['source'])
+        target = self.index.get(link['target'])
+        if source is None or target is None:
+            self.unresolved_links.append((position, link))
+            return
+
+        j = len(self.sources)
+        self.sources.append(source)
+        self.targets.append(target)
+        self.link_positions.append(position)
+        extras = {
+            key: value for key, value in link.items()
+            if key not in LINK_FIELDS or (key == 'relationship' and not isinstance(value, str))
+        }
+        self.relationship_codes.append(self._relationships.code(link.get('relationship') if 'relationship' not in extras else None))
+        if extras:
+            self.link_extras[j] = extras
+
+    # Conversion back to the JSON schema
+
+    def node(self, i: int) -> Dict[str, Any]:
+        """Node i as a dict in the JSON schema"""
+        node: Dict[str, Any] = {'id': self.ids[i]}
+        if self.labels[i] is not None:
+            node['label'] = self.labels[i]
+        if self.descriptions[i] is not None:
+            node['description'] = self.descriptions[i]
+        if self.category_codes[i]:
+            node['category'] = self._categories.values[self.category_codes[i]]
+        size = self.sizes[i]
+        if not math.isnan(size):
+            node['size'] = int(size) if size.is_integer() else size
+        if self.color_codes[i]:
+            node['color'] = self._colors.values[self.color_codes[i]]
+        node.update(self.node_extras.get(i, {}))
+        return node
+
+    def link(self, j: int) -> Dict[str, Any]:
+        """Edge j as a link dict in the JSON schema"""
+        link: Dict[str, Any] = {'source': self.ids[self.sources[j]], 'target': self.ids[self.targets[j]]}
+        if self.relationship_codes[j]:
+            link['relationship'] = self._relationships.values[self.relationship_codes[j]]
+        link.update(self.link_extras.get(j, {}))
+        return link
+
+    def to_data(self) -> Dict[str, Any]:
+        """Graph data in the client JSON schema, with links in their original order"""
+        links = [(self.link_positions[j], self.link(j)) for j in range(len(self.sources))]
+        links.extend(self.unresolved_links)
+        links.sort(key=lambda item: item[0])
+        return {
+            'nodes': [self.node(i) for i in range(len(self.ids))],
+            'links': [link for _, link in links]
+        }
+
+    # Lookups
+
+    @property
+    def node_count(self) -> int:
+        """Number of nodes"""
+        return len(self.ids)
+
+    @property
+    def edge_count(self) -> int:
+        """Number of links between nodes of the graph (unresolved links excluded)"""
+        return len(self.sources)
+
+    def category(self, i: int, default: str = 'unknown') -> str:
+        """Category name of node i"""
+        return self._categories.values[self.category_codes[i]] or default
+
+    def relationship(self, j: int) -> Optional[str]:
+        """Relationship name of edge j"""
+        return self._relationships.values[self.relationship_codes[j]]
+
+    def find_label(self, label: str) -> Optional[int]:
+        """Index of a node whose label matches case-insensitively (the first one, on duplicates)"""
+        if self._label_index is None:
+            self._label_index = {}
+            for i, lowered in enumerate(self.labels_lower):
+                self._label_index.setdefault(lowered, i)
+        return self._label_index.get(label.lower())
+
+    def category_counts(self, default: str = 'unknown') -> Dict[str, int]:
+        """Number of nodes per category"""
+        return {
+            self._categories.values[code] or default: count
+            for code, count in Counter(self.category_codes).items()
+        }
+
+    def memory_usage(self) -> int:
+        """Approximate bytes held by the compact form"""
+        return deep_sizeof(self)
@@ -2,9 +2,409 @@
 Context Manager for AI Brain
 Manages conversation history, graph state context, and philosophical reasoning context
 """
-from typing import List, Dict, Any, Optional
-from datetime import datetime
+from typing import List, Dict, Any, Optional, Iterable, Iterator, Set, Tuple
+from collections import OrderedDict
+from itertools import filterfalse
 import json
+import re
+import sys
+import time
+import uuid
+import weakref
+import numpy as np
+
+from ..store.graph_store import GraphVersion
+from ..store.graph_diff import diff_graphs, summarize_patch
+from ..utils.timestamps import iso_timestamp, epoch_timestamp, convert_times
+
+# Simple keyword extraction - in production, use NLP
+PHILOSOPHICAL_KEYWORDS = (
+    'nihiltheism', 'existential', 'anxiety', 'void', 'nothingness',
+    'transcendence', 'meaninglessness', 'despair', 'absurd', 'divine'
+)
+
+MAX_SNAPSHOTS = 10
+
+# Top-level fields of a serialized context, in output order
+CONTEXT_FIELDS = (
+    'metadata', 'messages', 'evicted_summary', 'graph_snapshots', 'active_operations', 'operation_stats', 'summary'
+)
+
+# Words and single punctuation marks: close to subword token counts for English prose
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate number of model tokens in a text"""
+    return len(TOKEN_PATTERN.findall(text))
+
+
+def _intern_ids(node_ids: Iterable[Any]) -> Tuple[Any, ...]:
+    """Node ids as a tuple of interned strings, shared by every session that mentions them"""
+    node_ids = tuple(node_ids)
+    try:
+        return tuple(map(sys.intern, node_ids))
+    except TypeError:
+        return tuple(sys.intern(node_id) if type(node_id) is str else node_id for node_id in node_ids)
+
+
+def _page(retained: int, first: int, cursor: Optional[int], limit: Optional[int]) -> Tuple[int, int, Dict[str, Any]]:
+    """
+    Positions [start, end) of one page of retained items numbered from first, and the page's
+    description; a cursor older than the retained items starts at the oldest one
+    """
+    start = min(max(cursor - first, 0), retained) if cursor is not None else 0
+    end = retained if limit is None else min(retained, start + max(1, limit))
+    return start, end, {
+        'cursor': first + start,
+        'next_cursor': first + end if end < retained else None,
+        'first': first,
+        'count': retained
+    }
+
+
+def _id_set_hash(node_ids: Iterable[Any]) -> int:
+    """
+    Order-independent 64-bit hash of a set of node ids; XOR-ing in an id adds or removes it
+    Built on hash(), which strings cache, with a splitmix64 finaliser to spread the bits; string
+    hashes are salted per process, so restored contexts recompute their fingerprints
+    """
+    mixed = np.fromiter(map(hash, node_ids), dtype=np.int64).view(np.uint64)
+    mixed = (mixed ^ (mixed >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    mixed = (mixed ^ (mixed >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    mixed ^= mixed >> np.uint64(31)
+    return int(np.bitwise_xor.reduce(mixed, initial=np.uint64(0)))
+
+
+class Message:
+    """One conversation message, with an interned role, an epoch timestamp and its token count"""
+    
+    __slots__ = ('role', 'content', 'timestamp', 'metadata', 'tokens')
+    
+    def __init__(
+        self,
+        role: str,
+        content: str,
+        timestamp: Optional[float] = None,
+        metadata: Optional[Dict[str, Any]] = None
+    ):
+        self.role = sys.intern(role)  # 'user', 'assistant', 'system'
+        self.content = content
+        self.timestamp = time.time() if timestamp is None else timestamp
+        # None rather than an empty dict per message
+        self.metadata = metadata or None
+        # Counted once here, so context windows only add up cached counts
+        self.tokens = estimate_tokens(content)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Message in the serialized form (ISO timestamp)"""
+        return {
+            'role': self.role,
+            'content': self.content,
+            'timestamp': iso_timestamp(self.timestamp),
+            'metadata': self.metadata or {}
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'Message':
+        """Message from its serialized form"""
+        return cls(data['role'], data['content'], epoch_timestamp(data.get('timestamp')), data.get('metadata'))
+
+
+class MessageHistory:
+    """
+    Fixed-capacity ring buffer of messages, oldest first
+    Appending never copies: once full, each new message overwrites the oldest
+    Messages are numbered in append order, so a sequence number stays valid as the ring moves
+    """
+    
+    __slots__ = ('capacity', '_slots', '_start', '_count', 'appended')
+    
+    def __init__(self, capacity: int, messages: Iterable[Message] = ()):
+        self.capacity = capacity
+        self._slots: List[Optional[Message]] = [None] * capacity
+        self._start = 0
+        self._count = 0
+        self.appended = 0
+        for message in messages:
+            self.append(message)
+    
+    def append(self, message: Message) -> Optional[Message]:
+        """Add a message, dropping the oldest when full; returns the message that fell out, if any"""
+        self.appended += 1
+        if not self.capacity:
+            return message
+        slot = (self._start + self._count) % self.capacity
+        dropped = self._slots[slot] if self._count == self.capacity else None
+        self._slots[slot] = message
+        if dropped is None:
+            self._count += 1
+        else:
+            self._start = (self._start + 1) % self.capacity
+        return dropped
+    
+    def recent(self, count: int) -> List[Message]:
+        """The last count messages, oldest first, in O(count)"""
+        count = max(0, min(count, self._count))
+        return [self[i] for i in range(self._count - count, self._count)]
+    
+    @property
+    def first_sequence(self) -> int:
+        """Sequence number of the oldest retained message"""
+        return self.appended - self._count
+    
+    def clear(self):
+        """Drop all messages (sequence numbers keep counting)"""
+        self._slots = [None] * self.capacity
+        self._start = 0
+        self._count = 0
+    
+    def __getitem__(self, index: int) -> Message:
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError('message index out of range')
+        return self._slots[(self._start + index) % self.capacity]
+    
+    def __len__(self) -> int:
+        return self._count
+    
+    def __iter__(self) -> Iterator[Message]:
+        for i in range(self._count):
+            yield self._slots[(self._start + i) % self.capacity]
+
+
+class RollingSummary:
+    """
+    Running summary of the messages that fell out of a conversation's history
+    Folding in a message costs O(len(message)); the text is rebuilt only when read after a change
+    """
+    
+    max_questions = 3
+    question_length = 120
+    
+    def __init__(self):
+        self.message_count = 0
+        self.user_messages = 0
+        self.start: Optional[float] = None
+        self.end: Optional[float] = None
+        self.topic_counts: Dict[str, int] = dict.fromkeys(PHILOSOPHICAL_KEYWORDS, 0)
+        # Most recent user questions among the folded messages, oldest first
+        self.questions: List[str] = []
+        self._text: Optional[str] = None
+        self._tokens = 0
+    
+    def add(self, message: Message, topics: Iterable[str]):
+        """Fold in a message (with its keyword topics)"""
+        self.message_count += 1
+        if self.start is None:
+            self.start = message.timestamp
+        self.end = message.timestamp
+        for keyword in topics:
+            self.topic_counts[keyword] += 1
+        if message.role == 'user':
+            self.user_messages += 1
+            question = ' '.join(message.content.split())
+            if len(question) > self.question_length:
+                question = question[:self.question_length - 3].rstrip() + '...'
+            self.questions = self.questions[1 - self.max_questions:] + [question]
+        self._text = None
+    
+    def _render(self):
+        """Rebuild the summary text and its token count"""
+        if not self.message_count:
+            self._text = ''
+        else:
+            topics = sorted(
+                (keyword for keyword in PHILOSOPHICAL_KEYWORDS if self.topic_counts[keyword]),
+                key=lambda keyword: -self.topic_counts[keyword]
+            )
+            parts = [f"Earlier in this conversation ({self.message_count} messages, {self.user_messages} from the user)"]
+            if topics:
+                parts.append(f"topics discussed: {', '.join(topics)}")
+            if self.questions:
+                parts.append('recent questions: ' + '; '.join(f'"{question}"' for question in self.questions))
+            self._text = '; '.join(parts) + '.'
+        self._tokens = estimate_tokens(self._text)
+    
+    @property
+    def text(self) -> str:
+        """The summary as prompt text (empty before any message is folded in)"""
+        if self._text is None:
+            self._render()
+        return self._text
+    
+    @property
+    def tokens(self) -> int:
+        """Token count of the summary text"""
+        if self._text is None:
+            self._render()
+        return self._tokens
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialize the summary state"""
+        return {
+            'message_count': self.message_count,
+            'user_messages': self.user_messages,
+            'start': iso_timestamp(self.start),
+            'end': iso_timestamp(self.end),
+            'topic_counts': {keyword: count for keyword, count in self.topic_counts.items() if count},
+            'questions': self.questions,
+            'text': self.text
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'RollingSummary':
+        """Restore a summary from its serialized state"""
+        summary = cls()
+        summary.message_count = data.get('message_count', 0)
+        summary.user_messages = data.get('user_messages', 0)
+        summary.start = epoch_timestamp(data.get('start'))
+        summary.end = epoch_timestamp(data.get('end'))
+        summary.topic_counts.update(data.get('topic_counts', {}))
+        summary.questions = list(data.get('questions', []))
+        return summary
+
+
+class OperationRegistry:
+    """
+    Operations keyed by id, with per-type indexes of the active ones
+    Starting and completing are O(1); completed operations are kept up to max_completed
+    (oldest dropped first), while per-type duration statistics cover every operation
+    """
+    
+    max_completed = 100
+    
+    def __init__(self):
+        self.active: Dict[str, Dict[str, Any]] = {}
+        self.completed: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        # type -> ids of its active operations, oldest first
+        self._active_by_type: Dict[str, 'OrderedDict[str, None]'] = {}
+        # type -> [started, completed, total duration, shortest, longest]
+        self._stats: Dict[str, List[Any]] = {}
+    
+    def start(self, operation_type: str, details: Dict[str, Any], operation_id: Optional[str] = None) -> str:
+        """Register a new active operation and return its id"""
+        operation_id = operation_id or str(uuid.uuid4())
+        self.active[operation_id] = {
+            'id': operation_id,
+            'type': operation_type,
+            'details': details,
+            'status': 'active',
+            'started_at': time.time()
+        }
+        self._active_by_type.setdefault(operation_type, OrderedDict())[operation_id] = None
+        self._type_stats(operation_type)[0] += 1
+        return operation_id
+    
+    def complete(
+        self,
+        operation_id: Optional[str] = None,
+        operation_type: Optional[str] = None,
+        result: Optional[Dict[str, Any]] = None,
+        status: str = 'completed'
+    ) -> Optional[Dict[str, Any]]:
+        """Finish an operation given by id, or else the oldest active one of a type; None if there is none"""
+        if operation_id is None:
+            waiting = self._active_by_type.get(operation_type)
+            if not waiting:
+                return None
+            operation_id = next(iter(waiting))
+        operation = self.active.pop(operation_id, None)
+        if operation is None:
+            return None
+        
+        waiting = self._active_by_type[operation['type']]
+        del waiting[operation_id]
+        if not waiting:
+            del self._active_by_type[operation['type']]
+        operation['status'] = status
+        operation['completed_at'] = time.time()
+        operation['result'] = result
+        self._record_duration(operation)
+        self._retain(operation)
+        return operation
+    
+    def get(self, operation_id: str) -> Optional[Dict[str, Any]]:
+        """An active or retained completed operation"""
+        return self.active.get(operation_id) or self.completed.get(operation_id)
+    
+    def active_of_type(self, operation_type: str) -> List[Dict[str, Any]]:
+        """Active operations of a type, oldest first"""
+        return [self.active[operation_id] for operation_id in self._active_by_type.get(operation_type, ())]
+    
+    def operations(self) -> List[Dict[str, Any]]:
+        """Active and retained completed operations, in start order"""
+        return sorted([*self.completed.values(), *self.active.values()], key=lambda operation: operation['started_at'])
+    
+    @property
+    def started(self) -> int:
+        """Operations ever started"""
+        return sum(stats[0] for stats in self._stats.values())
+    
+    def statistics(self) -> Dict[str, Dict[str, Any]]:
+        """Per-type counts and durations in seconds, over every operation rather than only the retained ones"""
+        result = {}
+        for operation_type, (started, completed, total, shortest, longest) in self._stats.items():
+            result[operation_type] = {
+                'started': started,
+                'completed': completed,
+                'active': len(self._active_by_type.get(operation_type, ())),
+                'mean_duration': total / completed if completed else None,
+                'min_duration': shortest,
+                'max_duration': longest
+            }
+        return result
+    
+    def _type_stats(self, operation_type: str) -> List[Any]:
+        """Running statistics of a type"""
+        if operation_type not in self._stats:
+            self._stats[operation_type] = [0, 0, 0.0, None, None]
+        return self._stats[operation_type]
+    
+    def _record_duration(self, operation: Dict[str, Any]):
+        """Add a finished operation's duration to its type's statistics"""
+        stats = self._type_stats(operation['type'])
+        duration = operation['completed_at'] - operation['started_at']
+        stats[1] += 1
+        stats[2] += duration
+        stats[3] = duration if stats[3] is None else min(stats[3], duration)
+        stats[4] = duration if stats[4] is None else max(stats[4], duration)
+    
+    def _retain(self, operation: Dict[str, Any]):
+        """Keep a finished operation, dropping the oldest past max_completed"""
+        self.completed[operation['id']] = operation
+        while len(self.completed) > self.max_completed:
+            self.completed.popitem(last=False)
+    
+    @classmethod
+    def from_operations(
+        cls,
+        operations: Iterable[Dict[str, Any]],
+        statistics: Optional[Dict[str, Dict[str, Any]]] = None
+    ) -> 'OperationRegistry':
+        """Rebuild a registry from serialized operations (epoch times) and, if given, its statistics"""
+        registry = cls()
+        for operation in operations:
+            operation = dict(operation, id=operation.get('id') or str(uuid.uuid4()))
+            if operation.get('status', 'active') == 'active':
+                registry.active[operation['id']] = operation
+                registry._active_by_type.setdefault(operation['type'], OrderedDict())[operation['id']] = None
+                registry._type_stats(operation['type'])[0] += 1
+            else:
+                registry._type_stats(operation['type'])[0] += 1
+                if operation.get('completed_at') is not None:
+                    registry._record_duration(operation)
+                else:
+                    registry._type_stats(operation['type'])[1] += 1
+                registry._retain(operation)
+        for operation_type, stats in (statistics or {}).items():
+            # Serialized statistics also cover operations that were no longer retained
+            total = stats['mean_duration'] * stats['completed'] if stats.get('mean_duration') is not None else 0.0
+            registry._stats[operation_type] = [
+                stats['started'], stats['completed'], total, stats.get('min_duration'), stats.get('max_duration')
+            ]
+        return registry
 
 
 class ConversationContext:
@@ -12,150 +412,329 @@ class ConversationContext:
     
     def __init__(self, max_history: int = 50):
         self.max_history = max_history
-        self.messages: List[Dict[str, Any]] = []
+        self.messages = MessageHistory(max_history)
         self.graph_state_snapshots: List[Dict[str, Any]] = []
-        self.active_operations: List[Dict[str, Any]] = []
+        # Snapshots ever taken, numbering them for pagination
+        self.snapshot_count = 0
+        self.operations = OperationRegistry()
+        # Retained messages mentioning each keyword, kept current as messages come and go
+        self.topic_counts: Dict[str, int] = dict.fromkeys(PHILOSOPHICAL_KEYWORDS, 0)
+        # Messages that fell out of the history, for context windows
+        self.evicted_summary = RollingSummary()
+        # Weak reference to the graph of the latest snapshot, so a session never keeps a
+        # version (and its derived caches) alive; the id deltas cover it once it is gone
+        self._last_graph: Optional[weakref.ref] = None
+        now = time.time()
+        # Times are epoch seconds, formatted as ISO strings by to_dict
         self.metadata: Dict[str, Any] = {
             'session_id': None,
-            'created_at': datetime.now().isoformat(),
-            'last_updated': datetime.now().isoformat()
+            'created_at': now,
+            'last_updated': now
         }
     
     def add_message(self, role: str, content: str, metadata: Optional[Dict] = None):
-        """Add a message to conversation history"""
-        message = {
-            'role': role,  # 'user', 'assistant', 'system'
-            'content': content,
-            'timestamp': datetime.now().isoformat(),
-            'metadata': metadata or {}
-        }
-        
-        self.messages.append(message)
-        
-        # Maintain max history limit
-        if len(self.messages) > self.max_history:
-            self.messages = self.messages[-self.max_history:]
+        """Add a message to conversation history (the oldest drops out past max_history)"""
+        message = Message(role, content, metadata=metadata)
+        self._append(message)
         
-        self.metadata['last_updated'] = datetime.now().isoformat()
+        self.metadata['last_updated'] = message.timestamp
     
-    def add_graph_snapshot(self, graph_data: Dict[str, Any], operation: str):
-        """Capture graph state at a point in time"""
+    def _append(self, message: Message):
+        """Store a message and move the topic counts from the message it displaces to it"""
+        topic_counts = self.topic_counts
+        for keyword in self._message_topics(message):
+            topic_counts[keyword] += 1
+        dropped = self.messages.append(message)
+        if dropped is not None:
+            topics = self._message_topics(dropped)
+            for keyword in topics:
+                topic_counts[keyword] -= 1
+            self.evicted_summary.add(dropped, topics)
+    
+    def add_graph_snapshot(
+        self,
+        graph_data: Dict[str, Any],
+        operation: str,
+        graph: Optional[GraphVersion] = None
+    ):
+        """Capture graph state at a point in time (graph is the stored version behind graph_data, if any)"""
+        graph = graph if graph is not None and graph.data is graph_data else GraphVersion.from_data(graph_data)
+        last_graph = self.last_graph
+        # Node ids are stored as a delta against the previous snapshot, so a session
+        # holds one full id set (the oldest snapshot's) rather than one per snapshot
+        if graph is last_graph:
+            # The same version again (a stored one, or identical inline data sharing one version)
+            added, removed = [], []
+        elif last_graph is not None and graph.delta is not None and graph.parent() is last_graph:
+            # One patch on from the last snapshot: the store already recorded the delta
+            added, removed = graph.delta['nodes_added'], graph.delta['nodes_removed']
+        else:
+            if last_graph is not None:
+                previous = last_graph.node_index
+            elif self.graph_state_snapshots:
+                # The previous graph is gone (or the context was restored): use its ids
+                previous = self.snapshot_nodes()
+            else:
+                previous = {}
+            added = [node_id for node_id in graph.node_index if node_id not in previous] if previous else list(graph.node_index)
+            removed = [node_id for node_id in previous if node_id not in graph.node_index]
+        base = int(self.graph_state_snapshots[-1]['fingerprint'], 16) if self.graph_state_snapshots else 0
         snapshot = {
-            'timestamp': datetime.now().isoformat(),
+            'timestamp': time.time(),
             'operation': operation,
             'node_count': len(graph_data.get('nodes', [])),
             'edge_count': len(graph_data.get('links', [])),
-            'nodes': [node['id'] for node in graph_data.get('nodes', [])],
-            'recent_changes': self._detect_changes(graph_data)
+            'fingerprint': f'{base ^ _id_set_hash(added) ^ _id_set_hash(removed):016x}',
+            'nodes_added': _intern_ids(added),
+            'nodes_removed': _intern_ids(removed),
+            'recent_changes': self._detect_changes(graph, added, removed, last_graph)
         }
         
         self.graph_state_snapshots.append(snapshot)
+        self.snapshot_count += 1
+        self._last_graph = weakref.ref(graph)
         
-        # Keep only last 10 snapshots
-        if len(self.graph_state_snapshots) > 10:
-            self.graph_state_snapshots = self.graph_state_snapshots[-10:]
+        # Keep only the last MAX_SNAPSHOTS snapshots; the new oldest one takes the full id set
+        if len(self.graph_state_snapshots) > MAX_SNAPSHOTS:
+            dropped = self.graph_state_snapshots.pop(0)
+            oldest = self.graph_state_snapshots[0]
+            removed_ids = set(oldest['nodes_removed'])
+            kept = dropped['nodes_added']
+            if removed_ids:
+                kept = tuple(filterfalse(removed_ids.__contains__, kept))
+            self.graph_state_snapshots[0] = dict(oldest, nodes_added=kept + oldest['nodes_added'], nodes_removed=())
+    
+    def snapshot_nodes(self, index: int = -1) -> Set[Any]:
+        """Node ids of a snapshot, rebuilt from the oldest snapshot's ids and the deltas after it"""
+        snapshots = self.graph_state_snapshots
+        if not -len(snapshots) <= index < len(snapshots):
+            raise IndexError('snapshot index out of range')
+        node_ids: Set[Any] = set()
+        for snapshot in snapshots[:index % len(snapshots) + 1]:
+            node_ids.difference_update(snapshot['nodes_removed'])
+            node_ids.update(snapshot['nodes_added'])
+        return node_ids
+    
+    @property
+    def last_graph(self) -> Optional[GraphVersion]:
+        """Graph of the latest snapshot, while something else (e.g. the graph store) keeps it alive"""
+        return self._last_graph() if self._last_graph is not None else None
     
-    def _detect_changes(self, graph_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Detect what changed in the graph"""
+    def _detect_changes(
+        self,
+        graph: GraphVersion,
+        added: List[Any],
+        removed: List[Any],
+        last_graph: Optional[GraphVersion]
+    ) -> Dict[str, Any]:
+        """
+        Detect which nodes and edges were added, removed or modified since the last snapshot
+        Content changes need the previous version; without it only node ids and counts are compared
+        """
         if not self.graph_state_snapshots:
             return {'type': 'initial_state'}
         
-        last_snapshot = self.graph_state_snapshots[-1]
-        current_nodes = set(node['id'] for node in graph_data.get('nodes', []))
-        last_nodes = set(last_snapshot['nodes'])
+        if last_graph is None:
+            return {
+                'added_nodes': list(added),
+                'removed_nodes': list(removed),
+                'node_count_delta': len(added) - len(removed),
+                'edge_count_delta': len(graph.links) - self.graph_state_snapshots[-1]['edge_count']
+            }
         
-        return {
-            'added_nodes': list(current_nodes - last_nodes),
-            'removed_nodes': list(last_nodes - current_nodes),
-            'node_count_delta': len(current_nodes) - len(last_nodes)
-        }
+        changes = summarize_patch(diff_graphs(last_graph, graph), last_graph, graph)
+        changes['node_count_delta'] = len(graph.nodes) - len(last_graph.nodes)
+        changes['edge_count_delta'] = len(graph.links) - len(last_graph.links)
+        return changes
     
-    def track_operation(self, operation_type: str, details: Dict[str, Any]):
-        """Track an ongoing operation"""
-        operation = {
-            'type': operation_type,
-            'details': details,
-            'status': 'active',
-            'started_at': datetime.now().isoformat()
-        }
-        
-        self.active_operations.append(operation)
-    
-    def complete_operation(self, operation_type: str, result: Dict[str, Any]):
-        """Mark an operation as complete"""
-        for op in self.active_operations:
-            if op['type'] == operation_type and op['status'] == 'active':
-                op['status'] = 'completed'
-                op['completed_at'] = datetime.now().isoformat()
-                op['result'] = result
-                break
+    def track_operation(self, operation_type: str, details: Dict[str, Any]) -> str:
+        """Track an ongoing operation; returns its id"""
+        return self.operations.start(operation_type, details)
+    
+    def complete_operation(
+        self,
+        operation_type: str,
+        result: Dict[str, Any],
+        operation_id: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Mark an operation as complete (the one with operation_id, else the oldest active one of the type)"""
+        return self.operations.complete(operation_id, operation_type, result)
+    
+    @property
+    def active_operations(self) -> List[Dict[str, Any]]:
+        """Active and retained completed operations, in start order"""
+        return self.operations.operations()
     
     def get_recent_context(self, message_count: int = 10) -> List[Dict[str, Any]]:
         """Get recent conversation context"""
-        return self.messages[-message_count:]
+        return [message.to_dict() for message in self.messages.recent(message_count)]
+    
+    def get_context_window(self, token_budget: int, include_summary: bool = True) -> Dict[str, Any]:
+        """
+        The longest run of newest messages whose cached token counts fit the budget, oldest first,
+        preceded by the summary of evicted history when that still fits; costs O(window)
+        """
+        window: List[Message] = []
+        used = 0
+        for index in range(len(self.messages) - 1, -1, -1):
+            message = self.messages[index]
+            if used + message.tokens > token_budget:
+                break
+            window.append(message)
+            used += message.tokens
+        window.reverse()
+        
+        summary = None
+        summary_tokens = self.evicted_summary.tokens if include_summary and self.evicted_summary.message_count else 0
+        if summary_tokens and used + summary_tokens <= token_budget:
+            summary = self.evicted_summary.text
+            used += summary_tokens
+        
+        return {
+            'summary': summary,
+            'messages': [message.to_dict() for message in window],
+            'token_count': used,
+            'token_budget': token_budget,
+            'omitted_messages': len(self.messages) - len(window),
+            'summarized_messages': self.evicted_summary.message_count if summary else 0
+        }
     
     def get_conversation_summary(self) -> Dict[str, Any]:
-        """Get a summary of the conversation"""
+        """Get a summary of the conversation, in constant time from the running counts"""
         return {
             'message_count': len(self.messages),
             'session_duration': self._calculate_duration(),
             'topics_discussed': self._extract_topics(),
-            'operations_performed': len(self.active_operations),
+            'operations_performed': self.operations.started,
+            'operations_active': len(self.operations.active),
             'graph_snapshots': len(self.graph_state_snapshots)
         }
     
     def _calculate_duration(self) -> str:
-        """Calculate session duration"""
+        """Session duration between the oldest and newest retained messages"""
         if not self.messages:
             return "0 minutes"
         
-        start = datetime.fromisoformat(self.messages[0]['timestamp'])
-        end = datetime.fromisoformat(self.messages[-1]['timestamp'])
-        duration = (end - start).total_seconds() / 60
+        duration = (self.messages[-1].timestamp - self.messages[0].timestamp) / 60
         
         return f"{int(duration)} minutes"
     
     def _extract_topics(self) -> List[str]:
-        """Extract main topics from conversation"""
-        # Simple keyword extraction - in production, use NLP
-        philosophical_keywords = [
-            'nihiltheism', 'existential', 'anxiety', 'void', 'nothingness',
-            'transcendence', 'meaninglessness', 'despair', 'absurd', 'divine'
-        ]
-        
-        topics = set()
-        for message in self.messages:
-            content_lower = message['content'].lower()
-            for keyword in philosophical_keywords:
-                if keyword in content_lower:
-                    topics.add(keyword)
-        
-        return list(topics)
+        """Main topics of the retained messages, in keyword order"""
+        return [keyword for keyword in PHILOSOPHICAL_KEYWORDS if self.topic_counts[keyword] > 0]
+    
+    @staticmethod
+    def _message_topics(message: Message) -> List[str]:
+        """Keywords mentioned in one message"""
+        content_lower = message.content.lower()
+        return [keyword for keyword in PHILOSOPHICAL_KEYWORDS if keyword in content_lower]
     
     def clear_context(self):
         """Clear conversation context"""
         self.messages.clear()
+        self.topic_counts = dict.fromkeys(PHILOSOPHICAL_KEYWORDS, 0)
+        self.evicted_summary = RollingSummary()
         self.graph_state_snapshots.clear()
-        self.active_operations.clear()
+        self._last_graph = None
+        self.operations = OperationRegistry()
     
     def to_dict(self) -> Dict[str, Any]:
         """Serialize context to dictionary"""
-        return {
-            'metadata': self.metadata,
-            'messages': self.messages,
-            'graph_snapshots': self.graph_state_snapshots,
-            'active_operations': self.active_operations,
-            'summary': self.get_conversation_summary()
-        }
+        return self.export()
+    
+    def export(
+        self,
+        fields: Optional[Iterable[str]] = None,
+        messages_cursor: Optional[int] = None,
+        messages_limit: Optional[int] = None,
+        snapshots_cursor: Optional[int] = None,
+        snapshots_limit: Optional[int] = None,
+        lazy: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Serialize the selected fields (all by default), with messages and graph snapshots paged
+        by sequence-number cursors; 'pages' gives each page's cursor and next_cursor
+        Only the selected page is serialized, so the cost follows the page rather than the session.
+        With lazy=True the pages are generators over the page's items, serialized one at a time
+        as they are consumed (e.g. by stream_json), so the page is never built as a whole
+        """
+        fields = CONTEXT_FIELDS if fields is None else tuple(fields)
+        unknown = [field for field in fields if field not in CONTEXT_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown context fields: {', '.join(unknown)}")
+        
+        result: Dict[str, Any] = {}
+        pages: Dict[str, Dict[str, Any]] = {}
+        for field in CONTEXT_FIELDS:
+            if field not in fields:
+                continue
+            if field == 'metadata':
+                result[field] = convert_times(self.metadata, ('created_at', 'last_updated'), iso_timestamp)
+            elif field == 'messages':
+                start, end, pages[field] = _page(len(self.messages), self.messages.first_sequence, messages_cursor, messages_limit)
+                # The page's messages are picked now, so later appends cannot shift a lazy page
+                page = (message.to_dict() for message in [self.messages[i] for i in range(start, end)])
+                result[field] = page if lazy else list(page)
+            elif field == 'evicted_summary':
+                result[field] = self.evicted_summary.to_dict()
+            elif field == 'graph_snapshots':
+                snapshots = self.graph_state_snapshots
+                start, end, pages[field] = _page(
+                    len(snapshots), self.snapshot_count - len(snapshots), snapshots_cursor, snapshots_limit
+                )
+                page = (convert_times(snapshot, ('timestamp',), iso_timestamp) for snapshot in snapshots[start:end])
+                result[field] = page if lazy else list(page)
+            elif field == 'active_operations':
+                result[field] = [
+                    convert_times(operation, ('started_at', 'completed_at'), iso_timestamp) for operation in self.active_operations
+                ]
+            elif field == 'operation_stats':
+                result[field] = self.operations.statistics()
+            else:
+                result[field] = self.get_conversation_summary()
+        if pages:
+            result['pages'] = pages
+        return result
     
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> 'ConversationContext':
-        """Deserialize context from dictionary"""
+        """
+        Deserialize context from dictionary
+        Message and snapshot sequence numbers continue from the exported pages' cursors, so
+        cursors handed out before the export stay valid after the restore
+        """
+        pages = data.get('pages', {})
         context = cls()
-        context.metadata = data.get('metadata', {})
-        context.messages = data.get('messages', [])
-        context.graph_state_snapshots = data.get('graph_snapshots', [])
-        context.active_operations = data.get('active_operations', [])
+        context.metadata = convert_times(data.get('metadata', {}), ('created_at', 'last_updated'), epoch_timestamp)
+        if 'evicted_summary' in data:
+            context.evicted_summary = RollingSummary.from_dict(data['evicted_summary'])
+        messages = data.get('messages', [])
+        for message in messages:
+            context._append(Message.from_dict(message))
+        if 'messages' in pages:
+            context.messages.appended = pages['messages']['cursor'] + len(messages)
+        context.graph_state_snapshots = [
+            dict(
+                convert_times(snapshot, ('timestamp',), epoch_timestamp),
+                nodes_added=_intern_ids(snapshot.get('nodes_added', ())),
+                nodes_removed=_intern_ids(snapshot.get('nodes_removed', ()))
+            )
+            for snapshot in data.get('graph_snapshots', [])
+        ]
+        fingerprint = 0
+        for snapshot in context.graph_state_snapshots:
+            fingerprint ^= _id_set_hash(snapshot['nodes_added']) ^ _id_set_hash(snapshot['nodes_removed'])
+            snapshot['fingerprint'] = f'{fingerprint:016x}'
+        context.snapshot_count = len(context.graph_state_snapshots)
+        if 'graph_snapshots' in pages:
+            context.snapshot_count += pages['graph_snapshots']['cursor']
+        context.operations = OperationRegistry.from_operations(
+            (
+                convert_times(operation, ('started_at', 'completed_at'), epoch_timestamp)
+                for operation in data.get('active_operations', [])
+            ),
+            data.get('operation_stats')
+        )
         return context
 
 
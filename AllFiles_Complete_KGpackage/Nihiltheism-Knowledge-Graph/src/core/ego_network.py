@@ -0,0 +1,138 @@
+"""
+Ego Network for AI Brain
+k-hop neighbourhood subgraphs of one or more seed nodes, with relationship filters and
+node and link caps, served from the adjacency index and cached per graph version
+"""
+from typing import Dict, Any, List, Optional, Iterable, FrozenSet
+from collections import OrderedDict
+import threading
+
+from ..store.graph_store import GraphVersion
+from .graph_index import AdjacencyIndex
+from .expansion_service import _clamp
+
+# (default, minimum, maximum)
+HOP_LIMITS = (1, 1, 4)
+NODE_LIMITS = (200, 1, 2000)
+EDGE_LIMITS = (500, 0, 5000)
+
+
+def ego_network(
+    graph: GraphVersion,
+    seed_ids: List[str],
+    k: int,
+    relationships: Optional[FrozenSet[Optional[str]]] = None,
+    max_nodes: int = NODE_LIMITS[0],
+    max_edges: int = EDGE_LIMITS[0]
+) -> Dict[str, Any]:
+    """
+    Nodes within k hops of any seed over links whose relationship is allowed (all links
+    when relationships is None), and the allowed links among them, nearest first
+    Seeds count towards max_nodes; raises KeyError when no seed is a node of the graph
+    """
+    adjacency = AdjacencyIndex.for_graph(graph)
+    links = graph.links
+    seeds = [adjacency.index[seed_id] for seed_id in seed_ids if seed_id in adjacency.index]
+    if not seeds:
+        raise KeyError(f"None of the seed nodes {seed_ids} found")
+
+    def allowed(edge_id: int) -> bool:
+        return relationships is None or links[edge_id].get('relationship') in relationships
+
+    # Breadth-first from all seeds at once, so each node gets its distance to the nearest seed
+    hops: Dict[int, int] = {i: 0 for i in seeds[:max_nodes]}
+    truncated = len(seeds) > max_nodes
+    frontier = list(hops)
+    for depth in range(1, k + 1):
+        next_frontier = []
+        for i in frontier:
+            for j, edge_id in zip(adjacency.neighbor_indices(i), adjacency.edge_indices(i)):
+                if j in hops or not allowed(edge_id):
+                    continue
+                if len(hops) >= max_nodes:
+                    truncated = True
+                    break
+                hops[j] = depth
+                next_frontier.append(j)
+            if truncated:
+                break
+        frontier = next_frontier
+        if truncated or not frontier:
+            break
+
+    # Links among reached nodes, each once, in the breadth-first order of their endpoints
+    edges: List[Dict[str, Any]] = []
+    included = set()
+    edges_full = False
+    for i in hops:
+        for j, edge_id in zip(adjacency.neighbor_indices(i), adjacency.edge_indices(i)):
+            if j not in hops or edge_id in included or not allowed(edge_id):
+                continue
+            if len(edges) >= max_edges:
+                edges_full = True
+                break
+            included.add(edge_id)
+            edges.append(links[edge_id])
+        if edges_full:
+            break
+
+    return {
+        'seeds': [adjacency.ids[i] for i in seeds],
+        'missing_seeds': [seed_id for seed_id in seed_ids if seed_id not in adjacency.index],
+        'k': k,
+        'nodes': [graph.get_node(adjacency.ids[i]) for i in hops],
+        'hops': {adjacency.ids[i]: depth for i, depth in hops.items()},
+        'links': edges,
+        'truncated': truncated or edges_full
+    }
+
+
+class EgoNetworks:
+    """
+    Least-recently-used cache of ego networks for one graph version
+    Results are shared between callers and must be treated as read-only
+    """
+
+    max_cached = 256
+
+    def __init__(self):
+        self._cache: 'OrderedDict[tuple, Dict[str, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_graph(cls, graph: GraphVersion) -> 'EgoNetworks':
+        """Get the ego network cache of a graph version"""
+        return graph.derived('ego_networks', lambda g: cls())
+
+    def query(
+        self,
+        graph: GraphVersion,
+        seed_ids: Iterable[str],
+        k: Optional[int] = None,
+        relationships: Optional[Iterable[Optional[str]]] = None,
+        max_nodes: Optional[int] = None,
+        max_edges: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Ego network of the seeds with budgets clamped to their limits, computed once per distinct query"""
+        seed_ids = sorted(set(seed_ids))
+        allowed = frozenset(relationships) if relationships is not None else None
+        k = _clamp(k, HOP_LIMITS)
+        max_nodes = _clamp(max_nodes, NODE_LIMITS)
+        max_edges = _clamp(max_edges, EDGE_LIMITS)
+        key = (
+            tuple(seed_ids), k,
+            tuple(sorted(allowed, key=str)) if allowed is not None else None,
+            max_nodes, max_edges
+        )
+
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+        result = ego_network(graph, seed_ids, k, allowed, max_nodes, max_edges)
+        with self._lock:
+            self._cache[key] = result
+            while len(self._cache) > self.max_cached:
+                self._cache.popitem(last=False)
+        return result
@@ -0,0 +1,527 @@
+"""
+Embedding Index for AI Brain
+Local concept embeddings (hashing vectoriser + TF-IDF + random projection) with a
+random-hyperplane LSH index for semantic related-concept lookups, optionally persisted to disk
+"""
+from typing import Dict, Any, List, Optional, Tuple, Iterable
+from functools import lru_cache
+import copy
+import hashlib
+import math
+import os
+import zlib
+
+import numpy as np
+from scipy import sparse
+
+from ..store.graph_store import GraphVersion
+from .search_index import tokenize
+
+# Persistence is opt-in: without AI_BRAIN_EMBEDDING_DIR, embeddings live in memory only
+DEFAULT_STORAGE_DIR = os.environ.get('AI_BRAIN_EMBEDDING_DIR') or None
+
+_projections: Dict[Tuple[int, int, int], np.ndarray] = {}
+
+
+@lru_cache(maxsize=65536)
+def _token_features(token: str) -> Tuple[Tuple[int, float], ...]:
+    """Hashed word and character-trigram features of one token (cached; vocabularies repeat)"""
+    padded = f'<{token}>'
+    features = [(zlib.crc32(('w:' + token).encode('utf-8')), 1.0)]
+    features.extend(
+        (zlib.crc32(('c:' + padded[i:i + 3]).encode('utf-8')), 0.5) for i in range(len(padded) - 2)
+    )
+    return tuple(features)
+
+
+def hashed_features(text: str, weight: float = 1.0) -> Dict[int, float]:
+    """
+    Feature-hashed bag of words, word bigrams and character trigrams
+    Keys are 32-bit hashes; trigrams let morphological variants (nihilism, nihilist) overlap
+    """
+    features: Dict[int, float] = {}
+    tokens = tokenize(text)
+    for token in tokens:
+        for key, value in _token_features(token):
+            features[key] = features.get(key, 0.0) + weight * value
+    for first, second in zip(tokens, tokens[1:]):
+        key = zlib.crc32(f'b:{first} {second}'.encode('utf-8'))
+        features[key] = features.get(key, 0.0) + weight * 0.5
+    return features
+
+
+def random_projection(n_features: int, dim: int, seed: int) -> np.ndarray:
+    """Sparse (Achlioptas) random projection matrix, shared by all indexes with the same shape"""
+    key = (n_features, dim, seed)
+    if key not in _projections:
+        rng = np.random.default_rng(seed)
+        signs = rng.choice(np.array([-1.0, 0.0, 1.0], dtype=np.float32), size=(n_features, dim), p=[1 / 6, 2 / 3, 1 / 6])
+        _projections[key] = signs * np.float32(math.sqrt(3.0 / dim))
+    return _projections[key]
+
+
+class EmbeddingIndex:
+    """
+    Semantic index over node labels and descriptions
+    Term frequencies are kept per node so embeddings can be refreshed when the IDF
+    weights drift; queries probe LSH buckets and re-rank candidates by exact cosine
+    """
+
+    storage_dir: Optional[str] = DEFAULT_STORAGE_DIR
+
+    def __init__(
+        self,
+        dim: int = 256,
+        n_features: int = 2 ** 14,
+        tables: int = 32,
+        bits: int = 12,
+        seed: int = 0,
+        exact_limit: int = 1024,
+        refresh_ratio: float = 0.25,
+        save_every: int = 100
+    ):
+        self.dim = dim
+        self.n_features = n_features
+        self.tables = tables
+        self.bits = bits
+        self.seed = seed
+        # Small indexes are scanned exactly; LSH pays off beyond exact_limit rows
+        self.exact_limit = exact_limit
+        self.refresh_ratio = refresh_ratio
+        # Incremental updates are persisted once this many nodes have changed
+        self.save_every = save_every
+
+        self.projection = random_projection(n_features, dim, seed)
+        self.hyperplanes = np.random.default_rng(seed + 1).standard_normal((tables * bits, dim)).astype(np.float32)
+        self.powers = 1 << np.arange(bits, dtype=np.int64)
+
+        # node_id -> (hashed feature indices, sublinear tf values) and content checksum
+        self.term_frequencies: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self.checksums: Dict[str, int] = {}
+        self.document_frequency = np.zeros(n_features, dtype=np.int64)
+        self.idf_document_count = 0
+
+        # Embedding rows; removed rows are recycled. After copy() the matrix is shared with the
+        # other index and never written: changed rows go to overrides until they are folded in
+        self.embeddings = np.zeros((16, dim), dtype=np.float32)
+        self.shared = False
+        self.overrides: Dict[int, np.ndarray] = {}
+        self.overridden = np.zeros(16, dtype=bool)
+        self.row_ids: List[Optional[str]] = []
+        self.rows: Dict[str, int] = {}
+        self.free_rows: List[int] = []
+        self.codes: Dict[int, np.ndarray] = {}
+        # Per table: bucket code -> array of rows
+        self.buckets: List[Dict[int, np.ndarray]] = [{} for _ in range(tables)]
+
+        self.pending_changes = 0
+
+    @classmethod
+    def for_graph(cls, graph: GraphVersion) -> 'EmbeddingIndex':
+        """Get the embedding index of a graph version, updating a copy of the parent version's index if possible"""
+        return graph.derived_incremental('embedding_index', cls.from_graph, cls._apply_delta)
+
+    @classmethod
+    def from_graph(cls, graph: GraphVersion) -> 'EmbeddingIndex':
+        """
+        Build an index over every node of a graph version
+        Stored graphs reuse the embeddings persisted for their graph id, re-embedding
+        only nodes whose label or description changed since
+        """
+        path = cls.storage_path(graph.graph_id)
+        index = cls.load(path) if path and os.path.exists(path) else cls()
+
+        current = set()
+        changed = []
+        for node in graph.nodes:
+            current.add(node['id'])
+            if index.checksums.get(node['id']) != cls.checksum(node):
+                index.add_node(node, embed=False)
+                changed.append(node['id'])
+        for node_id in [node_id for node_id in index.checksums if node_id not in current]:
+            index.remove_node(node_id)
+
+        # One batched embedding pass, unless only a few persisted nodes changed
+        if index._idf_drifted() or len(changed) > index.refresh_ratio * len(current):
+            index.refresh()
+        else:
+            idf = index._idf()
+            for node_id in changed:
+                index._store(node_id, index._embed(*index.term_frequencies[node_id], idf))
+
+        if path and index.pending_changes:
+            index.save(path)
+        return index
+
+    def copy(self) -> 'EmbeddingIndex':
+        """
+        Copy that can be maintained without changing this index
+        Term frequencies, codes and bucket arrays are replaced rather than modified, so they are
+        shared; so is the embedding matrix, with rows changed afterwards kept per index
+        """
+        index = copy.copy(self)
+        index.term_frequencies = dict(self.term_frequencies)
+        index.checksums = dict(self.checksums)
+        index.document_frequency = self.document_frequency.copy()
+        self.shared = index.shared = True
+        index.overrides = dict(self.overrides)
+        index.overridden = self.overridden.copy()
+        index.row_ids = list(self.row_ids)
+        index.rows = dict(self.rows)
+        index.free_rows = list(self.free_rows)
+        index.codes = dict(self.codes)
+        index.buckets = [dict(table) for table in self.buckets]
+        return index
+
+    def _apply_delta(self, graph: GraphVersion):
+        """Bring an index built for the parent version up to date with graph.delta"""
+        for node_id in graph.delta['nodes_removed']:
+            self.remove_node(node_id)
+        for node_id in graph.delta['nodes_added'] + graph.delta['nodes_updated']:
+            self.add_node(graph.get_node(node_id))
+
+        path = self.storage_path(graph.graph_id)
+        if path and self.pending_changes >= self.save_every:
+            self.save(path)
+
+    # Vectorising
+
+    @staticmethod
+    def checksum(node: Dict[str, Any]) -> int:
+        """Checksum of the text a node is embedded from"""
+        return zlib.crc32(f"{node.get('label') or ''}\x00{node.get('description') or ''}".encode('utf-8'))
+
+    def _term_frequencies(self, text_fields: Iterable[Tuple[str, float]]) -> Tuple[np.ndarray, np.ndarray]:
+        """Hashed, signed, sublinear term frequencies of weighted text fields"""
+        counts: Dict[int, float] = {}
+        for text, weight in text_fields:
+            for key, value in hashed_features(text, weight).items():
+                column = key % self.n_features
+                sign = 1.0 if key & 0x80000000 else -1.0
+                counts[column] = counts.get(column, 0.0) + sign * value
+
+        columns = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+        values = np.fromiter(counts.values(), dtype=np.float64, count=len(counts))
+        keep = values != 0
+        columns, values = columns[keep], values[keep]
+        return columns, np.sign(values) * np.log1p(np.abs(values))
+
+    def _idf(self) -> np.ndarray:
+        """Smoothed inverse document frequencies"""
+        documents = len(self.term_frequencies)
+        return np.log((1.0 + documents) / (1.0 + self.document_frequency)) + 1.0
+
+    def _embed(self, columns: np.ndarray, values: np.ndarray, idf: np.ndarray) -> np.ndarray:
+        """Unit-length embedding of one tf vector"""
+        vector = (values * idf[columns]).astype(np.float32) @ self.projection[columns]
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def embed_text(self, text: str) -> np.ndarray:
+        """Embedding of free text with the index's current IDF weights"""
+        columns, values = self._term_frequencies([(text, 1.0)])
+        return self._embed(columns, values, self._idf())
+
+    # Incremental maintenance
+
+    def add_node(self, node: Dict[str, Any], embed: bool = True):
+        """
+        Embed and index a node (re-embedding it if already present)
+        With embed=False only term statistics are recorded; call refresh() afterwards
+        """
+        node_id = node['id']
+        if node_id in self.term_frequencies:
+            self.remove_node(node_id)
+
+        columns, values = self._term_frequencies([
+            (node.get('label') or '', 2.0),
+            (node.get('description') or '', 1.0)
+        ])
+        self.term_frequencies[node_id] = (columns, values)
+        self.checksums[node_id] = self.checksum(node)
+        self.document_frequency[columns] += 1
+        self.pending_changes += 1
+
+        if not embed:
+            return
+        if self._idf_drifted():
+            self.refresh()
+        else:
+            self._store(node_id, self._embed(columns, values, self._idf()))
+
+    def update_node(self, node: Dict[str, Any]):
+        """Re-embed a node whose text changed"""
+        if self.checksums.get(node['id']) != self.checksum(node):
+            self.add_node(node)
+
+    def remove_node(self, node_id: str) -> bool:
+        """Remove a node from the index"""
+        if node_id not in self.term_frequencies:
+            return False
+        columns, _ = self.term_frequencies.pop(node_id)
+        self.document_frequency[columns] -= 1
+        del self.checksums[node_id]
+
+        row = self.rows.pop(node_id, None)
+        if row is not None:
+            self._unbucket(row)
+            self.row_ids[row] = None
+            self._write_row(row, np.zeros(self.dim, dtype=np.float32))
+            self.free_rows.append(row)
+        self.pending_changes += 1
+        return True
+
+    def _idf_drifted(self) -> bool:
+        """Whether the corpus grew or shrank enough that stored embeddings use stale IDF weights"""
+        documents = len(self.term_frequencies)
+        baseline = max(self.idf_document_count, 1)
+        return abs(documents - self.idf_document_count) > self.refresh_ratio * baseline and documents > 8
+
+    def refresh(self):
+        """Re-embed every node with the current IDF weights (one sparse product)"""
+        node_ids = list(self.term_frequencies)
+        self.idf_document_count = len(node_ids)
+        if not node_ids:
+            return
+
+        lengths = [len(self.term_frequencies[node_id][0]) for node_id in node_ids]
+        indptr = np.concatenate(([0], np.cumsum(lengths)))
+        columns = np.concatenate([self.term_frequencies[node_id][0] for node_id in node_ids])
+        values = np.concatenate([self.term_frequencies[node_id][1] for node_id in node_ids])
+        matrix = sparse.csr_matrix((values, columns, indptr), shape=(len(node_ids), self.n_features))
+
+        embeddings = np.asarray((matrix @ sparse.diags(self._idf())) @ self.projection, dtype=np.float32)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        embeddings = np.divide(embeddings, norms, out=np.zeros_like(embeddings), where=norms > 0)
+
+        rows = np.array([self._row(node_id) for node_id in node_ids], dtype=np.int64)
+        self._own_embeddings()
+        self.embeddings[rows] = embeddings
+        self._rebuild_buckets()
+
+    def _row(self, node_id: str) -> int:
+        """Row holding a node's embedding, allocating (and growing the matrix) if needed"""
+        row = self.rows.get(node_id)
+        if row is not None:
+            return row
+
+        row = self.free_rows.pop() if self.free_rows else len(self.row_ids)
+        if row == len(self.row_ids):
+            self.row_ids.append(node_id)
+        else:
+            self.row_ids[row] = node_id
+        self.rows[node_id] = row
+        if row >= len(self.embeddings):
+            self._own_embeddings(max(len(self.embeddings) * 2, row + 1))
+        return row
+
+    def _own_embeddings(self, capacity: Optional[int] = None):
+        """Give this index its own embedding matrix (of at least capacity rows), folding in its overrides"""
+        capacity = max(capacity or 0, len(self.embeddings))
+        if not self.shared and capacity == len(self.embeddings):
+            return
+        embeddings = np.zeros((capacity, self.dim), dtype=np.float32)
+        embeddings[:len(self.embeddings)] = self.embeddings
+        for row, vector in self.overrides.items():
+            embeddings[row] = vector
+        self.embeddings = embeddings
+        self.shared = False
+        self.overrides = {}
+        self.overridden = np.zeros(capacity, dtype=bool)
+
+    def _write_row(self, row: int, vector: np.ndarray):
+        """Set one embedding row; a shared matrix gets an override until they pass 1/8 of the rows"""
+        if not self.shared:
+            self.embeddings[row] = vector
+            return
+        self.overrides[row] = vector
+        self.overridden[row] = True
+        if len(self.overrides) > len(self.embeddings) // 8:
+            self._own_embeddings()
+
+    def _vectors(self, rows: np.ndarray) -> np.ndarray:
+        """Embeddings of rows (a new array), with this index's overrides applied"""
+        vectors = self.embeddings[rows]
+        if self.overrides:
+            hits = np.flatnonzero(self.overridden[rows])
+            if len(hits):
+                vectors[hits] = np.stack([self.overrides[row] for row in rows[hits].tolist()])
+        return vectors
+
+    def _store(self, node_id: str, embedding: np.ndarray):
+        """Write a node's embedding to its row and LSH buckets"""
+        row = self._row(node_id)
+        self._unbucket(row)
+
+        self._write_row(row, embedding)
+        codes = self._codes(embedding[None, :])[0]
+        self.codes[row] = codes
+        for table, code in zip(self.buckets, codes.tolist()):
+            bucket = table.get(code)
+            table[code] = np.append(bucket, row) if bucket is not None else np.array([row], dtype=np.int64)
+
+    def _rebuild_buckets(self):
+        """Recompute every row's LSH codes and regroup the buckets in one batch"""
+        rows = np.fromiter(self.rows.values(), dtype=np.int64, count=len(self.rows))
+        self.buckets = [{} for _ in range(self.tables)]
+        self.codes = {}
+        if not len(rows):
+            return
+
+        codes = self._codes(self._vectors(rows))
+        self.codes = dict(zip(rows.tolist(), codes))
+        for table, table_codes in zip(self.buckets, codes.T):
+            order = np.argsort(table_codes, kind='stable')
+            unique_codes, starts = np.unique(table_codes[order], return_index=True)
+            for code, members in zip(unique_codes.tolist(), np.split(rows[order], starts[1:])):
+                table[code] = members
+
+    def _unbucket(self, row: int):
+        """Remove a row from its LSH buckets"""
+        codes = self.codes.pop(row, None)
+        if codes is None:
+            return
+        for table, code in zip(self.buckets, codes.tolist()):
+            bucket = table.get(code)
+            if bucket is not None:
+                bucket = bucket[bucket != row]
+                if len(bucket):
+                    table[code] = bucket
+                else:
+                    del table[code]
+
+    def _codes(self, vectors: np.ndarray) -> np.ndarray:
+        """LSH bucket code of each vector in each table (rows x tables)"""
+        signs = (vectors @ self.hyperplanes.T > 0).reshape(len(vectors), self.tables, self.bits)
+        return signs.astype(np.int64) @ self.powers
+
+    # Querying
+
+    def _candidates(self, vector: np.ndarray, probes: int = 3) -> np.ndarray:
+        """
+        Rows in the query's bucket in every table, plus the buckets reached by flipping
+        each of the query's `probes` least confident bits (query-directed multi-probe),
+        since related concepts sit at moderate cosine where exact buckets often miss
+        """
+        projections = (self.hyperplanes @ vector).reshape(self.tables, self.bits)
+        codes = (projections > 0).astype(np.int64) @ self.powers
+        uncertain = np.argsort(np.abs(projections), axis=1)[:, :probes]
+        probe_codes = np.concatenate((codes[:, None], codes[:, None] ^ self.powers[uncertain]), axis=1)
+
+        found = [
+            table[code]
+            for table, table_codes in zip(self.buckets, probe_codes.tolist())
+            for code in table_codes if code in table
+        ]
+        if not found:
+            return np.zeros(0, dtype=np.int64)
+        seen = np.zeros(len(self.row_ids), dtype=bool)
+        seen[np.concatenate(found)] = True
+        return np.flatnonzero(seen)
+
+    def query(
+        self,
+        text: Optional[str] = None,
+        k: int = 5,
+        vector: Optional[np.ndarray] = None,
+        min_similarity: float = 0.0,
+        exclude: Iterable[str] = ()
+    ) -> List[Tuple[str, float]]:
+        """Up to k (node_id, cosine similarity) pairs most similar to text (or vector), best first"""
+        if vector is None:
+            vector = self.embed_text(text or '')
+        if not self.rows or not vector.any():
+            return []
+
+        excluded = set(exclude)
+        wanted = k + len(excluded)
+        if len(self.rows) <= self.exact_limit:
+            rows = np.fromiter(self.rows.values(), dtype=np.int64, count=len(self.rows))
+        else:
+            rows = self._candidates(vector)
+        if not len(rows):
+            return []
+
+        similarities = self._vectors(rows) @ vector
+        if len(rows) > wanted:
+            top = np.argpartition(-similarities, wanted - 1)[:wanted]
+            rows, similarities = rows[top], similarities[top]
+        order = np.argsort(-similarities, kind='stable')
+
+        results = []
+        for row, similarity in zip(rows[order].tolist(), similarities[order].tolist()):
+            node_id = self.row_ids[row]
+            if node_id in excluded or similarity < min_similarity:
+                continue
+            results.append((node_id, similarity))
+            if len(results) >= k:
+                break
+        return results
+
+    def similar_nodes(self, node_id: str, k: int = 5, min_similarity: float = 0.0) -> List[Tuple[str, float]]:
+        """Nodes most similar to an indexed node, excluding itself"""
+        row = self.rows.get(node_id)
+        if row is None:
+            return []
+        return self.query(vector=self._vectors(np.array([row]))[0], k=k, min_similarity=min_similarity, exclude=[node_id])
+
+    # Persistence
+
+    @classmethod
+    def storage_path(cls, graph_id: Optional[str]) -> Optional[str]:
+        """
+        File the embeddings of a stored graph persist to, named by a hash of the graph id so
+        distinct ids never share a file (None for unstored graphs or when persistence is off)
+        """
+        if not graph_id or not cls.storage_dir:
+            return None
+        digest = hashlib.sha256(graph_id.encode('utf-8')).hexdigest()
+        return os.path.join(cls.storage_dir, f'{digest}.npz')
+
+    def save(self, path: str):
+        """Persist term frequencies and embeddings; LSH buckets are rebuilt on load"""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        node_ids = list(self.term_frequencies)
+        lengths = np.array([len(self.term_frequencies[node_id][0]) for node_id in node_ids], dtype=np.int64)
+        rows = np.array([self.rows[node_id] for node_id in node_ids], dtype=np.int64)
+
+        temporary = f'{path}.tmp.npz'
+        np.savez_compressed(
+            temporary,
+            config=np.array([self.dim, self.n_features, self.tables, self.bits, self.seed, self.idf_document_count]),
+            node_ids=np.array(node_ids, dtype=str),
+            checksums=np.array([self.checksums[node_id] for node_id in node_ids], dtype=np.int64),
+            lengths=lengths,
+            columns=np.concatenate([self.term_frequencies[node_id][0] for node_id in node_ids]) if node_ids else np.zeros(0, dtype=np.int64),
+            values=np.concatenate([self.term_frequencies[node_id][1] for node_id in node_ids]) if node_ids else np.zeros(0),
+            embeddings=self._vectors(rows) if node_ids else np.zeros((0, self.dim), dtype=np.float32)
+        )
+        os.replace(temporary, path)
+        self.pending_changes = 0
+
+    @classmethod
+    def load(cls, path: str) -> 'EmbeddingIndex':
+        """Load an index saved with save()"""
+        with np.load(path) as stored:
+            dim, n_features, tables, bits, seed, idf_document_count = stored['config'].tolist()
+            index = cls(dim=dim, n_features=n_features, tables=tables, bits=bits, seed=seed)
+            offsets = np.concatenate(([0], np.cumsum(stored['lengths'])))
+            columns, values = stored['columns'], stored['values']
+
+            for i, (node_id, checksum) in enumerate(zip(stored['node_ids'].tolist(), stored['checksums'].tolist())):
+                node_columns = columns[offsets[i]:offsets[i + 1]]
+                index.term_frequencies[node_id] = (node_columns, values[offsets[i]:offsets[i + 1]])
+                index.checksums[node_id] = checksum
+                index.document_frequency[node_columns] += 1
+
+            node_ids = stored['node_ids'].tolist()
+            embeddings = stored['embeddings']
+            index.idf_document_count = idf_document_count
+            index.embeddings = np.zeros((max(16, len(node_ids)), dim), dtype=np.float32)
+            index.embeddings[:len(node_ids)] = embeddings
+            index.overridden = np.zeros(len(index.embeddings), dtype=bool)
+            index.row_ids = list(node_ids)
+            index.rows = {node_id: row for row, node_id in enumerate(node_ids)}
+
+        index._rebuild_buckets()
+        return index
@@ -0,0 +1,262 @@
+"""
+Expansion Service for AI Brain
+Server-side bounded BFS expansion jobs over stored graph versions, with hard node
+and edge budgets, streamed partial results and cancellation by job id
+"""
+from typing import Dict, Any, List, Optional, Callable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+import uuid
+
+from ..store.graph_store import GraphVersion
+from .graph_index import AdjacencyIndex
+from ..utils.timestamps import iso_timestamp
+
+# (default, minimum, maximum), matching the client-side ExpansionController limits
+DEPTH_LIMITS = (2, 1, 3)
+NODE_LIMITS = (100, 10, 500)
+EDGE_LIMITS = (200, 20, 1000)
+
+
+def _clamp(value: Optional[int], limits) -> int:
+    """Clamp a requested budget into its allowed range"""
+    default, low, high = limits
+    return max(low, min(high, int(value))) if value is not None else default
+
+
+def bounded_bfs(
+    graph: GraphVersion,
+    seed_id: str,
+    max_depth: int,
+    max_nodes: int,
+    max_edges: int,
+    batch_size: int = 25,
+    should_stop: Callable[[], bool] = lambda: False
+) -> Iterator[Dict[str, Any]]:
+    """
+    Breadth-first expansion from a seed node, yielding batches of newly reached nodes
+    and the links among reached nodes; stops at max_depth hops, max_nodes nodes
+    (excluding the seed), max_edges links, or when should_stop() returns True
+    """
+    adjacency = AdjacencyIndex.for_graph(graph)
+    seed = adjacency.index.get(seed_id)
+    if seed is None:
+        raise KeyError(f"Node {seed_id} not found")
+
+    visited = {seed}
+    included_edges = set()
+    frontier = [seed]
+    nodes: List[Dict[str, Any]] = []
+    edges: List[Dict[str, Any]] = []
+    node_total = edge_total = 0
+
+    for depth in range(1, max_depth + 1):
+        next_frontier = []
+        for i in frontier:
+            if should_stop():
+                return
+            for j, edge_id in zip(adjacency.neighbor_indices(i), adjacency.edge_indices(i)):
+                if j not in visited:
+                    if node_total >= max_nodes:
+                        continue
+                    visited.add(j)
+                    next_frontier.append(j)
+                    nodes.append(graph.get_node(adjacency.ids[j]))
+                    node_total += 1
+                # Links between reached nodes, each once
+                if edge_id not in included_edges and edge_total < max_edges:
+                    included_edges.add(edge_id)
+                    edges.append(graph.links[edge_id])
+                    edge_total += 1
+
+                if len(nodes) >= batch_size or len(edges) >= batch_size * 2:
+                    yield {'depth': depth, 'nodes': nodes, 'edges': edges}
+                    nodes, edges = [], []
+
+        if nodes or edges:
+            yield {'depth': depth, 'nodes': nodes, 'edges': edges}
+            nodes, edges = [], []
+        frontier = next_frontier
+        if not frontier or (node_total >= max_nodes and edge_total >= max_edges):
+            break
+
+
+class ExpansionJob:
+    """
+    A running or finished expansion, holding its streamed batches
+    The graph version is released once the job finishes; only its reference is kept
+    """
+
+    def __init__(self, graph: GraphVersion, seed_id: str, config: Dict[str, int]):
+        self.id = str(uuid.uuid4())
+        self.graph: Optional[GraphVersion] = graph
+        self.graph_reference = graph.reference()
+        self.seed_id = seed_id
+        self.config = config
+        self.status = 'pending'
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.completed_at: Optional[float] = None
+        self.batches: List[Dict[str, Any]] = []
+        self.node_count = 0
+        self.edge_count = 0
+        self._cancelled = threading.Event()
+        self._listeners: List[Callable[['ExpansionJob', Optional[Dict[str, Any]]], None]] = []
+        self._lock = threading.Lock()
+
+    @property
+    def finished(self) -> bool:
+        """Whether the job has stopped running"""
+        return self.status in ('completed', 'cancelled', 'error')
+
+    def cancel(self) -> bool:
+        """Request cancellation; the job stops before expanding its next node"""
+        if self.finished:
+            return False
+        self._cancelled.set()
+        return True
+
+    def subscribe(self, listener: Callable[['ExpansionJob', Optional[Dict[str, Any]]], None]):
+        """
+        Receive batches as they are produced: listener(job, batch) per batch and
+        listener(job, None) once the job finishes; batches so far are replayed first
+        """
+        with self._lock:
+            replay = list(self.batches)
+            finished = self.finished
+            if not finished:
+                self._listeners.append(listener)
+        for batch in replay:
+            listener(self, batch)
+        if finished:
+            listener(self, None)
+
+    def batches_since(self, cursor: int) -> List[Dict[str, Any]]:
+        """Batches from position cursor onwards, for polling clients"""
+        with self._lock:
+            return self.batches[cursor:]
+
+    def run(self):
+        """Run the expansion, recording and publishing each batch"""
+        self.status = 'running'
+        try:
+            for batch in bounded_bfs(
+                self.graph,
+                self.seed_id,
+                self.config['max_depth'],
+                self.config['max_nodes'],
+                self.config['max_edges'],
+                should_stop=self._cancelled.is_set
+            ):
+                with self._lock:
+                    batch['index'] = len(self.batches)
+                    self.batches.append(batch)
+                    self.node_count += len(batch['nodes'])
+                    self.edge_count += len(batch['edges'])
+                    listeners = list(self._listeners)
+                for listener in listeners:
+                    listener(self, batch)
+            self._finish('cancelled' if self._cancelled.is_set() else 'completed')
+        except Exception as e:
+            self.error = str(e)
+            self._finish('error')
+
+    def _finish(self, status: str):
+        """Mark the job finished and notify listeners"""
+        with self._lock:
+            self.status = status
+            self.completed_at = time.time()
+            self.graph = None
+            listeners, self._listeners = self._listeners, []
+        for listener in listeners:
+            listener(self, None)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Job status without the batch payloads"""
+        return {
+            'job_id': self.id,
+            'graph': self.graph_reference,
+            'seed': self.seed_id,
+            'config': self.config,
+            'status': self.status,
+            'error': self.error,
+            'progress': {
+                'batches': len(self.batches),
+                'nodes': self.node_count,
+                'edges': self.edge_count,
+                'max_nodes': self.config['max_nodes'],
+                'max_edges': self.config['max_edges']
+            },
+            'created_at': iso_timestamp(self.created_at),
+            'completed_at': iso_timestamp(self.completed_at)
+        }
+
+
+class ExpansionService:
+    """
+    Runs expansion jobs on a worker pool and keeps recent jobs for polling
+    Finished jobs are dropped after finished_ttl seconds, or sooner beyond max_finished_jobs
+    """
+
+    def __init__(self, max_workers: int = 4, max_finished_jobs: int = 100, finished_ttl: float = 600.0):
+        self.jobs: Dict[str, ExpansionJob] = {}
+        self.max_finished_jobs = max_finished_jobs
+        self.finished_ttl = finished_ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='expansion')
+        self._lock = threading.Lock()
+
+    def start(
+        self,
+        graph: GraphVersion,
+        seed_id: str,
+        max_depth: Optional[int] = None,
+        max_nodes: Optional[int] = None,
+        max_edges: Optional[int] = None
+    ) -> ExpansionJob:
+        """Start an expansion job from a seed node; raises KeyError for unknown seeds"""
+        if graph.get_node(seed_id) is None:
+            raise KeyError(f"Node {seed_id} not found")
+
+        job = ExpansionJob(graph, seed_id, {
+            'max_depth': _clamp(max_depth, DEPTH_LIMITS),
+            'max_nodes': _clamp(max_nodes, NODE_LIMITS),
+            'max_edges': _clamp(max_edges, EDGE_LIMITS)
+        })
+        with self._lock:
+            self.jobs[job.id] = job
+            self._evict_finished()
+        self._executor.submit(self._run, job)
+        return job
+
+    def _run(self, job: ExpansionJob):
+        """Run a job on a worker, then apply the retention policy now that it has finished"""
+        job.run()
+        with self._lock:
+            self._evict_finished()
+
+    def get_job(self, job_id: str) -> Optional[ExpansionJob]:
+        """Get a job by id"""
+        return self.jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a running job; False if unknown or already finished"""
+        job = self.jobs.get(job_id)
+        return job.cancel() if job else False
+
+    def list_jobs(self) -> List[Dict[str, Any]]:
+        """Status of every retained job"""
+        return [job.to_dict() for job in list(self.jobs.values())]
+
+    def _evict_finished(self):
+        """Drop finished jobs older than finished_ttl, and the oldest beyond max_finished_jobs"""
+        expiry = time.time() - self.finished_ttl
+        finished = [job_id for job_id, job in self.jobs.items() if job.finished]
+        excess = max(0, len(finished) - self.max_finished_jobs)
+        for position, job_id in enumerate(finished):
+            if position < excess or self.jobs[job_id].completed_at <= expiry:
+                del self.jobs[job_id]
+
+
+# Global expansion service
+expansion_service = ExpansionService()
@@ -0,0 +1,120 @@
+"""
+Graph Index for AI Brain
+Compact CSR (compressed sparse row) adjacency index with interned node ids,
+built once per graph version and shared by the graph analysis handlers
+"""
+from typing import Dict, List
+from array import array
+
+from ..store.graph_store import GraphVersion
+from .compact_graph import CompactGraph
+
+
+class AdjacencyIndex:
+    """
+    Undirected adjacency of a graph in CSR form
+    Node i's neighbours are indices[indptr[i]:indptr[i + 1]], and entry_edges holds the
+    position in the original link list of each entry so link attributes stay reachable
+    """
+
+    def __init__(self, graph: CompactGraph):
+        # Interned ids and resolved endpoints come straight from the compact graph
+        self.ids: List[str] = graph.ids
+        self.index: Dict[str, int] = graph.index
+        node_count = len(self.ids)
+        sources, targets, edge_ids = graph.sources, graph.targets, graph.link_positions
+
+        # Count entries per row (each link contributes to both endpoints)
+        self.degrees = array('l', [0]) * node_count
+        for source, target in zip(sources, targets):
+            self.degrees[source] += 1
+            self.degrees[target] += 1
+
+        self.indptr = array('l', [0]) * (node_count + 1)
+        for i in range(node_count):
+            self.indptr[i + 1] = self.indptr[i] + self.degrees[i]
+
+        # Fill rows
+        entry_count = self.indptr[node_count]
+        self.indices = array('l', [0]) * entry_count
+        self.entry_edges = array('l', [0]) * entry_count
+        cursor = array('l', self.indptr[:node_count])
+        for source, target, edge_id in zip(sources, targets, edge_ids):
+            self.indices[cursor[source]] = target
+            self.entry_edges[cursor[source]] = edge_id
+            cursor[source] += 1
+            self.indices[cursor[target]] = source
+            self.entry_edges[cursor[target]] = edge_id
+            cursor[target] += 1
+
+        self.node_count = node_count
+        self.edge_count = len(edge_ids)
+
+    @classmethod
+    def for_graph(cls, graph: GraphVersion) -> 'AdjacencyIndex':
+        """Get the adjacency index of a graph version, building it on first use"""
+        return graph.derived('adjacency', lambda g: cls(CompactGraph.for_graph(g)))
+
+    # Lookups by node index
+
+    def neighbor_indices(self, i: int) -> array:
+        """Neighbour indices of node i (a slice of its CSR row)"""
+        return self.indices[self.indptr[i]:self.indptr[i + 1]]
+
+    def edge_indices(self, i: int) -> array:
+        """Original link positions for node i's CSR row"""
+        return self.entry_edges[self.indptr[i]:self.indptr[i + 1]]
+
+    # Lookups by node id
+
+    def degree(self, node_id: str) -> int:
+        """Number of link endpoints at a node (0 for unknown nodes)"""
+        i = self.index.get(node_id)
+        return self.degrees[i] if i is not None else 0
+
+    def neighbors(self, node_id: str) -> List[str]:
+        """Distinct neighbour ids of a node"""
+        i = self.index.get(node_id)
+        if i is None:
+            return []
+        return [self.ids[j] for j in dict.fromkeys(self.neighbor_indices(i))]
+
+    def are_connected(self, source_id: str, target_id: str) -> bool:
+        """Whether any link joins two nodes, in either direction"""
+        source = self.index.get(source_id)
+        target = self.index.get(target_id)
+        if source is None or target is None:
+            return False
+        # Scan the shorter row
+        if self.degrees[source] > self.degrees[target]:
+            source, target = target, source
+        return target in self.neighbor_indices(source)
+
+    def second_degree_neighbors(self, node_id: str) -> Dict[str, int]:
+        """Nodes two hops away (not already neighbours) with their shared-neighbour counts"""
+        i = self.index.get(node_id)
+        if i is None:
+            return {}
+        direct = set(self.neighbor_indices(i))
+        shared: Dict[int, int] = {}
+        for j in direct:
+            for k in self.neighbor_indices(j):
+                if k != i and k not in direct:
+                    shared[k] = shared.get(k, 0) + 1
+        return {self.ids[k]: count for k, count in shared.items()}
+
+    # Whole-graph queries
+
+    def isolated_nodes(self) -> List[str]:
+        """Ids of nodes without any links"""
+        return [self.ids[i] for i, degree in enumerate(self.degrees) if degree == 0]
+
+    def connected_count(self) -> int:
+        """Number of nodes with at least one link"""
+        return self.node_count - self.degrees.count(0)
+
+    def average_degree(self) -> float:
+        """Average degree over connected nodes"""
+        connected = self.connected_count()
+        return self.indptr[self.node_count] / connected if connected else 0
+
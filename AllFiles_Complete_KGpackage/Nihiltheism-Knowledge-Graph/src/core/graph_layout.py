@@ -0,0 +1,472 @@
+"""
+Graph Layout for AI Brain
+Server-side force-directed layout (pivot MDS start, then Fruchterman-Reingold forces
+with Barnes-Hut repulsion in NumPy), cached per graph version and refined locally
+after small patches; first layouts of large graphs are built in the background
+"""
+from typing import Dict, Any, List, Optional, Tuple
+import copy
+import math
+
+import numpy as np
+from scipy import sparse
+from scipy.sparse import csgraph
+
+from ..store.graph_store import BackgroundBuilds, GraphVersion
+from .compact_graph import CompactGraph
+
+
+def morton_codes(cells: np.ndarray, depth: int) -> np.ndarray:
+    """Interleave the bits of integer (x, y) cell coordinates into quadtree (Z-order) codes"""
+    codes = np.zeros(len(cells), dtype=np.int64)
+    x, y = cells[:, 0].astype(np.int64), cells[:, 1].astype(np.int64)
+    for bit in range(depth):
+        codes |= ((x >> bit) & 1) << (2 * bit)
+        codes |= ((y >> bit) & 1) << (2 * bit + 1)
+    return codes
+
+
+def pivot_mds(node_count: int, sources: np.ndarray, targets: np.ndarray, pivots: int = 50) -> np.ndarray:
+    """
+    2D coordinates whose distances approximate hop distances (Brandes and Pich's pivot
+    MDS): breadth-first distances from a few max-min spread pivots, double-centred and
+    projected on their two principal axes. Nodes in other components count as one hop
+    beyond the farthest reachable node
+    """
+    if node_count < 3 or not len(sources):
+        return np.zeros((node_count, 2))
+    adjacency = sparse.coo_matrix((np.ones(len(sources)), (sources, targets)), shape=(node_count, node_count)).tocsr()
+    adjacency = adjacency + adjacency.T
+
+    pivots = min(pivots, node_count)
+    distances = np.empty((node_count, pivots))
+    nearest = np.full(node_count, np.inf)
+    # Start at the best-connected node; each next pivot is the node farthest from all
+    # pivots so far (unreachable nodes first, so every component gets one)
+    pivot = int(np.argmax(np.diff(adjacency.indptr)))
+    for j in range(pivots):
+        distances[:, j] = csgraph.shortest_path(adjacency, method='D', unweighted=True, indices=pivot)
+        nearest = np.minimum(nearest, distances[:, j])
+        pivot = int(np.argmax(nearest))
+
+    reachable = np.isfinite(distances)
+    distances[~reachable] = distances[reachable].max() + 1
+    squared = distances ** 2
+    centred = -0.5 * (squared - squared.mean(axis=0) - squared.mean(axis=1)[:, None] + squared.mean())
+    _, vectors = np.linalg.eigh(centred.T @ centred)
+    return centred @ vectors[:, -2:]
+
+
+def _expand(starts: np.ndarray, counts: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """For ranges [start, start + count), the range number and the position of every element"""
+    owners = np.repeat(np.arange(len(counts)), counts)
+    return owners, starts[owners] + np.arange(len(owners)) - (np.cumsum(counts) - counts)[owners]
+
+
+class _QuadTree:
+    """
+    Mass and centre of mass of every non-empty quadtree cell, level by level
+    A cell at level d is identified by the top 2 * d bits of its points' Morton codes,
+    so the tree is a sorted code array per level rather than a pointer structure;
+    the arrays of all levels are concatenated, with level_start[d] marking level d
+    """
+
+    def __init__(self, positions: np.ndarray, depth: int, group_levels: int = 2):
+        self.positions = positions
+        self.depth = depth
+        self.group_levels = group_levels
+        self.origin = positions.min(axis=0)
+        self.span = max(float((positions.max(axis=0) - self.origin).max()), 1e-9)
+
+        side = 1 << depth
+        cells = np.minimum(((positions - self.origin) / self.span * side).astype(np.int64), side - 1)
+        self.codes = morton_codes(cells, depth)
+        # Points sorted by code, so each leaf's points are a contiguous run
+        self.point_order = np.argsort(self.codes, kind='stable')
+
+        codes, levels, masses, centres = [], [], [], []
+        for level in range(depth + 1):
+            unique, inverse = np.unique(self.codes >> (2 * (depth - level)), return_inverse=True)
+            mass = np.bincount(inverse, minlength=len(unique)).astype(np.float64)
+            codes.append(unique)
+            levels.append(np.full(len(unique), level))
+            masses.append(mass)
+            centres.append(np.stack([
+                np.bincount(inverse, weights=positions[:, 0], minlength=len(unique)),
+                np.bincount(inverse, weights=positions[:, 1], minlength=len(unique))
+            ], axis=1) / mass[:, None])
+        self.level_start = np.cumsum([0] + [len(level_codes) for level_codes in codes])
+        self.cell_codes = np.concatenate(codes)
+        self.cell_levels = np.concatenate(levels)
+        self.mass = np.concatenate(masses)
+        self.centre = np.concatenate(centres)
+        leaf_counts = masses[-1].astype(np.int64)
+        self.leaf_first = np.cumsum(leaf_counts) - leaf_counts
+
+    @staticmethod
+    def depth_for(positions: np.ndarray, leaf_capacity: int, max_depth: int = 20) -> int:
+        """
+        Shallowest depth (at least about log4 of the point count) at which no leaf holds more
+        than leaf_capacity points, so leaf pairs stay linear in the point count even where a
+        layout is crowded; points closer together than the finest cell share a leaf regardless
+        """
+        depth = max(1, min(max_depth, math.ceil(math.log(max(len(positions), 2), 4)) + 1))
+        if len(positions) <= leaf_capacity:
+            return depth
+        origin = positions.min(axis=0)
+        span = max(float((positions.max(axis=0) - origin).max()), 1e-9)
+        side = 1 << max_depth
+        cells = np.minimum(((positions - origin) / span * side).astype(np.int64), side - 1)
+        # A leaf code at depth d is the finest code shifted right, so one sort serves every depth
+        codes = np.sort(morton_codes(cells, max_depth))
+        while depth < max_depth:
+            leaves = codes >> (2 * (max_depth - depth))
+            boundaries = np.flatnonzero(np.r_[True, leaves[1:] != leaves[:-1], True])
+            if np.diff(boundaries).max() <= leaf_capacity:
+                break
+            depth += 1
+        return depth
+
+    def _rows(self, level: int, cells: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Global rows of cell codes at a level, and whether each cell exists"""
+        start, end = self.level_start[level], self.level_start[level + 1]
+        found = np.searchsorted(self.cell_codes[start:end], cells)
+        exists = found < end - start
+        exists[exists] = self.cell_codes[start + found[exists]] == cells[exists]
+        return start + np.minimum(found, end - start - 1), exists
+
+    def _interactions(self, group_codes: np.ndarray, group_level: int, theta: float) -> Tuple[np.ndarray, ...]:
+        """
+        Interaction lists of point groups (cells at group_level), as (group, cell row) pairs:
+        far cells act on the group's centre of mass, once for all its points; near cells,
+        small enough for each point but not for the group, act on every point; leaf cells
+        that are never small enough are resolved point by point
+        """
+        group_size = self.span / (1 << group_level)
+        group_rows, _ = self._rows(group_level, group_codes)
+        group_centre = self.centre[group_rows]
+        # Farthest a point of the group can be from its centre of mass
+        group_radius = group_size * math.sqrt(2)
+
+        lists = {'far': ([], []), 'near': ([], []), 'leaf': ([], [])}
+        groups = np.arange(len(group_codes))
+        cells = np.zeros(len(group_codes), dtype=np.int64)
+        for level in range(self.depth + 1):
+            if not len(groups):
+                break
+            rows, _ = self._rows(level, cells)
+            distance = np.sqrt(((group_centre[groups] - self.centre[rows]) ** 2).sum(axis=1))
+            cell_size = self.span / (1 << level)
+            # A cell never acts as one body on points inside it
+            if level <= group_level:
+                outside = (group_codes[groups] >> (2 * (group_level - level))) != cells
+            else:
+                outside = np.ones(len(groups), dtype=bool)
+            far = outside & (cell_size + group_size < theta * distance)
+            near = outside & ~far & (cell_size < theta * (distance - group_radius))
+            rest = ~(far | near)
+            for name, selected in (('far', far), ('near', near)) + ((('leaf', rest),) if level == self.depth else ()):
+                lists[name][0].append(groups[selected])
+                lists[name][1].append(rows[selected])
+
+            if level == self.depth:
+                break
+            groups = np.repeat(groups[rest], 4)
+            cells = (np.repeat(cells[rest], 4) << 2) | np.tile(np.arange(4), int(rest.sum()))
+            _, exists = self._rows(level + 1, cells)
+            groups, cells = groups[exists], cells[exists]
+
+        empty = np.zeros(0, dtype=np.int64)
+        result = []
+        for name in ('far', 'near', 'leaf'):
+            result.extend(np.concatenate(part) if part else empty for part in lists[name])
+        return (*result, group_centre)
+
+    def repulsion(self, points: np.ndarray, strength: float, theta: float, pair_budget: int = 1 << 21) -> np.ndarray:
+        """
+        Repulsive force strength * mass / distance on each of points (indices into
+        the tree's positions), with distant cells approximated by their centre of mass
+        Points are grouped by their cell a few levels above the leaves, and the
+        interaction list is built once per group rather than once per point; point
+        pairs of leaf cells are expanded at most pair_budget at a time
+        """
+        positions = self.positions
+        forces = np.zeros((len(points), 2))
+        if not len(points):
+            return forces
+        group_level = max(0, self.depth - self.group_levels)
+        point_groups = self.codes[points] >> (2 * (self.depth - group_level))
+        order = np.argsort(point_groups, kind='stable')
+        group_codes, group_starts, group_counts = np.unique(point_groups[order], return_index=True, return_counts=True)
+        group_of_slot = np.empty(len(points), dtype=np.int64)
+        group_of_slot[order] = np.repeat(np.arange(len(group_codes)), group_counts)
+
+        (far_groups, far_rows, near_groups, near_rows,
+         leaf_groups, leaf_rows, group_centre) = self._interactions(group_codes, group_level, theta)
+
+        # Far cells: one evaluation per group, plus the force's first-order change across
+        # the group (its Jacobian), so each point gets F(centre) + J (point - centre)
+        delta = group_centre[far_groups] - self.centre[far_rows]
+        distance_squared = np.maximum((delta * delta).sum(axis=1), 1e-9)
+        scale = strength * self.mass[far_rows] / distance_squared
+        cross = -2 * scale / distance_squared
+        terms = (
+            delta[:, 0] * scale, delta[:, 1] * scale,
+            scale + cross * delta[:, 0] ** 2, scale + cross * delta[:, 1] ** 2, cross * delta[:, 0] * delta[:, 1]
+        )
+        fx, fy, jxx, jyy, jxy = (np.bincount(far_groups, weights=term, minlength=len(group_codes)) for term in terms)
+        offset = positions[points] - group_centre[group_of_slot]
+        forces[:, 0] += fx[group_of_slot] + jxx[group_of_slot] * offset[:, 0] + jxy[group_of_slot] * offset[:, 1]
+        forces[:, 1] += fy[group_of_slot] + jxy[group_of_slot] * offset[:, 0] + jyy[group_of_slot] * offset[:, 1]
+
+        # Near cells: each point of the group against the cell's centre of mass,
+        # leaving the point out of a cell that contains it
+        pairs, members = _expand(group_starts[near_groups], group_counts[near_groups])
+        slots, rows = order[members], near_rows[pairs]
+        at = positions[points[slots]]
+        own = (self.codes[points[slots]] >> (2 * (self.depth - self.cell_levels[rows]))) == self.cell_codes[rows]
+        mass = self.mass[rows] - own
+        centre = np.where(own[:, None], (self.centre[rows] * self.mass[rows][:, None] - at) / np.maximum(mass, 1)[:, None], self.centre[rows])
+        self._accumulate(forces, slots, at - centre, mass, strength)
+
+        # Leaf cells: each point of the group against each point of the leaf, in runs of
+        # interactions holding at most pair_budget point pairs (or one larger interaction)
+        pair_counts = group_counts[leaf_groups] * self.mass[leaf_rows].astype(np.int64)
+        ends = np.cumsum(pair_counts)
+        start = 0
+        while start < len(leaf_groups):
+            done = ends[start - 1] if start else 0
+            end = max(start + 1, int(np.searchsorted(ends, done + pair_budget, side='right')))
+            chunk_groups, chunk_rows = leaf_groups[start:end], leaf_rows[start:end]
+            pairs, members = _expand(group_starts[chunk_groups], group_counts[chunk_groups])
+            slots, rows = order[members], chunk_rows[pairs] - self.level_start[self.depth]
+            pairs, members = _expand(self.leaf_first[rows], self.mass[chunk_rows[pairs]].astype(np.int64))
+            slots, others = slots[pairs], self.point_order[members]
+            distinct = others != points[slots]
+            slots, others = slots[distinct], others[distinct]
+            self._accumulate(forces, slots, positions[points[slots]] - positions[others], np.ones(len(slots)), strength)
+            start = end
+        return forces
+
+    @staticmethod
+    def _accumulate(forces: np.ndarray, slots: np.ndarray, delta: np.ndarray, mass: np.ndarray, strength: float):
+        """Add the repulsion strength * mass * delta / |delta|^2 of each pair to its point slot"""
+        distance_squared = np.maximum((delta * delta).sum(axis=1), 1e-9)
+        push = delta * (strength * mass / distance_squared)[:, None]
+        forces[:, 0] += np.bincount(slots, weights=push[:, 0], minlength=len(forces))
+        forces[:, 1] += np.bincount(slots, weights=push[:, 1], minlength=len(forces))
+
+
+class GraphLayout:
+    """
+    2D positions of a graph version's nodes, in the order of its compact form
+    A new version made by a small patch inherits the parent's layout: new nodes are
+    placed next to their neighbours and only they and the endpoints of new links are
+    moved, so the rest of the drawing stays where the user last saw it
+    """
+
+    # Ideal edge length, in the frontend's canvas units
+    edge_length = 30.0
+    theta = 1.0
+    gravity = 0.05
+    iterations = 50
+    refine_iterations = 30
+    # Most points per quadtree leaf; crowded regions get a deeper tree
+    leaf_capacity = 16
+    # A patch adding more than this fraction of nodes triggers a full (warm-started) relayout
+    relayout_fraction = 0.25
+
+    def __init__(self, ids: List[str], positions: np.ndarray):
+        self.ids = ids
+        self.index: Dict[str, int] = {node_id: i for i, node_id in enumerate(ids)}
+        self.positions = positions
+        self.sources = np.zeros(0, dtype=np.int64)
+        self.targets = np.zeros(0, dtype=np.int64)
+
+    @classmethod
+    def for_graph(cls, graph: GraphVersion) -> 'GraphLayout':
+        """Get the layout of a graph version, refining a copy of the parent version's layout if possible"""
+        return graph.derived_incremental('layout', cls.from_graph, cls._apply_delta)
+
+    @classmethod
+    def from_graph(cls, graph: GraphVersion, seed: int = 0) -> 'GraphLayout':
+        """Lay out every node of a graph version: pivot MDS for the global shape, forces for the detail"""
+        compact = CompactGraph.for_graph(graph)
+        rng = np.random.default_rng(seed)
+        layout = cls(compact.ids, np.zeros((compact.node_count, 2)))
+        layout._set_edges(compact)
+
+        if len(layout.sources) and compact.node_count >= 3:
+            positions = pivot_mds(compact.node_count, layout.sources, layout.targets)
+            edge = positions[layout.sources] - positions[layout.targets]
+            radius = float(np.sqrt(((positions - positions.mean(axis=0)) ** 2).sum(axis=1)).max())
+            # Scale edges to the ideal length, but never beyond the size a random start would have
+            scale = min(
+                cls.edge_length / max(float(np.sqrt((edge * edge).sum(axis=1)).mean()), 1e-9),
+                cls.edge_length * math.sqrt(compact.node_count) / max(radius, 1e-9)
+            )
+            # Jitter separates nodes MDS puts on the same spot (e.g. leaves of one hub)
+            layout.positions = positions * scale + rng.normal(0, cls.edge_length / 10, positions.shape)
+        else:
+            layout.positions = cls._random_disk(rng, compact.node_count, compact.node_count)
+        layout.run(layout.iterations)
+        return layout
+
+    def copy(self) -> 'GraphLayout':
+        """Copy that can be maintained without changing this layout"""
+        layout = copy.copy(self)
+        layout.positions = self.positions.copy()
+        return layout
+
+    def _apply_delta(self, graph: GraphVersion):
+        """Carry positions over to a patched version, placing and refining only what changed"""
+        compact = CompactGraph.for_graph(graph)
+        rng = np.random.default_rng(graph.version)
+        old_rows = np.array([self.index.get(node_id, -1) for node_id in compact.ids], dtype=np.int64)
+        placed = old_rows >= 0
+
+        positions = np.full((compact.node_count, 2), np.nan)
+        positions[placed] = self.positions[old_rows[placed]]
+        self.ids = compact.ids
+        self.index = {node_id: i for i, node_id in enumerate(compact.ids)}
+        self.positions = positions
+        self._set_edges(compact)
+
+        new_rows = np.flatnonzero(~placed)
+        if len(new_rows):
+            self._place_new_nodes(~placed, rng)
+        if len(new_rows) > self.relayout_fraction * max(compact.node_count, 1):
+            self.run(self.iterations)
+            return
+
+        active = set(new_rows.tolist())
+        for link in graph.delta['links_added']:
+            for endpoint in (link['source'], link['target']):
+                if endpoint in self.index:
+                    active.add(self.index[endpoint])
+        if active:
+            self.run(self.refine_iterations, np.array(sorted(active), dtype=np.int64))
+
+    def _set_edges(self, compact: CompactGraph):
+        """Take edge endpoints from the compact graph, dropping self-loops"""
+        sources = np.frombuffer(compact.sources, dtype=compact.sources.typecode).astype(np.int64)
+        targets = np.frombuffer(compact.targets, dtype=compact.targets.typecode).astype(np.int64)
+        keep = sources != targets
+        self.sources, self.targets = sources[keep], targets[keep]
+
+    @classmethod
+    def _random_disk(cls, rng: np.random.Generator, count: int, node_count: int) -> np.ndarray:
+        """Uniform random points in a disk sized for node_count nodes at the ideal edge length"""
+        radius = cls.edge_length * math.sqrt(max(node_count, 1)) / 2
+        angle = rng.uniform(0, 2 * math.pi, count)
+        distance = radius * np.sqrt(rng.uniform(0, 1, count))
+        return np.stack([distance * np.cos(angle), distance * np.sin(angle)], axis=1)
+
+    def _place_new_nodes(self, unplaced: np.ndarray, rng: np.random.Generator):
+        """Put each new node at the centre of its placed neighbours (new nodes linked only to new nodes follow in later rounds)"""
+        positions, n = self.positions, len(self.positions)
+        unplaced = unplaced.copy()
+        while unplaced.any():
+            sums = np.zeros((n, 2))
+            counts = np.zeros(n)
+            for near, far in ((self.sources, self.targets), (self.targets, self.sources)):
+                usable = unplaced[near] & ~unplaced[far]
+                np.add.at(sums, near[usable], positions[far[usable]])
+                np.add.at(counts, near[usable], 1)
+            ready = unplaced & (counts > 0)
+            if not ready.any():
+                break
+            jitter = rng.normal(0, self.edge_length / 2, (int(ready.sum()), 2))
+            positions[ready] = sums[ready] / counts[ready, None] + jitter
+            unplaced &= ~ready
+
+        # Nodes with no placed neighbours at all start anywhere in the drawing
+        if unplaced.any():
+            placed = positions[~unplaced]
+            centre = placed.mean(axis=0) if len(placed) else np.zeros(2)
+            positions[unplaced] = centre + self._random_disk(rng, int(unplaced.sum()), n)
+
+    # Simulation
+
+    def forces(self, points: Optional[np.ndarray] = None) -> np.ndarray:
+        """Net force on each node (or each of points): repulsion, edge attraction and gravity"""
+        positions = self.positions
+        points = np.arange(len(positions)) if points is None else points
+        k = self.edge_length
+        depth = _QuadTree.depth_for(positions, self.leaf_capacity)
+        forces = _QuadTree(positions, depth).repulsion(points, k * k, self.theta)
+
+        # Attraction d^2 / k along each edge touching the requested points
+        slot = np.full(len(positions), -1, dtype=np.int64)
+        slot[points] = np.arange(len(points))
+        touching = (slot[self.sources] >= 0) | (slot[self.targets] >= 0)
+        sources, targets = self.sources[touching], self.targets[touching]
+        delta = positions[sources] - positions[targets]
+        pull = delta * (np.sqrt((delta * delta).sum(axis=1)) / k)[:, None]
+        for endpoint, sign in ((sources, -1.0), (targets, 1.0)):
+            mine = slot[endpoint] >= 0
+            forces[:, 0] += sign * np.bincount(slot[endpoint[mine]], weights=pull[mine, 0], minlength=len(points))
+            forces[:, 1] += sign * np.bincount(slot[endpoint[mine]], weights=pull[mine, 1], minlength=len(points))
+
+        return forces - self.gravity * positions[points]
+
+    def run(self, iterations: int, points: Optional[np.ndarray] = None, start_temperature: Optional[float] = None):
+        """
+        Move nodes (all of them, or only points) along their net force for a number of
+        iterations; each step is capped by a temperature (default: twice the edge length)
+        that cools geometrically
+        """
+        if len(self.positions) < 2 or iterations <= 0:
+            return
+        temperature = start_temperature or self.edge_length * 2
+        cooling = 0.01 ** (1 / iterations)
+        for _ in range(iterations):
+            forces = self.forces(points)
+            magnitude = np.maximum(np.sqrt((forces * forces).sum(axis=1)), 1e-9)
+            step = forces * (np.minimum(magnitude, temperature) / magnitude)[:, None]
+            if points is None:
+                self.positions += step
+            else:
+                self.positions[points] += step
+            temperature *= cooling
+
+    # Output
+
+    def position(self, node_id: str) -> Optional[Tuple[float, float]]:
+        """(x, y) of a node, or None if it is not in the graph"""
+        i = self.index.get(node_id)
+        return None if i is None else (float(self.positions[i, 0]), float(self.positions[i, 1]))
+
+    def to_dict(self, precision: int = 2) -> Dict[str, Any]:
+        """Columnar positions (ids, x, y) with the drawing's bounds, for the frontend to render as is"""
+        rounded = np.round(self.positions, precision)
+        bounds = [*rounded.min(axis=0).tolist(), *rounded.max(axis=0).tolist()] if len(rounded) else [0, 0, 0, 0]
+        return {
+            'ids': list(self.ids),
+            'x': rounded[:, 0].tolist(),
+            'y': rounded[:, 1].tolist(),
+            'bounds': bounds
+        }
+
+
+class LayoutService(BackgroundBuilds):
+    """
+    Hands out graph layouts without blocking a request on a large first layout
+    Small graphs, and versions patched from a laid-out parent, are laid out inline; other
+    first layouts are built on a worker and reported as not ready (None) until they finish
+    """
+
+    # Roughly one second of layout work
+    inline_node_limit = 1500
+
+    def __init__(self, max_workers: int = 1):
+        super().__init__(max_workers, thread_name_prefix='layout')
+
+    def layout(self, graph: GraphVersion) -> Optional[GraphLayout]:
+        """The graph's layout if it is ready or quick to make; otherwise start building it and return None"""
+        parent = graph.parent()
+        inline = len(graph.nodes) <= self.inline_node_limit or (parent is not None and parent.cached('layout') is not None)
+        return self.get(graph, 'layout', GraphLayout.for_graph, inline)
+
+
+layout_service = LayoutService()
@@ -0,0 +1,256 @@
+"""
+Graph Metrics for AI Brain
+Incrementally maintained structure counters (degrees, category histogram, isolated
+nodes, connected components) so structure analysis never rescans the graph
+"""
+from typing import Dict, Any, Optional, Tuple
+import copy
+
+from ..store.graph_store import GraphVersion
+
+
+class GraphMetrics:
+    """
+    Structure metrics updated in O(1) amortised time per node or link edit
+    Components use union-find, which cannot split: a removed link whose endpoints are
+    still joined by a short path (a parallel or reverse link, or a search of at most
+    reconnect_budget neighbours) leaves the components as they are; any other removal
+    marks them stale and they are rebuilt in O(V + E) on the next component query
+    """
+
+    reconnect_budget = 256
+
+    def __init__(self):
+        self.categories: Dict[str, int] = {}
+        self.node_categories: Dict[str, str] = {}
+        self.degrees: Dict[str, int] = {}
+        # Insertion-ordered set of nodes without links
+        self.isolated: Dict[str, None] = {}
+        # (source, target) -> number of parallel links
+        self.pairs: Dict[Tuple[str, str], int] = {}
+        # node_id -> {neighbour: number of links}, ignoring direction and self-loops
+        self.neighbours: Dict[str, Dict[str, int]] = {}
+        self.edge_count = 0
+        self.degree_total = 0
+
+        # Union-find over node ids; size holds one entry per component root
+        self.parent: Dict[str, str] = {}
+        self.size: Dict[str, int] = {}
+        self.components_stale = False
+
+    @classmethod
+    def for_graph(cls, graph: GraphVersion) -> 'GraphMetrics':
+        """Get the metrics of a graph version, updating a copy of the parent version's metrics if possible"""
+        return graph.derived_incremental('metrics', cls.from_graph, cls._apply_delta)
+
+    @classmethod
+    def from_graph(cls, graph: GraphVersion) -> 'GraphMetrics':
+        """Build metrics for every node and link of a graph version"""
+        metrics = cls()
+        for node in graph.nodes:
+            metrics.add_node(node)
+        for link in graph.links:
+            metrics.add_link(link)
+        return metrics
+
+    def copy(self) -> 'GraphMetrics':
+        """Copy that can be maintained without changing these metrics"""
+        metrics = copy.copy(self)
+        for name in ('categories', 'node_categories', 'degrees', 'isolated', 'pairs', 'parent', 'size'):
+            setattr(metrics, name, dict(getattr(self, name)))
+        metrics.neighbours = {node_id: dict(counts) for node_id, counts in self.neighbours.items()}
+        return metrics
+
+    def _apply_delta(self, graph: GraphVersion):
+        """Bring metrics built for the parent version up to date with graph.delta"""
+        delta = graph.delta
+        for link in delta['links_removed']:
+            self.remove_link(link)
+        for node_id in delta['nodes_removed']:
+            self.remove_node(node_id)
+        for node_id in delta['nodes_added']:
+            self.add_node(graph.get_node(node_id))
+        for node_id in delta['nodes_updated']:
+            self.update_node(graph.get_node(node_id))
+        for link in delta['links_added']:
+            self.add_link(link)
+
+    # Node edits
+
+    def add_node(self, node: Dict[str, Any]):
+        """Count a new node"""
+        node_id = node['id']
+        if node_id in self.degrees:
+            self.update_node(node)
+            return
+
+        category = node.get('category', 'unknown')
+        self.node_categories[node_id] = category
+        self.categories[category] = self.categories.get(category, 0) + 1
+        self.degrees[node_id] = 0
+        self.isolated[node_id] = None
+        self.parent[node_id] = node_id
+        self.size[node_id] = 1
+
+    def update_node(self, node: Dict[str, Any]):
+        """Move a node to its new category"""
+        node_id = node['id']
+        category = node.get('category', 'unknown')
+        previous = self.node_categories.get(node_id)
+        if previous == category:
+            return
+        self._decrement_category(previous)
+        self.node_categories[node_id] = category
+        self.categories[category] = self.categories.get(category, 0) + 1
+
+    def remove_node(self, node_id: str):
+        """Uncount a node; its links must already have been removed"""
+        if node_id not in self.degrees:
+            return
+        self._decrement_category(self.node_categories.pop(node_id))
+        degree = self.degrees.pop(node_id)
+        self.isolated.pop(node_id, None)
+        self.neighbours.pop(node_id, None)
+        if degree or self.components_stale:
+            self.components_stale = True
+        else:
+            # A node without links is a component of its own, so nothing else changes
+            del self.parent[node_id]
+            del self.size[node_id]
+
+    def _decrement_category(self, category: Optional[str]):
+        """Decrease a category count, dropping empty categories"""
+        if category is None:
+            return
+        self.categories[category] -= 1
+        if not self.categories[category]:
+            del self.categories[category]
+
+    # Link edits
+
+    def add_link(self, link: Dict[str, Any]):
+        """Count a link between two known nodes"""
+        source, target = link['source'], link['target']
+        if source not in self.degrees or target not in self.degrees:
+            return
+
+        pair = (source, target)
+        self.pairs[pair] = self.pairs.get(pair, 0) + 1
+        self.edge_count += 1
+        self.degree_total += 2
+        for node_id in pair:
+            self.degrees[node_id] += 1
+            self.isolated.pop(node_id, None)
+        if source != target:
+            self._count_neighbour(source, target, 1)
+            self._count_neighbour(target, source, 1)
+
+        if not self.components_stale:
+            self._union(source, target)
+
+    def remove_link(self, link: Dict[str, Any]):
+        """Uncount a link"""
+        pair = (link['source'], link['target'])
+        if not self.pairs.get(pair):
+            return
+
+        self.pairs[pair] -= 1
+        if not self.pairs[pair]:
+            del self.pairs[pair]
+        self.edge_count -= 1
+        self.degree_total -= 2
+        for node_id in pair:
+            self.degrees[node_id] -= 1
+            if not self.degrees[node_id]:
+                self.isolated[node_id] = None
+        if pair[0] == pair[1]:
+            return
+        self._count_neighbour(pair[0], pair[1], -1)
+        self._count_neighbour(pair[1], pair[0], -1)
+        if not self.components_stale and not self._joined(*pair):
+            self.components_stale = True
+
+    def _count_neighbour(self, node_id: str, neighbour: str, delta: int):
+        """Change the number of links between two distinct nodes"""
+        counts = self.neighbours.setdefault(node_id, {})
+        count = counts.get(neighbour, 0) + delta
+        if count:
+            counts[neighbour] = count
+        else:
+            del counts[neighbour]
+            if not counts:
+                del self.neighbours[node_id]
+
+    def _joined(self, a: str, b: str) -> bool:
+        """Whether a path between a and b is found within reconnect_budget neighbour visits"""
+        if b in self.neighbours.get(a, ()):
+            return True
+        seen = {a}
+        frontier = [a]
+        budget = self.reconnect_budget
+        while frontier:
+            next_frontier = []
+            for node_id in frontier:
+                for neighbour in self.neighbours.get(node_id, ()):
+                    if neighbour == b:
+                        return True
+                    budget -= 1
+                    if budget <= 0:
+                        return False
+                    if neighbour not in seen:
+                        seen.add(neighbour)
+                        next_frontier.append(neighbour)
+            frontier = next_frontier
+        return False
+
+    # Union-find
+
+    def _find(self, node_id: str) -> str:
+        """Root of a node's component, with path halving"""
+        parent = self.parent
+        while parent[node_id] != node_id:
+            parent[node_id] = parent[parent[node_id]]
+            node_id = parent[node_id]
+        return node_id
+
+    def _union(self, a: str, b: str):
+        """Merge the components of two nodes, by size"""
+        root_a, root_b = self._find(a), self._find(b)
+        if root_a == root_b:
+            return
+        if self.size[root_a] < self.size[root_b]:
+            root_a, root_b = root_b, root_a
+        self.parent[root_b] = root_a
+        self.size[root_a] += self.size.pop(root_b)
+
+    def _rebuild_components(self):
+        """Recompute union-find from the current nodes and links"""
+        self.parent = {node_id: node_id for node_id in self.degrees}
+        self.size = {node_id: 1 for node_id in self.degrees}
+        for source, target in self.pairs:
+            self._union(source, target)
+        self.components_stale = False
+
+    # Queries
+
+    def component_count(self) -> int:
+        """Number of connected components, isolated nodes included"""
+        if self.components_stale:
+            self._rebuild_components()
+        return len(self.size)
+
+    def average_degree(self) -> float:
+        """Average degree over connected nodes"""
+        connected = len(self.degrees) - len(self.isolated)
+        return self.degree_total / connected if connected else 0
+
+    def structure(self) -> Dict[str, Any]:
+        """Structure analysis in the shape used by the organize and evaluate handlers"""
+        return {
+            'node_count': len(self.degrees),
+            'edge_count': self.edge_count,
+            'categories': dict(self.categories),
+            'avg_connections': self.average_degree(),
+            'isolated_nodes': list(self.isolated),
+            'component_count': self.component_count()
+        }
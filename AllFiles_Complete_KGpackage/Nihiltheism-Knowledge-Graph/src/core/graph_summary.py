@@ -0,0 +1,537 @@
+"""
+Graph Summary for AI Brain
+Level-of-detail views of large graphs: a balanced hierarchy of supernodes with link
+weights and category mixes per level, cached per graph version and updated incrementally
+after patches, so the overview costs the same whatever the graph size
+"""
+from typing import Dict, Any, List, Optional, Tuple
+from collections import Counter
+import copy
+
+import numpy as np
+from scipy import sparse
+from scipy.sparse import csgraph
+
+from ..store.graph_store import BackgroundBuilds, GraphVersion, link_key
+from .compact_graph import CompactGraph
+from .community_detection import louvain
+
+
+def _groups(labels: np.ndarray) -> List[np.ndarray]:
+    """Item positions per label, in order of first appearance"""
+    _, first, inverse = np.unique(labels, return_index=True, return_inverse=True)
+    order = np.argsort(inverse, kind='stable')
+    bounds = np.cumsum(np.bincount(inverse))
+    groups = np.split(order, bounds[:-1])
+    return [groups[g] for g in np.argsort(first)]
+
+
+def bounded_partition(
+    count: int,
+    sources: np.ndarray,
+    targets: np.ndarray,
+    max_size: int,
+    weights: Optional[np.ndarray] = None,
+    keys: Optional[List[str]] = None
+) -> np.ndarray:
+    """
+    Group count items into parts of at most max_size along Louvain communities
+    Oversized communities are split recursively (into breadth-first chunks when Louvain
+    finds no further structure) and small ones are packed together, same keys first
+    Returns a part label per item
+    """
+    sources = np.asarray(sources, dtype=np.int64)
+    targets = np.asarray(targets, dtype=np.int64)
+    weights = np.ones(len(sources)) if weights is None else np.asarray(weights, dtype=float)
+    local = np.full(count, -1, dtype=np.int64)
+    parts: List[np.ndarray] = []
+    pending = [np.arange(count)] if count else []
+    while pending:
+        members = pending.pop()
+        if len(members) <= max_size:
+            parts.append(members)
+            continue
+        local[members] = np.arange(len(members))
+        inside = (local[sources] >= 0) & (local[targets] >= 0)
+        edges = (local[sources[inside]], local[targets[inside]])
+        labels = louvain(len(members), *edges, weights=weights[inside])
+        groups = _groups(np.asarray(labels))
+        if len(groups) > 1:
+            pending.extend(members[group] for group in groups)
+        else:
+            adjacency = sparse.coo_matrix((weights[inside], edges), shape=(len(members),) * 2).tocsr()
+            order = members[csgraph.reverse_cuthill_mckee(adjacency + adjacency.T, symmetric_mode=True)]
+            parts.extend(order[start:start + max_size] for start in range(0, len(order), max_size))
+        local[members] = -1
+
+    # Pack parts under half the bound into shared bins, grouping parts by dominant key
+    small = [part for part in parts if len(part) < max_size // 2]
+    parts = [part for part in parts if len(part) >= max_size // 2]
+    if keys is not None:
+        small.sort(key=lambda part: Counter(keys[i] for i in part.tolist()).most_common(1)[0][0])
+    bin_items: List[np.ndarray] = []
+    for part in small:
+        if bin_items and sum(map(len, bin_items)) + len(part) > max_size:
+            parts.append(np.concatenate(bin_items))
+            bin_items = []
+        bin_items.append(part)
+    if bin_items:
+        parts.append(np.concatenate(bin_items))
+
+    result = np.empty(count, dtype=np.int64)
+    for label, part in enumerate(parts):
+        result[part] = label
+    return result
+
+
+class Supernode:
+    """A cluster of the summary hierarchy: level 1 clusters hold nodes, higher levels hold clusters"""
+
+    def __init__(self, cluster_id: str, level: int, parent: Optional[str] = None):
+        self.id = cluster_id
+        self.level = level
+        self.parent = parent
+        # Insertion-ordered set of node ids (level 1) or child cluster ids
+        self.children: Dict[str, None] = {}
+        self.size = 0
+        self.categories: Counter = Counter()
+        # Links between distinct nodes that both lie inside the cluster
+        self.internal_links = 0
+
+    def copy(self) -> 'Supernode':
+        """Copy with its own children and category mix"""
+        cluster = copy.copy(self)
+        cluster.children = dict(self.children)
+        cluster.categories = Counter(self.categories)
+        return cluster
+
+
+class GraphSummary:
+    """
+    Balanced cluster hierarchy over the nodes of a graph
+    Leaf clusters sit at level 1 and every path to the root has the same length, so each
+    level is a complete partition of the nodes; links[level][a][b] is the number of
+    links between items a and b of that level (level 0 being the nodes themselves).
+    Clusters that overflow after patches split like B-tree pages, and the root gains a
+    level when it has too many children
+    """
+
+    leaf_size = 32
+    max_children = 16
+
+    def __init__(self):
+        self.clusters: Dict[str, Supernode] = {}
+        self.node_cluster: Dict[str, str] = {}
+        # (label, category) per node
+        self.node_info: Dict[str, Tuple[Optional[str], str]] = {}
+        self.links: List[Dict[str, Dict[str, int]]] = [{}]
+        self._next_id = 0
+        self.root = Supernode('root', 1)
+        self.clusters['root'] = self.root
+
+    @classmethod
+    def for_graph(cls, graph: GraphVersion) -> 'GraphSummary':
+        """Get the summary of a graph version, updating a copy of the parent version's summary if possible"""
+        return graph.derived_incremental('summary', cls.from_graph, cls._apply_delta)
+
+    @classmethod
+    def from_graph(cls, graph: GraphVersion) -> 'GraphSummary':
+        """Build the hierarchy bottom-up: nodes into leaf clusters, then clusters into parents until few remain"""
+        compact = CompactGraph.for_graph(graph)
+        summary = cls()
+        sources = np.frombuffer(compact.sources, dtype=compact.sources.typecode).astype(np.int64)
+        targets = np.frombuffer(compact.targets, dtype=compact.targets.typecode).astype(np.int64)
+        keep = sources != targets
+        sources, targets = sources[keep], targets[keep]
+        weights = np.ones(len(sources))
+        categories = [compact.category(i) for i in range(compact.node_count)]
+
+        items, keys, level = list(compact.ids), categories, 1
+        while True:
+            max_size = cls.leaf_size if level == 1 else cls.max_children
+            labels = bounded_partition(len(items), sources, targets, max_size, weights, keys)
+            count = int(labels.max()) + 1 if len(items) else 0
+            if level > 1 and count >= len(items):
+                labels = np.arange(len(items)) // max_size
+                count = int(labels.max()) + 1
+            clusters = [summary._new_cluster(level) for _ in range(count)]
+            for item, label in zip(items, labels.tolist()):
+                summary._attach(item, clusters[label])
+            mixes = [Counter() for _ in range(count)]
+            for key, label in zip(keys, labels.tolist()):
+                mixes[label][key] += 1
+            keys = [mix.most_common(1)[0][0] for mix in mixes]
+            items = [cluster.id for cluster in clusters]
+
+            # Links between the new clusters, for grouping them at the next level
+            sources, targets, weights = cls._merge_edges(labels[sources], labels[targets], weights, count)
+            summary.links.append({})
+            level += 1
+            if len(items) <= cls.max_children:
+                break
+
+        summary.root.level = level
+        for item in items:
+            summary._attach(item, summary.root)
+        for i, node_id in enumerate(compact.ids):
+            summary._add_node(node_id, compact.labels[i], categories[i])
+        # Count links once per key, as patches do
+        for link in {link_key(link): link for link in graph.links}.values():
+            if link['source'] in summary.node_cluster and link['target'] in summary.node_cluster:
+                summary._adjust_link(link['source'], link['target'], 1)
+        return summary
+
+    @staticmethod
+    def _merge_edges(
+        sources: np.ndarray,
+        targets: np.ndarray,
+        weights: np.ndarray,
+        count: int
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Drop edges within one item and sum the weights of parallel edges"""
+        keep = sources != targets
+        low = np.minimum(sources, targets)[keep]
+        high = np.maximum(sources, targets)[keep]
+        codes, inverse = np.unique(low * count + high, return_inverse=True)
+        return codes // count, codes % count, np.bincount(inverse, weights=weights[keep], minlength=len(codes))
+
+    # Structure maintenance
+
+    def _new_cluster(self, level: int, parent: Optional[str] = None) -> Supernode:
+        """Create an empty cluster, optionally as a child of parent"""
+        cluster = Supernode(f'c{self._next_id}', level, parent)
+        self._next_id += 1
+        self.clusters[cluster.id] = cluster
+        if parent is not None:
+            self.clusters[parent].children[cluster.id] = None
+        return cluster
+
+    def _attach(self, item: str, cluster: Supernode):
+        """Make a node (for a level 1 cluster) or a cluster a child of cluster"""
+        cluster.children[item] = None
+        if cluster.level == 1:
+            self.node_cluster[item] = cluster.id
+        else:
+            self.clusters[item].parent = cluster.id
+
+    def _parent(self, item: str, level: int) -> str:
+        """Cluster holding an item of the given level"""
+        return self.node_cluster[item] if level == 0 else self.clusters[item].parent
+
+    def _chain(self, node_id: str):
+        """The clusters holding a node, from its leaf cluster up to the root"""
+        cluster = self.clusters[self.node_cluster[node_id]]
+        while cluster is not None:
+            yield cluster
+            cluster = self.clusters[cluster.parent] if cluster.parent is not None else None
+
+    def _count_node(self, node_id: str, delta: int):
+        """Add (delta=1) or remove (delta=-1) a node from the sizes and category mixes of its clusters"""
+        category = self.node_info[node_id][1]
+        for cluster in self._chain(node_id):
+            cluster.size += delta
+            cluster.categories[category] += delta
+            if not cluster.categories[category]:
+                del cluster.categories[category]
+
+    def _add_node(self, node_id: str, label: Optional[str], category: str):
+        """Record an attached node and count it in its clusters"""
+        self.node_info[node_id] = (label, category)
+        self._count_node(node_id, 1)
+
+    @staticmethod
+    def _adjust(table: Dict[str, Dict[str, int]], a: str, b: str, delta: int):
+        """Change the symmetric weight between a and b, dropping entries that reach zero"""
+        for x, y in ((a, b), (b, a)):
+            row = table.setdefault(x, {})
+            weight = row.get(y, 0) + delta
+            if weight:
+                row[y] = weight
+            else:
+                del row[y]
+                if not row:
+                    del table[x]
+
+    def _adjust_link(self, source: str, target: str, delta: int):
+        """
+        Add (delta > 0) or remove a link: it joins distinct items at every level below
+        the lowest cluster holding both endpoints, and is internal to that cluster and above
+        """
+        if source == target:
+            return
+        a, b, level = source, target, 0
+        while a != b:
+            self._adjust(self.links[level], a, b, delta)
+            a, b = self._parent(a, level), self._parent(b, level)
+            level += 1
+        cluster: Optional[Supernode] = self.clusters[a]
+        while cluster is not None:
+            cluster.internal_links += delta
+            cluster = self.clusters[cluster.parent] if cluster.parent is not None else None
+
+    def _nodes_under(self, items: List[str], level: int) -> List[str]:
+        """All node ids below items of the given level"""
+        while level > 0:
+            items = [child for item in items for child in self.clusters[item].children]
+            level -= 1
+        return items
+
+    def _split(self, cluster: Supernode):
+        """
+        Split an overflowing cluster along the communities of its children, moving all
+        but the first part to new sibling clusters; link and node counts of the moved
+        subtrees are taken out before the move and put back after it
+        """
+        members = list(cluster.children)
+        index = {member: i for i, member in enumerate(members)}
+        table = self.links[cluster.level - 1]
+        edges = [
+            (index[a], index[b], weight)
+            for a in members for b, weight in table.get(a, {}).items()
+            if b in index and index[a] < index[b]
+        ]
+        if cluster.level == 1:
+            keys = [self.node_info[member][1] for member in members]
+        else:
+            keys = [self.clusters[member].categories.most_common(1)[0][0] for member in members]
+        sources, targets, weights = (np.array(column) for column in zip(*edges)) if edges else ([], [], None)
+        max_size = self.leaf_size if cluster.level == 1 else self.max_children
+        labels = bounded_partition(len(members), sources, targets, max_size, weights, keys)
+        if labels.max() == 0:
+            return
+
+        moved = [members[i] for i in np.flatnonzero(labels != labels[0]).tolist()]
+        moved_nodes = self._nodes_under(moved, cluster.level - 1)
+        moved_set = set(moved_nodes)
+        incident = [
+            (u, v, weight)
+            for u in moved_nodes for v, weight in self.links[0].get(u, {}).items()
+            if v not in moved_set or u < v
+        ]
+        for u, v, weight in incident:
+            self._adjust_link(u, v, -weight)
+        for node_id in moved_nodes:
+            self._count_node(node_id, -1)
+
+        siblings: Dict[int, Supernode] = {}
+        for member, label in zip(members, labels.tolist()):
+            if label == labels[0]:
+                continue
+            if label not in siblings:
+                siblings[label] = self._new_cluster(cluster.level, cluster.parent)
+            del cluster.children[member]
+            self._attach(member, siblings[label])
+
+        for node_id in moved_nodes:
+            self._count_node(node_id, 1)
+        for u, v, weight in incident:
+            self._adjust_link(u, v, weight)
+        self._rebalance(self.clusters[cluster.parent])
+
+    def _grow(self):
+        """Push the root's children down into a new level, then split it"""
+        top = self._new_cluster(self.root.level)
+        top.children, self.root.children = self.root.children, {}
+        for child in top.children:
+            self._attach(child, top)
+        top.size = self.root.size
+        top.categories = Counter(self.root.categories)
+        top.internal_links = self.root.internal_links
+        top.parent = self.root.id
+        self.root.children[top.id] = None
+        self.root.level += 1
+        self.links.append({})
+        self._split(top)
+
+    def _rebalance(self, cluster: Supernode):
+        """Split a cluster (or grow the tree at the root) once it holds twice its bound"""
+        limit = self.leaf_size if cluster.level == 1 else self.max_children
+        if len(cluster.children) <= 2 * limit:
+            return
+        if cluster is self.root:
+            self._grow()
+        else:
+            self._split(cluster)
+
+    def _prune(self, cluster: Supernode):
+        """Remove a cluster left empty, and any ancestors it leaves empty"""
+        while cluster is not self.root and not cluster.children:
+            parent = self.clusters[cluster.parent]
+            del parent.children[cluster.id]
+            del self.clusters[cluster.id]
+            cluster = parent
+
+    def _smallest_leaf(self) -> Supernode:
+        """Leaf cluster reached by descending into the smallest child, creating one where a cluster is empty"""
+        cluster = self.root
+        while cluster.level > 1:
+            if cluster.children:
+                cluster = min((self.clusters[child] for child in cluster.children), key=lambda child: child.size)
+            else:
+                cluster = self._new_cluster(cluster.level - 1, cluster.id)
+        return cluster
+
+    def copy(self) -> 'GraphSummary':
+        """Copy that can be maintained without changing this summary"""
+        summary = copy.copy(self)
+        summary.clusters = {cluster_id: cluster.copy() for cluster_id, cluster in self.clusters.items()}
+        summary.root = summary.clusters['root']
+        summary.node_cluster = dict(self.node_cluster)
+        summary.node_info = dict(self.node_info)
+        summary.links = [{item: dict(row) for item, row in table.items()} for table in self.links]
+        return summary
+
+    def _apply_delta(self, graph: GraphVersion):
+        """Bring the hierarchy up to date with a patched version, touching only the changed nodes and links"""
+        delta = graph.delta
+        for link in delta['links_removed']:
+            if link['source'] in self.node_cluster and link['target'] in self.node_cluster:
+                self._adjust_link(link['source'], link['target'], -1)
+
+        for node_id in delta['nodes_removed']:
+            self._count_node(node_id, -1)
+            leaf = self.clusters[self.node_cluster.pop(node_id)]
+            del leaf.children[node_id]
+            del self.node_info[node_id]
+            self._prune(leaf)
+
+        for node_id in delta['nodes_updated']:
+            node = graph.node_index[node_id]
+            self._count_node(node_id, -1)
+            self.node_info[node_id] = (node.get('label'), node.get('category') or 'unknown')
+            self._count_node(node_id, 1)
+
+        # New nodes join the leaf cluster holding most of their already placed neighbours
+        neighbours: Dict[str, List[str]] = {}
+        for link in delta['links_added']:
+            neighbours.setdefault(link['source'], []).append(link['target'])
+            neighbours.setdefault(link['target'], []).append(link['source'])
+        grown = {}
+        for node_id in delta['nodes_added']:
+            node = graph.node_index[node_id]
+            leaves = Counter(
+                self.node_cluster[other] for other in neighbours.get(node_id, [])
+                if other in self.node_cluster
+            )
+            leaf = self.clusters[leaves.most_common(1)[0][0]] if leaves else self._smallest_leaf()
+            self._attach(node_id, leaf)
+            self._add_node(node_id, node.get('label'), node.get('category') or 'unknown')
+            grown[leaf.id] = None
+
+        for link in delta['links_added']:
+            self._adjust_link(link['source'], link['target'], 1)
+
+        # Split overflowing leaves only once their links are in, so splits follow them
+        for cluster_id in grown:
+            if cluster_id in self.clusters:
+                self._rebalance(self.clusters[cluster_id])
+
+    # Queries
+
+    def representative(self, cluster: Supernode) -> Optional[str]:
+        """Best-linked node of the largest leaf reached by descending into the largest child"""
+        while cluster.level > 1 and cluster.children:
+            cluster = max((self.clusters[child] for child in cluster.children), key=lambda child: child.size)
+        if not cluster.children or cluster.level > 1:
+            return None
+        degrees = self.links[0]
+        return max(cluster.children, key=lambda node_id: sum(degrees.get(node_id, {}).values()))
+
+    def describe(self, cluster: Supernode) -> Dict[str, Any]:
+        """Supernode as sent to clients: size, category mix, link weights and a representative label"""
+        representative = self.representative(cluster)
+        table = self.links[cluster.level] if cluster.level < len(self.links) else {}
+        return {
+            'id': cluster.id,
+            'level': cluster.level,
+            'size': cluster.size,
+            'label': (self.node_info[representative][0] or representative) if representative else None,
+            'representative': representative,
+            'categories': dict(cluster.categories.most_common()),
+            'children': len(cluster.children),
+            'internal_links': cluster.internal_links,
+            'external_links': sum(table.get(cluster.id, {}).values())
+        }
+
+    def expand(self, cluster_id: str) -> Dict[str, Any]:
+        """
+        Children of a supernode (nodes, for a level 1 cluster) with the aggregated links
+        among them; raises KeyError for unknown clusters
+        """
+        cluster = self.clusters[cluster_id]
+        table = self.links[cluster.level - 1]
+        if cluster.level == 1:
+            children = [
+                {
+                    'id': node_id,
+                    'label': self.node_info[node_id][0],
+                    'category': self.node_info[node_id][1],
+                    'degree': sum(table.get(node_id, {}).values())
+                }
+                for node_id in cluster.children
+            ]
+        else:
+            children = [self.describe(self.clusters[child]) for child in cluster.children]
+        return {
+            'supernode': self.describe(cluster),
+            'children': children,
+            'edges': self._edges(list(cluster.children), table)
+        }
+
+    def overview(self) -> Dict[str, Any]:
+        """Top of the hierarchy, skipping down past clusters with a single child"""
+        cluster = self.root
+        while cluster.level > 1 and len(cluster.children) == 1:
+            cluster = self.clusters[next(iter(cluster.children))]
+        return self.expand(cluster.id)
+
+    def level(self, level: int) -> Dict[str, Any]:
+        """All supernodes of one level with the links between them; raises ValueError for levels outside the tree"""
+        if not 1 <= level < self.root.level:
+            raise ValueError(f"Level must be between 1 and {self.root.level - 1}")
+        clusters = [self.root]
+        while clusters[0].level > level:
+            clusters = [self.clusters[child] for cluster in clusters for child in cluster.children]
+        return {
+            'level': level,
+            'supernodes': [self.describe(cluster) for cluster in clusters],
+            'edges': self._edges([cluster.id for cluster in clusters], self.links[level])
+        }
+
+    @staticmethod
+    def _edges(items: List[str], table: Dict[str, Dict[str, int]]) -> List[Dict[str, Any]]:
+        """Weighted links among a set of items of one level"""
+        members = set(items)
+        return [
+            {'source': a, 'target': b, 'weight': weight}
+            for a in items for b, weight in table.get(a, {}).items()
+            if b in members and a < b
+        ]
+
+    @property
+    def levels(self) -> int:
+        """Number of supernode levels below the root"""
+        return self.root.level - 1
+
+
+class SummaryService(BackgroundBuilds):
+    """
+    Hands out graph summaries without blocking a request on a large first build
+    Small graphs, and versions patched from a summarised parent, are summarised inline;
+    other first builds run on a worker and are reported as not ready (None) until they finish
+    """
+
+    # Roughly one second of clustering
+    inline_node_limit = 1500
+
+    def __init__(self, max_workers: int = 1):
+        super().__init__(max_workers, thread_name_prefix='summary')
+
+    def summary(self, graph: GraphVersion) -> Optional[GraphSummary]:
+        """The graph's summary if it is ready or quick to make; otherwise start building it and return None"""
+        parent = graph.parent()
+        inline = len(graph.nodes) <= self.inline_node_limit or (parent is not None and parent.cached('summary') is not None)
+        return self.get(graph, 'summary', GraphSummary.for_graph, inline)
+
+
+summary_service = SummaryService()
@@ -0,0 +1,93 @@
+"""
+Label Automaton for AI Brain
+Aho-Corasick automaton over node labels, finding every label mentioned in a
+message in a single pass over the message regardless of graph size
+"""
+from typing import Dict, List, Tuple
+from collections import deque
+
+from ..store.graph_store import GraphVersion
+from .compact_graph import CompactGraph, normalize
+
+
+class LabelAutomaton:
+    """
+    Aho-Corasick automaton over normalised node labels
+    Matching runs over normalised text and only accepts whole-word occurrences
+    """
+
+    def __init__(self, graph: CompactGraph):
+        # State 0 is the root; goto[state] maps a character to the next state
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        # outputs[state] holds (label length, node id) for labels ending at this state
+        self.outputs: List[List[Tuple[int, str]]] = [[]]
+        self.labels: Dict[str, str] = {}
+
+        for node_id, label, normalized in zip(graph.ids, graph.labels, graph.labels_normalized):
+            if normalized:
+                self._add_label(normalized, node_id)
+                self.labels[node_id] = label
+
+        self._build_failure_links()
+
+    @classmethod
+    def for_graph(cls, graph: GraphVersion) -> 'LabelAutomaton':
+        """Get the label automaton of a graph version, building it on first use"""
+        return graph.derived('label_automaton', lambda g: cls(CompactGraph.for_graph(g)))
+
+    def _add_label(self, label: str, node_id: str):
+        """Insert a label into the trie"""
+        state = 0
+        for char in label:
+            next_state = self.goto[state].get(char)
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto[state][char] = next_state
+                self.goto.append({})
+                self.fail.append(0)
+                self.outputs.append([])
+            state = next_state
+        self.outputs[state].append((len(label), node_id))
+
+    def _build_failure_links(self):
+        """Breadth-first construction of failure links and merged outputs"""
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.goto[fallback].get(char, 0)
+                self.fail[next_state] = target if target != next_state else 0
+                self.outputs[next_state] = self.outputs[next_state] + self.outputs[self.fail[next_state]]
+
+    def find_mentions(self, text: str) -> List[Tuple[str, int, int]]:
+        """All whole-word label occurrences in text as (node_id, start, end) over the normalised text"""
+        haystack = normalize(text)
+        mentions = []
+        state = 0
+        for position, char in enumerate(haystack):
+            while state and char not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(char, 0)
+
+            if not self.outputs[state]:
+                continue
+            end = position + 1
+            if end < len(haystack) and haystack[end] != ' ':
+                continue
+            for length, node_id in self.outputs[state]:
+                start = end - length
+                if start == 0 or haystack[start - 1] == ' ':
+                    mentions.append((node_id, start, end))
+
+        return mentions
+
+    def mentioned_nodes(self, text: str) -> List[str]:
+        """Distinct ids of nodes mentioned in text, longest (most specific) labels first"""
+        mentions = self.find_mentions(text)
+        mentions.sort(key=lambda mention: (mention[1] - mention[2], mention[1]))
+        return list(dict.fromkeys(node_id for node_id, _, _ in mentions))
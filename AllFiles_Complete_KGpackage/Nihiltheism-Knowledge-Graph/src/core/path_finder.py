@@ -0,0 +1,328 @@
+"""
+Path Finder for AI Brain
+Shortest and alternative paths between two concepts (bidirectional BFS, or bidirectional
+Dijkstra when relationships carry costs), cached per graph version
+"""
+from typing import Dict, Any, List, Optional, Tuple, Set
+from collections import OrderedDict
+import heapq
+import math
+import threading
+
+import numpy as np
+
+from ..store.graph_store import GraphVersion
+from .graph_index import AdjacencyIndex
+from .expansion_service import _clamp
+
+# (default, minimum, maximum)
+PATH_LIMITS = (3, 1, 10)
+
+# Nodes and link positions, from source to target
+Path = Tuple[Tuple[int, ...], Tuple[int, ...]]
+
+
+def _valid_cost(cost: Any) -> bool:
+    """Whether a relationship cost is a positive finite number (booleans are not costs)"""
+    return isinstance(cost, (int, float)) and not isinstance(cost, bool) and math.isfinite(cost) and cost > 0
+
+
+class PathFinder:
+    """
+    Path queries over one graph version, following links in either direction
+    Unweighted searches expand whole breadth-first levels at once in NumPy, from
+    whichever side has the smaller frontier; alternatives are loopless paths found
+    with Yen's algorithm. Results are cached per query and shared between callers
+    """
+
+    max_cached = 256
+
+    def __init__(self, graph: GraphVersion):
+        self.adjacency = AdjacencyIndex.for_graph(graph)
+        self.links = graph.links
+        self.labels = [graph.get_node(node_id).get('label', node_id) for node_id in self.adjacency.ids]
+        self.indptr, self.indices, self.entry_edges = (
+            np.frombuffer(column, dtype=column.typecode).astype(np.int64, copy=False)
+            for column in (self.adjacency.indptr, self.adjacency.indices, self.adjacency.entry_edges)
+        )
+        # Relationship of every link as a small code, so price lists apply in one NumPy lookup
+        relationship_codes: Dict[Optional[str], int] = {}
+        self.link_relationships = np.array(
+            [relationship_codes.setdefault(link.get('relationship'), len(relationship_codes)) for link in self.links],
+            dtype=np.int64
+        )
+        self.relationship_names = list(relationship_codes)
+        self._cache: 'OrderedDict[tuple, Dict[str, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_graph(cls, graph: GraphVersion) -> 'PathFinder':
+        """Get the path finder of a graph version, building it on first use"""
+        return graph.derived('path_finder', cls)
+
+    def paths(
+        self,
+        source_id: str,
+        target_id: str,
+        k: Optional[int] = None,
+        relationship_costs: Optional[Dict[str, float]] = None
+    ) -> Dict[str, Any]:
+        """
+        Shortest path between two nodes and up to k - 1 alternative loopless paths,
+        cheapest first; links cost 1 unless relationship_costs prices their relationship
+        Raises KeyError for unknown nodes and ValueError for costs that are not positive finite numbers
+        """
+        for node_id in (source_id, target_id):
+            if node_id not in self.adjacency.index:
+                raise KeyError(f"Node {node_id} not found")
+        if relationship_costs is not None and not isinstance(relationship_costs, dict):
+            raise ValueError('Relationship costs must map relationship names to numbers')
+        if relationship_costs and not all(_valid_cost(cost) for cost in relationship_costs.values()):
+            raise ValueError('Relationship costs must be positive finite numbers')
+        k = _clamp(k, PATH_LIMITS)
+        costs = tuple(sorted(relationship_costs.items())) if relationship_costs else None
+        key = (source_id, target_id, k, costs)
+
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+        source, target = self.adjacency.index[source_id], self.adjacency.index[target_id]
+        found = self._k_shortest(source, target, k, dict(costs) if costs else None)
+        result = {
+            'source': source_id,
+            'target': target_id,
+            'distance': found[0][0] if found else None,
+            'paths': [self._describe(path, cost) for cost, path in found]
+        }
+        with self._lock:
+            self._cache[key] = result
+            while len(self._cache) > self.max_cached:
+                self._cache.popitem(last=False)
+        return result
+
+    def _link_costs(self, relationship_costs: Dict[str, float]) -> np.ndarray:
+        """Cost of every link by position (unpriced relationships cost 1)"""
+        prices = np.array([float(relationship_costs.get(name, 1.0)) for name in self.relationship_names])
+        return prices[self.link_relationships] if len(prices) else np.zeros(0)
+
+    def _describe(self, path: Path, cost: float) -> Dict[str, Any]:
+        """A path as sent to clients: node ids and labels, the links walked, and its length"""
+        nodes, edges = path
+        return {
+            'nodes': [self.adjacency.ids[i] for i in nodes],
+            'labels': [self.labels[i] for i in nodes],
+            'links': [self.links[edge_id] for edge_id in edges],
+            'length': len(edges),
+            'cost': cost
+        }
+
+    # Searches
+
+    def _k_shortest(
+        self,
+        source: int,
+        target: int,
+        k: int,
+        relationship_costs: Optional[Dict[str, float]]
+    ) -> List[Tuple[float, Path]]:
+        """
+        Yen's algorithm: each next path deviates from an earlier one at some spur node
+        (with Lawler's refinement: spurs start where the previous path itself deviated)
+        """
+        link_costs = self._link_costs(relationship_costs) if relationship_costs else None
+        if link_costs is not None and not len(link_costs):
+            link_costs = None  # no links to price: the unweighted search finds the (at most trivial) path
+        first = self._shortest(source, target, set(), set(), link_costs)
+        if first is None:
+            return []
+        found = [first]
+        deviations = [0]
+        candidates: List[Tuple[float, int, int, Path]] = []
+        seen = {first[1][0]}
+        while len(found) < k:
+            previous_nodes, previous_edges = found[-1][1]
+            for i in range(deviations[-1], len(previous_nodes) - 1):
+                spur, root_nodes = previous_nodes[i], previous_nodes[:i + 1]
+                # Leave the spur by a different first step than every known path sharing this root
+                next_nodes = {nodes[i + 1] for _, (nodes, _) in found if nodes[:i + 1] == root_nodes}
+                blocked_edges = {
+                    edge_id for j, edge_id in zip(self.adjacency.neighbor_indices(spur), self.adjacency.edge_indices(spur))
+                    if j in next_nodes
+                }
+                spur_path = self._shortest(spur, target, set(root_nodes[:-1]), blocked_edges, link_costs)
+                if spur_path is None:
+                    continue
+                nodes = root_nodes + spur_path[1][0][1:]
+                if nodes in seen:
+                    continue
+                seen.add(nodes)
+                edges = previous_edges[:i] + spur_path[1][1]
+                cost = float(link_costs[list(edges)].sum()) if link_costs is not None else float(len(edges))
+                heapq.heappush(candidates, (cost, len(seen), i, (nodes, edges)))
+            if not candidates:
+                break
+            cost, _, deviation, path = heapq.heappop(candidates)
+            found.append((cost, path))
+            deviations.append(deviation)
+        return found
+
+    def _shortest(
+        self,
+        source: int,
+        target: int,
+        blocked_nodes: Set[int],
+        blocked_edges: Set[int],
+        link_costs: Optional[np.ndarray]
+    ) -> Optional[Tuple[float, Path]]:
+        """Cheapest path avoiding some nodes and links, or None when the target is unreachable"""
+        if source == target:
+            return 0.0, ((source,), ())
+        if link_costs is None:
+            return self._bidirectional_bfs(source, target, blocked_nodes, blocked_edges)
+        return self._bidirectional_dijkstra(source, target, blocked_nodes, blocked_edges, link_costs)
+
+    def _rows(self, nodes: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Every CSR entry of some nodes: the position in nodes it belongs to, its neighbour and its link"""
+        counts = self.indptr[nodes + 1] - self.indptr[nodes]
+        owners = np.repeat(np.arange(len(nodes)), counts)
+        positions = np.repeat(self.indptr[nodes] - np.cumsum(counts) + counts, counts) + np.arange(len(owners))
+        return owners, self.indices[positions], self.entry_edges[positions]
+
+    def _blocking(self, blocked_nodes: Set[int], blocked_edges: Set[int]) -> Tuple[np.ndarray, np.ndarray]:
+        """Node mask and link array for the nodes and links a search must avoid"""
+        blocked = np.zeros(self.adjacency.node_count, dtype=bool)
+        blocked[list(blocked_nodes)] = True
+        return blocked, np.fromiter(blocked_edges, dtype=np.int64, count=len(blocked_edges))
+
+    def _bidirectional_bfs(
+        self,
+        source: int,
+        target: int,
+        blocked_nodes: Set[int],
+        blocked_edges: Set[int]
+    ) -> Optional[Tuple[float, Path]]:
+        """Fewest-hop path, growing the side whose frontier has fewer links one whole level at a time"""
+        node_count = self.adjacency.node_count
+        blocked, blocked_edge_array = self._blocking(blocked_nodes, blocked_edges)
+        # Per side: hop distance (-1 = unreached), parent node and the link to it
+        distance = [np.full(node_count, -1, dtype=np.int64) for _ in range(2)]
+        parent = [np.empty(node_count, dtype=np.int64) for _ in range(2)]
+        parent_edge = [np.empty(node_count, dtype=np.int64) for _ in range(2)]
+        frontiers = [np.array([source]), np.array([target])]
+        for side, start in enumerate((source, target)):
+            distance[side][start] = 0
+        levels = [0, 0]
+
+        while len(frontiers[0]) and len(frontiers[1]):
+            work = [int((self.indptr[frontier + 1] - self.indptr[frontier]).sum()) for frontier in frontiers]
+            side = 0 if work[0] <= work[1] else 1
+            frontier = frontiers[side]
+            owners, neighbours, edges = self._rows(frontier)
+
+            keep = ~blocked[neighbours] & (distance[side][neighbours] < 0)
+            if len(blocked_edge_array):
+                keep &= ~np.isin(edges, blocked_edge_array)
+            neighbours, edges, owners = neighbours[keep], edges[keep], owners[keep]
+            reached, first = np.unique(neighbours, return_index=True)
+            levels[side] += 1
+            distance[side][reached] = levels[side]
+            parent[side][reached] = frontier[owners[first]]
+            parent_edge[side][reached] = edges[first]
+            frontiers[side] = reached
+
+            # Where the searches meet, the best meeting node minimises the other side's distance
+            other = distance[1 - side][reached]
+            met = other >= 0
+            if met.any():
+                meet = int(reached[met][np.argmin(other[met])])
+                path = self._join(meet, parent, parent_edge, source, target)
+                return float(len(path[1])), path
+        return None
+
+    def _bidirectional_dijkstra(
+        self,
+        source: int,
+        target: int,
+        blocked_nodes: Set[int],
+        blocked_edges: Set[int],
+        link_costs: np.ndarray
+    ) -> Optional[Tuple[float, Path]]:
+        """
+        Cheapest path by bucketed Dijkstra from both ends: with buckets as wide as the
+        cheapest link, every open node in the lowest bucket is final, so a whole bucket
+        is settled and relaxed at once. Stops when the two sides' lowest open distances
+        add up to at least the best meeting found
+        """
+        node_count = self.adjacency.node_count
+        blocked, blocked_edge_array = self._blocking(blocked_nodes, blocked_edges)
+        step = float(link_costs.min())
+        distance = [np.full(node_count, np.inf) for _ in range(2)]
+        settled = [np.zeros(node_count, dtype=bool) for _ in range(2)]
+        parent = [np.empty(node_count, dtype=np.int64) for _ in range(2)]
+        parent_edge = [np.empty(node_count, dtype=np.int64) for _ in range(2)]
+        open_nodes = [np.array([source]), np.array([target])]
+        for side, start in enumerate((source, target)):
+            distance[side][start] = 0.0
+        best, meet = math.inf, None
+
+        while len(open_nodes[0]) and len(open_nodes[1]):
+            lowest = [float(distance[side][open_nodes[side]].min()) for side in range(2)]
+            if lowest[0] + lowest[1] >= best:
+                break
+            side = 0 if len(open_nodes[0]) <= len(open_nodes[1]) else 1
+            candidates = open_nodes[side]
+            in_bucket = distance[side][candidates] < lowest[side] + step
+            bucket, open_nodes[side] = candidates[in_bucket], candidates[~in_bucket]
+            settled[side][bucket] = True
+
+            owners, neighbours, edges = self._rows(bucket)
+            keep = ~blocked[neighbours] & ~settled[side][neighbours]
+            if len(blocked_edge_array):
+                keep &= ~np.isin(edges, blocked_edge_array)
+            owners, neighbours, edges = owners[keep], neighbours[keep], edges[keep]
+            through = distance[side][bucket[owners]] + link_costs[edges]
+            # Cheapest offer per neighbour, then only offers that improve on its distance
+            order = np.lexsort((through, neighbours))
+            neighbours, first = np.unique(neighbours[order], return_index=True)
+            through, owners, edges = through[order][first], owners[order][first], edges[order][first]
+            improved = through < distance[side][neighbours]
+            neighbours, through = neighbours[improved], through[improved]
+            distance[side][neighbours] = through
+            parent[side][neighbours] = bucket[owners[improved]]
+            parent_edge[side][neighbours] = edges[improved]
+            open_nodes[side] = np.union1d(open_nodes[side], neighbours)
+
+            totals = through + distance[1 - side][neighbours]
+            if len(totals) and totals.min() < best:
+                best, meet = float(totals.min()), int(neighbours[np.argmin(totals)])
+
+        if meet is None:
+            return None
+        return best, self._join(meet, parent, parent_edge, source, target)
+
+    def _join(
+        self,
+        meet: int,
+        parent: List[np.ndarray],
+        parent_edge: List[np.ndarray],
+        source: int,
+        target: int
+    ) -> Path:
+        """Path through a meeting node, from the parent pointers of both searches"""
+        forward_nodes, forward_edges = [meet], []
+        node = meet
+        while node != source:
+            forward_edges.append(int(parent_edge[0][node]))
+            node = int(parent[0][node])
+            forward_nodes.append(node)
+        backward_nodes, backward_edges = [], []
+        node = meet
+        while node != target:
+            backward_edges.append(int(parent_edge[1][node]))
+            node = int(parent[1][node])
+            backward_nodes.append(node)
+        nodes = tuple(reversed(forward_nodes)) + tuple(backward_nodes)
+        edges = tuple(reversed(forward_edges)) + tuple(backward_edges)
+        return nodes, edges
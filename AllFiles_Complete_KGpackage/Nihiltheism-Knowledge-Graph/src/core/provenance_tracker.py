@@ -3,8 +3,10 @@ Provenance Tracker for AI Brain
 Tracks origin, quality, and validation of all AI-generated content
 """
 from typing import Dict, Any, List, Optional
-from datetime import datetime
 from enum import Enum
+import time
+
+from ..utils.timestamps import iso_timestamp, convert_times
 
 
 class ProvenanceType(Enum):
@@ -39,9 +41,11 @@ class ProvenanceRecord:
         self.provenance_type = provenance_type
         self.quality_level = quality_level
         
+        now = time.time()
+        # Times are epoch seconds, formatted as ISO strings by to_dict
         self.metadata = {
-            'created_at': datetime.now().isoformat(),
-            'last_updated': datetime.now().isoformat(),
+            'created_at': now,
+            'last_updated': now,
             'creator': None,
             'ai_model': None,
             'confidence_score': None,
@@ -56,19 +60,19 @@ class ProvenanceRecord:
         self.metadata['ai_model'] = model
         self.metadata['confidence_score'] = confidence
         self.metadata['reasoning'] = reasoning
-        self.metadata['last_updated'] = datetime.now().isoformat()
+        self.metadata['last_updated'] = time.time()
     
     def add_user_metadata(self, user_id: str, action: str):
         """Add user interaction metadata"""
         self.metadata['creator'] = user_id
         self.metadata['last_user_action'] = action
-        self.metadata['last_updated'] = datetime.now().isoformat()
+        self.metadata['last_updated'] = time.time()
     
     def add_to_lineage(self, action: str, details: Dict[str, Any]):
         """Add an entry to the lineage"""
         lineage_entry = {
             'action': action,
-            'timestamp': datetime.now().isoformat(),
+            'timestamp': time.time(),
             'details': details
         }
         self.lineage.append(lineage_entry)
@@ -79,7 +83,7 @@ class ProvenanceRecord:
             'reviewer': reviewer,
             'rating': rating,  # 1-5
             'notes': notes,
-            'timestamp': datetime.now().isoformat()
+            'timestamp': time.time()
         }
         self.reviews.append(review)
         
@@ -134,9 +138,9 @@ class ProvenanceRecord:
             'provenance_type': self.provenance_type.value,
             'quality_level': self.quality_level.value,
             'quality_score': self.get_quality_score(),
-            'metadata': self.metadata,
-            'lineage': self.lineage,
-            'reviews': self.reviews
+            'metadata': convert_times(self.metadata, ('created_at', 'last_updated'), iso_timestamp),
+            'lineage': [convert_times(entry, ('timestamp',), iso_timestamp) for entry in self.lineage],
+            'reviews': [convert_times(review, ('timestamp',), iso_timestamp) for review in self.reviews]
         }
 
 
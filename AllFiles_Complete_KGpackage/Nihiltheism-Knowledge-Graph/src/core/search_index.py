@@ -0,0 +1,193 @@
+"""
+Search Index for AI Brain
+Inverted full-text index over node labels and descriptions with BM25 ranking,
+field boosting and prefix queries, updated incrementally as graph versions change
+"""
+from typing import Dict, Any, List, Optional, Tuple
+from bisect import bisect_left, insort
+import copy
+import heapq
+import math
+import re
+
+from ..store.graph_store import GraphVersion
+
+TOKEN_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase word tokens"""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class SearchIndex:
+    """
+    BM25F-style inverted index over node fields
+    Each field has its own boost and length normalisation; postings map a term to
+    the per-field term frequencies of every node containing it
+    """
+
+    FIELDS = ('label', 'description')
+
+    def __init__(
+        self,
+        field_boosts: Optional[Dict[str, float]] = None,
+        k1: float = 1.2,
+        b: float = 0.75
+    ):
+        self.field_boosts = field_boosts or {'label': 3.0, 'description': 1.0}
+        self.k1 = k1
+        self.b = b
+
+        # term -> {node_id: (tf per field)}
+        self.postings: Dict[str, Dict[str, Tuple[int, ...]]] = {}
+        # Sorted vocabulary for prefix lookups
+        self.vocabulary: List[str] = []
+        # node_id -> field lengths, and the distinct terms needed to remove the node
+        self.field_lengths: Dict[str, Tuple[int, ...]] = {}
+        self.node_terms: Dict[str, List[str]] = {}
+        self.total_field_lengths = [0] * len(self.FIELDS)
+        self.nodes: Dict[str, Dict[str, Any]] = {}
+        self._bulk_loading = False
+
+    @classmethod
+    def for_graph(cls, graph: GraphVersion) -> 'SearchIndex':
+        """Get the search index of a graph version, updating a copy of the parent version's index if possible"""
+        return graph.derived_incremental('search_index', cls.from_graph, cls._apply_delta)
+
+    @classmethod
+    def from_graph(cls, graph: GraphVersion) -> 'SearchIndex':
+        """Build an index over every node of a graph version"""
+        index = cls()
+        # Sort the vocabulary once at the end instead of inserting term by term
+        index._bulk_loading = True
+        for node in graph.nodes:
+            index.add_node(node)
+        index.vocabulary = sorted(index.postings)
+        index._bulk_loading = False
+        return index
+
+    def copy(self) -> 'SearchIndex':
+        """Copy that can be maintained without changing this index (nodes and term lists are shared)"""
+        index = copy.copy(self)
+        index.postings = {term: dict(posting) for term, posting in self.postings.items()}
+        index.vocabulary = list(self.vocabulary)
+        index.field_lengths = dict(self.field_lengths)
+        index.node_terms = dict(self.node_terms)
+        index.total_field_lengths = list(self.total_field_lengths)
+        index.nodes = dict(self.nodes)
+        return index
+
+    def _apply_delta(self, graph: GraphVersion):
+        """Bring an index built for the parent version up to date with graph.delta"""
+        for node_id in graph.delta['nodes_removed']:
+            self.remove_node(node_id)
+        for node_id in graph.delta['nodes_added'] + graph.delta['nodes_updated']:
+            self.update_node(graph.get_node(node_id))
+
+    # Incremental maintenance
+
+    def add_node(self, node: Dict[str, Any]):
+        """Index a node's label and description"""
+        node_id = node['id']
+        if node_id in self.nodes:
+            self.remove_node(node_id)
+
+        field_tokens = [tokenize(node.get(field) or '') for field in self.FIELDS]
+        frequencies: Dict[str, List[int]] = {}
+        for position, tokens in enumerate(field_tokens):
+            for token in tokens:
+                frequencies.setdefault(token, [0] * len(self.FIELDS))[position] += 1
+
+        for term, tf in frequencies.items():
+            if term not in self.postings:
+                self.postings[term] = {}
+                if not self._bulk_loading:
+                    insort(self.vocabulary, term)
+            self.postings[term][node_id] = tuple(tf)
+
+        lengths = tuple(len(tokens) for tokens in field_tokens)
+        for position, length in enumerate(lengths):
+            self.total_field_lengths[position] += length
+        self.field_lengths[node_id] = lengths
+        self.node_terms[node_id] = list(frequencies)
+        self.nodes[node_id] = node
+
+    def remove_node(self, node_id: str) -> bool:
+        """Remove a node from the index"""
+        if node_id not in self.nodes:
+            return False
+
+        for term in self.node_terms.pop(node_id):
+            posting = self.postings[term]
+            del posting[node_id]
+            if not posting:
+                del self.postings[term]
+                del self.vocabulary[bisect_left(self.vocabulary, term)]
+
+        for position, length in enumerate(self.field_lengths.pop(node_id)):
+            self.total_field_lengths[position] -= length
+        del self.nodes[node_id]
+        return True
+
+    def update_node(self, node: Dict[str, Any]):
+        """Re-index a node after its label or description changed"""
+        self.add_node(node)
+
+    # Querying
+
+    def expand_prefix(self, prefix: str, limit: int = 50) -> List[str]:
+        """Vocabulary terms starting with prefix"""
+        start = bisect_left(self.vocabulary, prefix)
+        terms = []
+        for term in self.vocabulary[start:start + limit]:
+            if not term.startswith(prefix):
+                break
+            terms.append(term)
+        return terms
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[str, float]]:
+        """
+        Rank nodes against a query and return the top-k (node_id, score) pairs
+        A trailing '*' makes a term a prefix query; terms absent from the vocabulary
+        also fall back to prefix matching at a reduced weight
+        """
+        scores: Dict[str, float] = {}
+        for raw_term in query.lower().split():
+            is_prefix = raw_term.endswith('*')
+            for term in tokenize(raw_term):
+                if is_prefix:
+                    expansions = [(expanded, 1.0) for expanded in self.expand_prefix(term)]
+                elif term in self.postings:
+                    expansions = [(term, 1.0)]
+                else:
+                    expansions = [(expanded, 0.5) for expanded in self.expand_prefix(term)]
+
+                for expanded, weight in expansions:
+                    self._score_term(expanded, weight, scores)
+
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    def _score_term(self, term: str, weight: float, scores: Dict[str, float]):
+        """Add a term's BM25F contribution to every node containing it"""
+        posting = self.postings.get(term)
+        if not posting:
+            return
+
+        node_count = len(self.nodes)
+        idf = math.log(1 + (node_count - len(posting) + 0.5) / (len(posting) + 0.5))
+        average_lengths = [
+            total / node_count if node_count else 0
+            for total in self.total_field_lengths
+        ]
+        boosts = [self.field_boosts.get(field, 1.0) for field in self.FIELDS]
+
+        for node_id, tf in posting.items():
+            lengths = self.field_lengths[node_id]
+            weighted_tf = 0.0
+            for position, frequency in enumerate(tf):
+                if frequency:
+                    norm = 1 - self.b + self.b * (lengths[position] / average_lengths[position])
+                    weighted_tf += boosts[position] * frequency / norm
+            score = weight * idf * weighted_tf / (self.k1 + weighted_tf)
+            scores[node_id] = scores.get(node_id, 0.0) + score
@@ -0,0 +1,148 @@
+"""
+Trigram Index for AI Brain
+Trigram posting lists over node labels for substring and
+typo-tolerant (similarity-ranked) lookups without scanning every node
+"""
+from typing import Dict, Any, List, Optional, Set, Tuple
+import copy
+import heapq
+
+from ..store.graph_store import GraphVersion
+from .compact_graph import CompactGraph, normalize
+
+
+def trigrams(text: str) -> Set[str]:
+    """Distinct trigrams of a string"""
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class TrigramIndex:
+    """
+    Trigram index over normalised node labels
+    Labels are padded with a space on each side, so boundary trigrams let short
+    words and word starts take part in similarity ranking
+    """
+
+    def __init__(self):
+        # trigram -> node ids whose padded label contains it
+        self.postings: Dict[str, Set[str]] = {}
+        self.padded_labels: Dict[str, str] = {}
+        self.label_trigrams: Dict[str, Set[str]] = {}
+        self.nodes: Dict[str, Dict[str, Any]] = {}
+
+    @classmethod
+    def for_graph(cls, graph: GraphVersion) -> 'TrigramIndex':
+        """Get the trigram index of a graph version, updating a copy of the parent version's index if possible"""
+        return graph.derived_incremental('trigram_index', cls.from_graph, cls._apply_delta)
+
+    @classmethod
+    def from_graph(cls, graph: GraphVersion) -> 'TrigramIndex':
+        """Build an index over every node label of a graph version, from its precomputed normalised labels"""
+        index = cls()
+        compact = CompactGraph.for_graph(graph)
+        for node, label in zip(graph.nodes, compact.labels_normalized):
+            index.add_node(node, label)
+        return index
+
+    def copy(self) -> 'TrigramIndex':
+        """Copy that can be maintained without changing this index (label trigram sets are shared)"""
+        index = copy.copy(self)
+        index.postings = {gram: set(posting) for gram, posting in self.postings.items()}
+        index.padded_labels = dict(self.padded_labels)
+        index.label_trigrams = dict(self.label_trigrams)
+        index.nodes = dict(self.nodes)
+        return index
+
+    def _apply_delta(self, graph: GraphVersion):
+        """Bring an index built for the parent version up to date with graph.delta"""
+        for node_id in graph.delta['nodes_removed']:
+            self.remove_node(node_id)
+        for node_id in graph.delta['nodes_added'] + graph.delta['nodes_updated']:
+            self.add_node(graph.get_node(node_id))
+
+    # Incremental maintenance
+
+    def add_node(self, node: Dict[str, Any], normalized: Optional[str] = None):
+        """Index a node's label (normalized, if given, is its already normalised label)"""
+        node_id = node['id']
+        if node_id in self.nodes:
+            self.remove_node(node_id)
+
+        if normalized is None:
+            normalized = normalize(node.get('label') or '')
+        padded = f" {normalized} "
+        grams = trigrams(padded)
+        for gram in grams:
+            self.postings.setdefault(gram, set()).add(node_id)
+
+        self.padded_labels[node_id] = padded
+        self.label_trigrams[node_id] = grams
+        self.nodes[node_id] = node
+
+    def remove_node(self, node_id: str) -> bool:
+        """Remove a node from the index"""
+        if node_id not in self.nodes:
+            return False
+
+        for gram in self.label_trigrams.pop(node_id):
+            posting = self.postings[gram]
+            posting.discard(node_id)
+            if not posting:
+                del self.postings[gram]
+
+        del self.padded_labels[node_id]
+        del self.nodes[node_id]
+        return True
+
+    # Querying
+
+    def _intersect(self, grams: Set[str]) -> Set[str]:
+        """Node ids present in every posting list, intersecting smallest lists first"""
+        postings = sorted((self.postings.get(gram, set()) for gram in grams), key=len)
+        if not postings:
+            return set()
+        result = set(postings[0])
+        for posting in postings[1:]:
+            if not result:
+                break
+            result &= posting
+        return result
+
+    def substring(self, query: str) -> List[str]:
+        """Ids of nodes whose label contains query, closest (shortest) labels first and ties by id"""
+        needle = normalize(query)
+        if not needle:
+            return []
+        if len(needle) < 3:
+            candidates = self.nodes.keys()
+        else:
+            candidates = self._intersect(trigrams(needle))
+        matches = [node_id for node_id in candidates if needle in self.padded_labels[node_id]]
+        return sorted(matches, key=lambda node_id: (len(self.padded_labels[node_id]), node_id))
+
+    def similar(
+        self,
+        query: str,
+        k: int = 10,
+        min_similarity: float = 0.3
+    ) -> List[Tuple[str, float]]:
+        """
+        Rank labels by trigram Jaccard similarity to query, tolerating typos
+        Returns up to k (node_id, similarity) pairs above min_similarity, ties ordered by id
+        """
+        grams = trigrams(f" {normalize(query)} ")
+        if not grams:
+            return []
+
+        shared: Dict[str, int] = {}
+        for gram in grams:
+            for node_id in self.postings.get(gram, ()):
+                shared[node_id] = shared.get(node_id, 0) + 1
+
+        scored = []
+        for node_id, count in shared.items():
+            similarity = count / (len(grams) + len(self.label_trigrams[node_id]) - count)
+            if similarity >= min_similarity:
+                scored.append((node_id, similarity))
+
+        return heapq.nsmallest(k, scored, key=lambda item: (-item[1], item[0]))
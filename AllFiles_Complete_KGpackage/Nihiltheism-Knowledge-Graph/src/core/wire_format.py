@@ -0,0 +1,646 @@
+"""
+Wire Format for AI Brain
+Compact binary encoding (tagged values with an inline string table) and gzip/brotli
+compression for graph payloads, negotiated per request and decoded from streams
+"""
+from typing import Dict, Any, List, Optional, Tuple, Union, BinaryIO, Iterable, Iterator
+import gzip
+import io
+import json
+import struct
+import sys
+import zlib
+from array import array
+from itertools import groupby
+
+from flask import Request, Response, request
+from werkzeug.exceptions import BadRequest, RequestEntityTooLarge, UnsupportedMediaType
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always offered
+    brotli = None
+
+JSON_MIMETYPE = 'application/json'
+BINARY_MIMETYPE = 'application/x-kg-binary'
+MAGIC = b'KGB1'
+# Largest decompressed body or socket payload accepted
+MAX_DECODED_SIZE = 64 * 1024 * 1024
+
+# Value tags
+NULL, FALSE, TRUE, INT, FLOAT, STRING_NEW, STRING_REF, STRING_RAW, ARRAY, OBJECT, TABLE = range(11)
+# Column types of a TABLE (an array of objects, in runs of rows with the same keys)
+COLUMN_STRINGS, COLUMN_INTS, COLUMN_FLOATS, COLUMN_VALUES = range(4)
+INT64_MIN, INT64_MAX = -2 ** 63, 2 ** 63 - 1
+
+_FLOAT = struct.Struct('<d')
+
+
+def available_encodings() -> List[str]:
+    """Content codings the server can decode and produce, preferred first"""
+    return ['br', 'gzip'] if brotli is not None else ['gzip']
+
+
+# Binary encoding
+
+class BinaryEncoder:
+    """
+    Encodes JSON-compatible values as tagged binary
+    Short strings (ids, keys, categories, relationships) are written once and then
+    referenced by their position in a string table both sides build as they go.
+    Arrays of objects that mostly share their keys (node and link lists) are written
+    as runs of columns: packed integers, floats or string-table indices per key
+    """
+
+    def __init__(self, intern_limit: int = 64, table_threshold: int = 8):
+        self.intern_limit = intern_limit
+        self.table_threshold = table_threshold
+        self.strings: Dict[str, int] = {}
+        self.out = bytearray(MAGIC)
+
+    def encode(self, value: Any) -> bytes:
+        """Encode one value, returning the complete message"""
+        self._value(value)
+        return bytes(self.out)
+
+    def _varint(self, number: int):
+        """Unsigned LEB128"""
+        while number > 0x7F:
+            self.out.append((number & 0x7F) | 0x80)
+            number >>= 7
+        self.out.append(number)
+
+    def _string(self, text: str):
+        """Write a string, by reference if it was written before"""
+        index = self.strings.get(text)
+        if index is not None:
+            self.out.append(STRING_REF)
+            self._varint(index)
+            return
+        data = text.encode('utf-8')
+        if len(data) <= self.intern_limit:
+            self.strings[text] = len(self.strings)
+            self.out.append(STRING_NEW)
+        else:
+            self.out.append(STRING_RAW)
+        self._varint(len(data))
+        self.out += data
+
+    def _value(self, value: Any):
+        """Write any JSON-compatible value"""
+        if value is None:
+            self.out.append(NULL)
+        elif value is True:
+            self.out.append(TRUE)
+        elif value is False:
+            self.out.append(FALSE)
+        elif isinstance(value, int):
+            self.out.append(INT)
+            # Zigzag, so small negative numbers stay short
+            self._varint(value * 2 if value >= 0 else -value * 2 - 1)
+        elif isinstance(value, float):
+            self.out.append(FLOAT)
+            self.out += _FLOAT.pack(value)
+        elif isinstance(value, str):
+            self._string(value)
+        elif isinstance(value, (list, tuple)):
+            runs = self._table_runs(value)
+            if runs:
+                self._table(runs)
+                return
+            self.out.append(ARRAY)
+            self._varint(len(value))
+            for item in value:
+                self._value(item)
+        elif isinstance(value, dict):
+            self.out.append(OBJECT)
+            self._varint(len(value))
+            for key, item in value.items():
+                self._string(str(key))
+                self._value(item)
+        else:
+            raise TypeError(f"Cannot encode {type(value).__name__} in the binary wire format")
+
+    def _table_runs(self, rows) -> Optional[List[list]]:
+        """Split an array of objects into runs of rows with the same keys, or None if it is not table-like"""
+        if len(rows) < self.table_threshold or not all(isinstance(row, dict) and row for row in rows):
+            return None
+        runs = [list(run) for _, run in groupby(rows, key=tuple)]
+        return runs if len(runs) * self.table_threshold <= len(rows) else None
+
+    def _packed(self, values: array):
+        """Append a packed little-endian array"""
+        if sys.byteorder == 'big':
+            values.byteswap()
+        self.out += values.tobytes()
+
+    def _table(self, runs: List[list]):
+        """Write an array of objects column by column, one run of same-keyed rows at a time"""
+        self.out.append(TABLE)
+        self._varint(len(runs))
+        for rows in runs:
+            self._run(rows)
+
+    def _run(self, rows: list):
+        """Write rows that share their keys as one column per key"""
+        keys = list(rows[0])
+        self._varint(len(rows))
+        self._varint(len(keys))
+        for key in keys:
+            self._string(str(key))
+
+        for key in keys:
+            column = [row[key] for row in rows]
+            types = {type(value) for value in column}
+            if types == {str}:
+                self.out.append(COLUMN_STRINGS)
+                indices = array('I')
+                new_strings = []
+                for text in column:
+                    index = self.strings.get(text)
+                    if index is None:
+                        index = self.strings[text] = len(self.strings)
+                        new_strings.append(text)
+                    indices.append(index)
+                self._varint(len(new_strings))
+                for text in new_strings:
+                    data = text.encode('utf-8')
+                    self._varint(len(data))
+                    self.out += data
+                self._packed(indices)
+            elif types == {int} and INT64_MIN <= min(column) and max(column) <= INT64_MAX:
+                self.out.append(COLUMN_INTS)
+                self._packed(array('q', column))
+            elif types == {float}:
+                self.out.append(COLUMN_FLOATS)
+                self._packed(array('d', column))
+            else:
+                self.out.append(COLUMN_VALUES)
+                for value in column:
+                    self._value(value)
+
+
+class BinaryDecoder:
+    """
+    Decodes the binary wire format incrementally from a byte stream
+    Bytes are pulled through a bounded refill buffer, so a compressed request body is
+    decompressed and decoded as it arrives rather than materialised first; nesting is
+    tracked on an explicit stack instead of by recursion
+    """
+
+    def __init__(self, stream: BinaryIO, max_depth: int = 64, chunk_size: int = 65536):
+        self.stream = stream
+        self.max_depth = max_depth
+        self.chunk_size = chunk_size
+        self.buffer = b''
+        self.position = 0
+        self.exhausted = False
+
+    def _ensure(self, size: int):
+        """Make size bytes available from the current position, unless the stream ends first"""
+        if len(self.buffer) - self.position >= size or self.exhausted:
+            return
+        chunks = [self.buffer[self.position:]]
+        available = len(chunks[0])
+        while available < size:
+            chunk = self.stream.read(max(self.chunk_size, size - available))
+            if not chunk:
+                self.exhausted = True
+                break
+            chunks.append(chunk)
+            available += len(chunk)
+        self.buffer = b''.join(chunks)
+        self.position = 0
+
+    def _take(self, size: int) -> bytes:
+        """Exactly size bytes from the current position"""
+        self._ensure(size)
+        end = self.position + size
+        if end > len(self.buffer):
+            raise EOFError("Binary payload ended unexpectedly")
+        data = self.buffer[self.position:end]
+        self.position = end
+        return data
+
+    def _varint(self) -> int:
+        """Unsigned LEB128 from the current position"""
+        number = shift = 0
+        while True:
+            byte = self._take(1)[0]
+            number |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                return number
+            shift += 7
+
+    def decode(self) -> Any:
+        """Check the header and decode one value"""
+        if self._take(len(MAGIC)) != MAGIC:
+            raise ValueError("Not a binary graph payload")
+        self.strings: List[str] = []
+        return self._read_value(0)
+
+    def _packed(self, typecode: str, count: int) -> array:
+        """Read a packed little-endian array"""
+        values = array(typecode)
+        values.frombytes(self._take(count * values.itemsize))
+        if sys.byteorder == 'big':
+            values.byteswap()
+        return values
+
+    def _table(self, depth: int) -> List[Dict[str, Any]]:
+        """Read a TABLE (after its tag) back into a list of objects"""
+        result: List[Dict[str, Any]] = []
+        for _ in range(self._varint()):
+            result.extend(self._run(depth))
+        return result
+
+    def _run(self, depth: int) -> List[Dict[str, Any]]:
+        """Read one run of same-keyed rows"""
+        rows = self._varint()
+        key_count = self._varint()
+        if not key_count:
+            raise ValueError("Table has no columns")
+        keys = []
+        for _ in range(key_count):
+            key = self._read_value(depth + 1)
+            if not isinstance(key, str):
+                raise ValueError("Object keys must be strings")
+            keys.append(key)
+
+        columns = []
+        for _ in keys:
+            column_type = self._take(1)[0]
+            if column_type == COLUMN_STRINGS:
+                for _ in range(self._varint()):
+                    self.strings.append(self._take(self._varint()).decode('utf-8'))
+                indices = self._packed('I', rows)
+                if indices and max(indices) >= len(self.strings):
+                    raise ValueError("Unknown string reference in table column")
+                strings = self.strings
+                columns.append([strings[index] for index in indices])
+            elif column_type == COLUMN_INTS:
+                columns.append(self._packed('q', rows).tolist())
+            elif column_type == COLUMN_FLOATS:
+                columns.append(self._packed('d', rows).tolist())
+            elif column_type == COLUMN_VALUES:
+                columns.append([self._read_value(depth + 1) for _ in range(rows)])
+            else:
+                raise ValueError(f"Unknown column type {column_type}")
+        return [dict(zip(keys, values)) for values in zip(*columns)]
+
+    def _read_value(self, depth: int) -> Any:
+        """Decode one value starting at the current position"""
+        strings = self.strings
+        # Open containers: [container, items left, is_object, pending key]
+        stack: List[list] = []
+        buffer, position = self.buffer, self.position
+
+        while True:
+            # Keep a tag and a short varint in the buffer; longer reads go through _take
+            if len(buffer) - position < 16 and not self.exhausted:
+                self.position = position
+                self._ensure(16)
+                buffer, position = self.buffer, self.position
+            if position >= len(buffer):
+                raise EOFError("Binary payload ended unexpectedly")
+
+            tag = buffer[position]
+            if STRING_NEW <= tag <= OBJECT or tag == INT:
+                number = buffer[position + 1] if position + 1 < len(buffer) else 0x80
+                if number < 0x80:
+                    position += 2
+                else:
+                    self.position = position + 1
+                    number = self._varint()
+                    buffer, position = self.buffer, self.position
+            else:
+                position += 1
+
+            if tag == STRING_REF:
+                if number >= len(strings):
+                    raise ValueError(f"Unknown string reference {number}")
+                value = strings[number]
+            elif tag == STRING_NEW or tag == STRING_RAW:
+                if position + number <= len(buffer):
+                    value = buffer[position:position + number].decode('utf-8')
+                    position += number
+                else:
+                    self.position = position
+                    value = self._take(number).decode('utf-8')
+                    buffer, position = self.buffer, self.position
+                if tag == STRING_NEW:
+                    strings.append(value)
+            elif tag == INT:
+                value = number // 2 if number % 2 == 0 else -(number + 1) // 2
+            elif tag == ARRAY or tag == OBJECT:
+                if depth + len(stack) >= self.max_depth:
+                    raise ValueError("Binary payload is nested too deeply")
+                container = [] if tag == ARRAY else {}
+                if number:
+                    stack.append([container, number, tag == OBJECT, None])
+                    continue
+                value = container
+            elif tag == NULL:
+                value = None
+            elif tag == TRUE:
+                value = True
+            elif tag == FALSE:
+                value = False
+            elif tag == FLOAT:
+                self.position = position
+                value = _FLOAT.unpack(self._take(8))[0]
+                buffer, position = self.buffer, self.position
+            elif tag == TABLE:
+                if depth + len(stack) >= self.max_depth:
+                    raise ValueError("Binary payload is nested too deeply")
+                self.position = position
+                value = self._table(depth + len(stack))
+                buffer, position = self.buffer, self.position
+            else:
+                raise ValueError(f"Unknown value tag {tag}")
+
+            # Place the value in its container, closing every container it completes
+            while True:
+                if not stack:
+                    self.position = position
+                    return value
+                frame = stack[-1]
+                if frame[2]:
+                    if frame[3] is None:
+                        if not isinstance(value, str) or tag not in (STRING_NEW, STRING_REF, STRING_RAW):
+                            raise ValueError("Object keys must be strings")
+                        frame[3] = value
+                        break
+                    frame[0][frame[3]] = value
+                    frame[3] = None
+                else:
+                    frame[0].append(value)
+                frame[1] -= 1
+                if frame[1]:
+                    break
+                stack.pop()
+                value = frame[0]
+                tag = ARRAY
+
+
+def encode_binary(value: Any) -> bytes:
+    """Encode a JSON-compatible value in the binary wire format"""
+    return BinaryEncoder().encode(value)
+
+
+def decode_binary(data: Union[bytes, BinaryIO]) -> Any:
+    """Decode a binary wire format message from bytes or a readable stream"""
+    return BinaryDecoder(io.BytesIO(data) if isinstance(data, (bytes, bytearray)) else data).decode()
+
+
+# Compression
+
+class _BrotliReader(io.RawIOBase):
+    """
+    Readable stream of brotli-decompressed data
+    Output is produced at most chunk_size bytes at a time where the brotli build supports
+    output_buffer_limit; older builds are fed small input chunks instead
+    """
+
+    def __init__(self, stream: BinaryIO, chunk_size: int = 65536):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.decompressor = brotli.Decompressor()
+        self.bounded = hasattr(self.decompressor, 'can_accept_more_data')
+        self.pending = b''
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self.pending:
+            if self.bounded:
+                if self.decompressor.can_accept_more_data():
+                    chunk = self.stream.read(self.chunk_size)
+                    if not chunk:
+                        return 0
+                else:
+                    chunk = b''
+                self.pending = self.decompressor.process(chunk, output_buffer_limit=self.chunk_size)
+            else:
+                chunk = self.stream.read(1024)
+                if not chunk:
+                    return 0
+                self.pending = self.decompressor.process(chunk)
+        size = min(len(buffer), len(self.pending))
+        buffer[:size] = self.pending[:size]
+        self.pending = self.pending[size:]
+        return size
+
+
+class _SizeLimitedReader(io.RawIOBase):
+    """Readable stream that fails once more than max_size bytes have been read"""
+
+    def __init__(self, stream: BinaryIO, max_size: int):
+        self.stream = stream
+        self.remaining = max_size
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        data = self.stream.read(len(buffer))
+        self.remaining -= len(data)
+        if self.remaining < 0:
+            raise RequestEntityTooLarge("Decoded payload is too large")
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def decoded_stream(stream: BinaryIO, content_encoding: Optional[str], max_size: int) -> BinaryIO:
+    """Wrap a body stream so reads return decompressed bytes, at most max_size of them"""
+    encoding = (content_encoding or 'identity').strip().lower()
+    if encoding == 'gzip':
+        stream = gzip.GzipFile(fileobj=stream, mode='rb')
+    elif encoding == 'br' and brotli is not None:
+        stream = _BrotliReader(stream)
+    elif encoding != 'identity':
+        raise UnsupportedMediaType(f"Unsupported Content-Encoding: {content_encoding}")
+    return io.BufferedReader(_SizeLimitedReader(stream, max_size))
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    """Compress a body with a content coding from available_encodings()"""
+    if encoding == 'br':
+        return brotli.compress(data, quality=5)
+    return gzip.compress(data, compresslevel=6)
+
+
+# Streaming JSON
+
+def iter_json(value: Any, batch_size: int = 256) -> Iterator[str]:
+    """
+    JSON text of a value in pieces: objects and arrays of containers are written member by
+    member, arrays of scalars in batches, so no piece is much larger than one leaf item.
+    Iterators (e.g. generators) are written as arrays, consumed one member at a time
+    """
+    if isinstance(value, dict):
+        yield '{'
+        for i, (key, item) in enumerate(value.items()):
+            yield (',' if i else '') + json.dumps(str(key)) + ':'
+            yield from iter_json(item, batch_size)
+        yield '}'
+    elif isinstance(value, (list, tuple)):
+        yield '['
+        if value and isinstance(value[0], (dict, list, tuple)):
+            for i, item in enumerate(value):
+                if i:
+                    yield ','
+                yield from iter_json(item, batch_size)
+        else:
+            for start in range(0, len(value), batch_size):
+                yield (',' if start else '') + json.dumps(list(value[start:start + batch_size]), default=str, separators=(',', ':'))[1:-1]
+        yield ']'
+    elif isinstance(value, Iterator):
+        yield '['
+        for i, item in enumerate(value):
+            if i:
+                yield ','
+            yield from iter_json(item, batch_size)
+        yield ']'
+    else:
+        yield json.dumps(value, default=str, separators=(',', ':'))
+
+
+def stream_json(value: Any, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+    """UTF-8 JSON of a value as chunks of about chunk_size bytes"""
+    buffer: List[str] = []
+    size = 0
+    for piece in iter_json(value):
+        buffer.append(piece)
+        size += len(piece)
+        if size >= chunk_size:
+            yield ''.join(buffer).encode('utf-8')
+            buffer, size = [], 0
+    if buffer:
+        yield ''.join(buffer).encode('utf-8')
+
+
+def _gzip_chunks(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Gzip a chunked body as it streams"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+# Flask integration
+
+class WireRequest(Request):
+    """
+    Request whose get_json() also accepts binary bodies (Content-Type
+    application/x-kg-binary) and gzip/br Content-Encoding, decoded as the body streams in
+    """
+
+    max_decoded_size = MAX_DECODED_SIZE
+
+    def get_json(self, force: bool = False, silent: bool = False, cache: bool = True) -> Any:
+        binary = self.mimetype == BINARY_MIMETYPE
+        encoding = self.headers.get('Content-Encoding')
+        if not binary and encoding in (None, '', 'identity'):
+            return super().get_json(force=force, silent=silent, cache=cache)
+
+        cached = getattr(self, '_wire_payload', None)
+        if cache and cached is not None:
+            return cached[0]
+        try:
+            stream = decoded_stream(self.stream, encoding, self.max_decoded_size)
+            payload = decode_binary(stream) if binary else json.load(stream)
+        except (ValueError, EOFError, OSError) as e:
+            if silent:
+                return None
+            raise BadRequest(f"Could not decode request body: {e}")
+        if cache:
+            self._wire_payload = (payload,)
+        return payload
+
+
+def negotiate_response(response: Response, min_size: int = 1024) -> Response:
+    """
+    Re-encode JSON responses as binary when the Accept header prefers it, and
+    compress JSON or binary bodies with the best coding in Accept-Encoding
+    """
+    if response.direct_passthrough or response.is_streamed or 'Content-Encoding' in response.headers:
+        return response
+    if response.mimetype not in (JSON_MIMETYPE, BINARY_MIMETYPE):
+        return response
+    response.vary.add('Accept')
+    response.vary.add('Accept-Encoding')
+
+    if response.mimetype == JSON_MIMETYPE and request.accept_mimetypes.best_match([JSON_MIMETYPE, BINARY_MIMETYPE]) == BINARY_MIMETYPE:
+        response.set_data(encode_binary(response.get_json()))
+        response.mimetype = BINARY_MIMETYPE
+
+    encoding = request.accept_encodings.best_match(available_encodings()) if request.accept_encodings else None
+    if encoding and response.content_length and response.content_length >= min_size:
+        response.set_data(compress(response.get_data(), encoding))
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def json_stream_response(value: Any) -> Response:
+    """
+    Streamed JSON response, gzipped on the fly when Accept-Encoding allows
+    Streamed responses bypass negotiate_response, so they are always JSON
+    """
+    chunks = stream_json(value)
+    response = Response(chunks, mimetype=JSON_MIMETYPE)
+    response.vary.add('Accept-Encoding')
+    if request.accept_encodings and request.accept_encodings.best_match(['gzip']) == 'gzip':
+        response.response = _gzip_chunks(chunks)
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+
+def init_wire_format(app):
+    """Enable binary and compressed request and response bodies on a Flask app"""
+    app.request_class = WireRequest
+    app.after_request(negotiate_response)
+
+
+# Socket.IO payloads
+
+def decode_payload(data: Union[Dict[str, Any], bytes], max_size: int = MAX_DECODED_SIZE) -> Tuple[Dict[str, Any], str]:
+    """
+    Decode a socket event payload and report its format so replies can match it
+    Dicts are plain JSON; bytes are binary or JSON, optionally gzip or brotli compressed.
+    Compressed payloads are inflated incrementally and rejected (ValueError) past max_size bytes
+    """
+    if not isinstance(data, (bytes, bytearray)):
+        return data, 'json'
+
+    encoding = None
+    if data[:2] == b'\x1f\x8b':
+        encoding = 'gzip'
+    elif data[:len(MAGIC)] != MAGIC and data[:1] not in (b'{', b'[') and brotli is not None:
+        encoding = 'br'
+    if encoding:
+        try:
+            data = decoded_stream(io.BytesIO(data), encoding, max_size).read()
+        except RequestEntityTooLarge:
+            raise ValueError(f"Decoded payload is larger than {max_size} bytes")
+
+    if data[:len(MAGIC)] == MAGIC:
+        payload, kind = decode_binary(data), 'binary'
+    else:
+        payload, kind = json.loads(data), 'json'
+    return payload, f'{kind}+{encoding}' if encoding else kind
+
+
+def encode_payload(payload: Dict[str, Any], payload_format: str = 'json') -> Union[Dict[str, Any], bytes]:
+    """Encode a socket event payload in a format reported by decode_payload()"""
+    if payload_format == 'json':
+        return payload
+    kind, _, encoding = payload_format.partition('+')
+    if kind == 'binary':
+        data = encode_binary(payload)
+    else:
+        data = json.dumps(payload, separators=(',', ':'), default=str).encode('utf-8')
+    return compress(data, encoding) if encoding else data
@@ -3,8 +3,9 @@ Flask Routes for AI Brain
 Provides REST API and WebSocket endpoints for AI Brain interactions
 """
 from flask import Blueprint, request, jsonify
+from werkzeug.exceptions import HTTPException
 import uuid
-from typing import Dict, Any
+from typing import Dict, Any, Optional, Tuple
 
 ai_brain_bp = Blueprint('ai_brain', __name__)
 
@@ -63,11 +64,11 @@ def register_socketio_handlers(socketio):
 
     @socketio.on('send_message', namespace='/ai_brain')
     def handle_send_message(data):
-        """Handle real-time message to AI Brain"""
+        """Handle real-time message to AI Brain (JSON, or binary / compressed bytes answered in kind)"""
         try:
+            data, payload_format = decode_payload(data)
             session_id = data.get('session_id')
             message = data.get('message')
-            graph_data = data.get('graph_data')
             
             if not session_id or not message:
                 emit('error', {'error': 'session_id and message are required'})
@@ -80,23 +81,124 @@ def register_socketio_handlers(socketio):
                 'status': 'processing'
             }, room=session_id)
             
-            response = brain.process_message(message, graph_data)
+            response = brain.process_message(message, *resolve_request_graph(data))
             
-            emit('message_response', {
+            emit('message_response', encode_payload({
                 'success': True,
                 'session_id': session_id,
                 'response': response,
+                'graph': graph_reference(brain),
                 'context_summary': brain.get_context_summary()
-            }, room=session_id)
+            }, payload_format), room=session_id)
             
+        except GraphNotFoundError as e:
+            emit('error', {'error': str(e), 'code': 'graph_not_found'})
+        except VersionConflictError as e:
+            emit('error', {'error': str(e), 'code': 'version_conflict'})
+        except Exception as e:
+            emit('error', {'error': str(e)})
+
+    @socketio.on('start_expansion', namespace='/ai_brain')
+    def handle_start_expansion(data):
+        """Start a server-side expansion and stream its batches to the caller"""
+        try:
+            data, payload_format = decode_payload(data)
+            job = start_expansion_job(data)
+            sid = request.sid
+            emit('expansion_started', {'success': True, 'job': job.to_dict()})
+            job.subscribe(lambda job, batch: emit_expansion(socketio, sid, job, batch, payload_format))
+        except GraphNotFoundError as e:
+            emit('error', {'error': str(e), 'code': 'graph_not_found'})
+        except KeyError as e:
+            emit('error', {'error': str(e), 'code': 'node_not_found'})
+        except Exception as e:
+            emit('error', {'error': str(e)})
+
+    @socketio.on('watch_expansion', namespace='/ai_brain')
+    def handle_watch_expansion(data):
+        """Stream the batches of an existing expansion job (e.g. one started by the expand intent)"""
+        try:
+            data, payload_format = decode_payload(data)
+        except Exception as e:
+            emit('error', {'error': str(e)})
+            return
+        job = expansion_service.get_job(data.get('job_id'))
+        if not job:
+            emit('error', {'error': 'Expansion job not found', 'code': 'job_not_found'})
+            return
+        sid = request.sid
+        job.subscribe(lambda job, batch: emit_expansion(socketio, sid, job, batch, payload_format))
+
+    @socketio.on('cancel_expansion', namespace='/ai_brain')
+    def handle_cancel_expansion(data):
+        """Cancel an expansion job by id (JSON, or binary / compressed bytes answered in kind)"""
+        try:
+            data, payload_format = decode_payload(data)
         except Exception as e:
             emit('error', {'error': str(e)})
+            return
+        emit('expansion_cancelled', encode_payload({
+            'job_id': data.get('job_id'),
+            'success': expansion_service.cancel(data.get('job_id'))
+        }, payload_format))
+
+
+def emit_expansion(socketio, sid: str, job, batch: Optional[Dict[str, Any]], payload_format: str = 'json'):
+    """Push one expansion batch (or the completion notice) to a socket client, in its payload format"""
+    if batch is None:
+        socketio.emit('expansion_complete', encode_payload({'job': job.to_dict()}, payload_format), namespace='/ai_brain', to=sid)
+    else:
+        socketio.emit('expansion_batch', encode_payload({'job_id': job.id, 'batch': batch}, payload_format), namespace='/ai_brain', to=sid)
 
 
 # REST API Endpoints
 from ..core.ai_brain import create_ai_brain
 from ..core.context_manager import context_store
 from ..core.provenance_tracker import provenance_tracker
+from ..core.expansion_service import expansion_service
+from ..core.wire_format import decode_payload, encode_payload, json_stream_response
+from ..store.graph_store import graph_store, GraphNotFoundError, VersionConflictError
+from ..store.graph_diff import diff_graphs, GraphFingerprint
+from ..core.graph_layout import layout_service
+from ..core.graph_summary import summary_service
+from ..core.ego_network import EgoNetworks
+from ..core.path_finder import PathFinder
+
+
+def resolve_request_graph(data: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], Optional[str], Optional[int]]:
+    """
+    Resolve the graph arguments for a message request
+    Requests reference a stored graph by graph_id and version, optionally with a
+    patch against that version; inline graph_data is still accepted
+    """
+    graph_id = data.get('graph_id')
+    version = data.get('version')
+    
+    if graph_id and data.get('patch'):
+        version = graph_store.apply_patch(graph_id, data['patch'], version).version
+    
+    return data.get('graph_data'), graph_id, version
+
+
+def start_expansion_job(data: Dict[str, Any]):
+    """Start an expansion job for a request naming a stored graph (or inline graph_data) and a seed"""
+    graph = graph_store.resolve(data.get('graph_data'), data.get('graph_id'), data.get('version'))
+    if graph is None:
+        raise GraphNotFoundError('graph_id or graph_data is required')
+    return expansion_service.start(
+        graph,
+        data.get('seed'),
+        data.get('max_depth'),
+        data.get('max_nodes'),
+        data.get('max_edges')
+    )
+
+
+def graph_reference(brain) -> Optional[Dict[str, Any]]:
+    """Reference to the stored graph version a brain answered against"""
+    if brain.graph and brain.graph.graph_id:
+        return brain.graph.reference()
+    return None
 
 
 @ai_brain_bp.route('/brain/session', methods=['POST'])
@@ -126,7 +228,6 @@ def send_message():
         data = request.get_json()
         session_id = data.get('session_id')
         message = data.get('message')
-        graph_data = data.get('graph_data')
         
         if not session_id or not message:
             return jsonify({
@@ -135,13 +236,29 @@ def send_message():
             }), 400
         
         brain = create_ai_brain(session_id)
-        response = brain.process_message(message, graph_data)
+        response = brain.process_message(message, *resolve_request_graph(data))
         
         return jsonify({
             'success': True,
             'response': response,
+            'graph': graph_reference(brain),
             'context_summary': brain.get_context_summary()
         })
+    except GraphNotFoundError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 404
+    except VersionConflictError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 409
+    except HTTPException as e:
+        return jsonify({
+            'success': False,
+            'error': e.description
+        }), e.code
     except Exception as e:
         return jsonify({
             'success': False,
@@ -151,7 +268,11 @@ def send_message():
 
 @ai_brain_bp.route('/brain/context/<session_id>', methods=['GET'])
 def get_context(session_id):
-    """Get conversation context for a session"""
+    """
+    Get conversation context for a session
+    Query: fields (comma-separated), messages_cursor/messages_limit and
+    snapshots_cursor/snapshots_limit for pages, stream=true for a chunked JSON body
+    """
     try:
         context = context_store.get_context(session_id)
         
@@ -161,10 +282,29 @@ def get_context(session_id):
                 'error': 'Session not found'
             }), 404
         
-        return jsonify({
+        fields = request.args.get('fields')
+        stream = request.args.get('stream', '').lower() in ('1', 'true', 'yes')
+        # Streamed pages are serialized item by item as the body is written
+        exported = context.export(
+            [field.strip() for field in fields.split(',') if field.strip()] if fields else None,
+            request.args.get('messages_cursor', type=int),
+            request.args.get('messages_limit', type=int),
+            request.args.get('snapshots_cursor', type=int),
+            request.args.get('snapshots_limit', type=int),
+            lazy=stream
+        )
+        payload = {
             'success': True,
-            'context': context.to_dict()
-        })
+            'context': exported
+        }
+        if stream:
+            return json_stream_response(payload)
+        return jsonify(payload)
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
     except Exception as e:
         return jsonify({
             'success': False,
@@ -204,3 +344,483 @@ def get_capabilities():
             'success': False,
             'error': str(e)
         }), 500
+
+
+@ai_brain_bp.route('/brain/graph', methods=['POST'])
+def create_graph():
+    """Upload a graph to the server-side graph store"""
+    try:
+        data = request.get_json()
+        graph_data = data.get('graph_data')
+        
+        if not graph_data:
+            return jsonify({
+                'success': False,
+                'error': 'graph_data is required'
+            }), 400
+        
+        graph = graph_store.create_graph(graph_data, data.get('graph_id'))
+        
+        return jsonify({
+            'success': True,
+            'graph': graph.reference()
+        })
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 409
+    except HTTPException as e:
+        return jsonify({
+            'success': False,
+            'error': e.description
+        }), e.code
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@ai_brain_bp.route('/brain/graph/<graph_id>', methods=['GET'])
+def get_graph(graph_id):
+    """Get a stored graph, optionally at a specific version"""
+    try:
+        version = request.args.get('version', type=int)
+        graph = graph_store.get_graph(graph_id, version)
+        
+        if not graph:
+            return jsonify({
+                'success': False,
+                'error': 'Graph not found'
+            }), 404
+        
+        return jsonify({
+            'success': True,
+            'graph': graph.reference(),
+            'graph_data': graph.data
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@ai_brain_bp.route('/brain/graph/<graph_id>/diff', methods=['GET'])
+def diff_graph(graph_id):
+    """Patch from one stored version to another (default: to the latest), for client sync"""
+    try:
+        from_version = request.args.get('from', type=int)
+        to_version = request.args.get('to', type=int)
+        
+        if from_version is None:
+            return jsonify({
+                'success': False,
+                'error': 'from version is required'
+            }), 400
+        
+        old = graph_store.get_graph(graph_id, from_version)
+        new = graph_store.get_graph(graph_id, to_version)
+        if not old or not new:
+            return jsonify({
+                'success': False,
+                'error': 'Graph version not found'
+            }), 404
+        
+        return jsonify({
+            'success': True,
+            'from': old.reference(),
+            'graph': new.reference(),
+            'patch': diff_graphs(old, new),
+            'digest': GraphFingerprint.for_graph(new).digest()
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@ai_brain_bp.route('/brain/graph/<graph_id>/layout', methods=['GET'])
+def get_graph_layout(graph_id):
+    """
+    Precomputed node positions of a stored graph version, so the client can skip simulating
+    A large first layout is built in the background: 202 with pending=true until it is ready
+    """
+    try:
+        version = request.args.get('version', type=int)
+        graph = graph_store.get_graph(graph_id, version)
+        
+        if not graph:
+            return jsonify({
+                'success': False,
+                'error': 'Graph not found'
+            }), 404
+        
+        layout = layout_service.layout(graph)
+        if layout is None:
+            return jsonify({
+                'success': True,
+                'graph': graph.reference(),
+                'pending': True
+            }), 202, {'Retry-After': '2'}
+        
+        return jsonify({
+            'success': True,
+            'graph': graph.reference(),
+            'layout': layout.to_dict()
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@ai_brain_bp.route('/brain/graph/<graph_id>/summary', methods=['GET'])
+def get_graph_summary(graph_id):
+    """
+    Coarse view of a stored graph: the top supernodes, or every supernode of one level
+    A large first summary is built in the background: 202 with pending=true until it is ready
+    """
+    try:
+        version = request.args.get('version', type=int)
+        level = request.args.get('level', type=int)
+        graph = graph_store.get_graph(graph_id, version)
+        
+        if not graph:
+            return jsonify({
+                'success': False,
+                'error': 'Graph not found'
+            }), 404
+        
+        summary = summary_service.summary(graph)
+        if summary is None:
+            return jsonify({
+                'success': True,
+                'graph': graph.reference(),
+                'pending': True
+            }), 202, {'Retry-After': '2'}
+        
+        try:
+            view = summary.level(level) if level is not None else summary.overview()
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        
+        return jsonify({
+            'success': True,
+            'graph': graph.reference(),
+            'levels': summary.levels,
+            'summary': view
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@ai_brain_bp.route('/brain/graph/<graph_id>/summary/<cluster_id>', methods=['GET'])
+def expand_graph_summary(graph_id, cluster_id):
+    """Expand one supernode of a stored graph's summary into its children (202 while the summary is pending)"""
+    try:
+        version = request.args.get('version', type=int)
+        graph = graph_store.get_graph(graph_id, version)
+        
+        if not graph:
+            return jsonify({
+                'success': False,
+                'error': 'Graph not found'
+            }), 404
+        
+        summary = summary_service.summary(graph)
+        if summary is None:
+            return jsonify({
+                'success': True,
+                'graph': graph.reference(),
+                'pending': True
+            }), 202, {'Retry-After': '2'}
+        
+        try:
+            expansion = summary.expand(cluster_id)
+        except KeyError:
+            return jsonify({
+                'success': False,
+                'error': f"Supernode '{cluster_id}' not found"
+            }), 404
+        
+        return jsonify({
+            'success': True,
+            'graph': graph.reference(),
+            'summary': expansion
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@ai_brain_bp.route('/brain/graph/<graph_id>', methods=['PUT', 'PATCH'])
+def update_graph(graph_id):
+    """Replace a stored graph (PUT) or apply a patch against a base version (PATCH)"""
+    try:
+        data = request.get_json()
+        
+        if request.method == 'PUT':
+            graph = graph_store.put_graph(graph_id, data.get('graph_data', {}))
+        else:
+            graph = graph_store.apply_patch(
+                graph_id,
+                data.get('patch', {}),
+                data.get('base_version')
+            )
+        
+        return jsonify({
+            'success': True,
+            'graph': graph.reference()
+        })
+    except GraphNotFoundError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 404
+    except VersionConflictError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 409
+    except HTTPException as e:
+        return jsonify({
+            'success': False,
+            'error': e.description
+        }), e.code
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@ai_brain_bp.route('/brain/graph/<graph_id>', methods=['DELETE'])
+def delete_graph(graph_id):
+    """Delete a stored graph and all its versions"""
+    try:
+        if not graph_store.delete_graph(graph_id):
+            return jsonify({
+                'success': False,
+                'error': 'Graph not found'
+            }), 404
+        
+        return jsonify({
+            'success': True
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@ai_brain_bp.route('/brain/expand', methods=['POST'])
+def start_expansion():
+    """Start a bounded server-side expansion from a seed node"""
+    try:
+        data = request.get_json()
+        
+        if not data.get('seed'):
+            return jsonify({
+                'success': False,
+                'error': 'seed is required'
+            }), 400
+        
+        job = start_expansion_job(data)
+        
+        return jsonify({
+            'success': True,
+            'job': job.to_dict()
+        }), 202
+    except GraphNotFoundError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 404
+    except KeyError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 404
+    except HTTPException as e:
+        return jsonify({
+            'success': False,
+            'error': e.description
+        }), e.code
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@ai_brain_bp.route('/brain/subgraph', methods=['POST'])
+def get_subgraph():
+    """k-hop ego network of seed nodes, optionally following only some relationships"""
+    try:
+        data = request.get_json()
+        seeds = data.get('seeds') or ([data['seed']] if data.get('seed') else [])
+        
+        if not seeds:
+            return jsonify({
+                'success': False,
+                'error': 'seeds is required'
+            }), 400
+        
+        graph = graph_store.resolve(data.get('graph_data'), data.get('graph_id'), data.get('version'))
+        if graph is None:
+            raise GraphNotFoundError('graph_id or graph_data is required')
+        
+        subgraph = EgoNetworks.for_graph(graph).query(
+            graph,
+            seeds,
+            data.get('k'),
+            data.get('relationships'),
+            data.get('max_nodes'),
+            data.get('max_edges')
+        )
+        
+        return jsonify({
+            'success': True,
+            'graph': graph.reference() if graph.graph_id else None,
+            'subgraph': subgraph
+        })
+    except GraphNotFoundError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 404
+    except KeyError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 404
+    except HTTPException as e:
+        return jsonify({
+            'success': False,
+            'error': e.description
+        }), e.code
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@ai_brain_bp.route('/brain/paths', methods=['POST'])
+def find_paths():
+    """Shortest and alternative paths between two nodes, to explain how they connect"""
+    try:
+        data = request.get_json()
+        
+        if not data.get('source') or not data.get('target'):
+            return jsonify({
+                'success': False,
+                'error': 'source and target are required'
+            }), 400
+        
+        graph = graph_store.resolve(data.get('graph_data'), data.get('graph_id'), data.get('version'))
+        if graph is None:
+            raise GraphNotFoundError('graph_id or graph_data is required')
+        
+        paths = PathFinder.for_graph(graph).paths(
+            data['source'],
+            data['target'],
+            data.get('k'),
+            data.get('relationship_costs')
+        )
+        
+        return jsonify({
+            'success': True,
+            'graph': graph.reference() if graph.graph_id else None,
+            'paths': paths
+        })
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    except GraphNotFoundError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 404
+    except KeyError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 404
+    except HTTPException as e:
+        return jsonify({
+            'success': False,
+            'error': e.description
+        }), e.code
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@ai_brain_bp.route('/brain/expand/<job_id>', methods=['GET'])
+def get_expansion(job_id):
+    """Get an expansion job's status and the batches produced since a cursor"""
+    try:
+        job = expansion_service.get_job(job_id)
+        
+        if not job:
+            return jsonify({
+                'success': False,
+                'error': 'Expansion job not found'
+            }), 404
+        
+        cursor = request.args.get('since', 0, type=int)
+        batches = job.batches_since(cursor)
+        
+        return jsonify({
+            'success': True,
+            'job': job.to_dict(),
+            'batches': batches,
+            'next': cursor + len(batches)
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@ai_brain_bp.route('/brain/expand/<job_id>', methods=['DELETE'])
+def cancel_expansion(job_id):
+    """Cancel a running expansion job"""
+    try:
+        job = expansion_service.get_job(job_id)
+        
+        if not job:
+            return jsonify({
+                'success': False,
+                'error': 'Expansion job not found'
+            }), 404
+        
+        return jsonify({
+            'success': True,
+            'cancelled': job.cancel(),
+            'job': job.to_dict()
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
@@ -0,0 +1,201 @@
+"""
+Graph Diff for AI Brain
+Content-hash diffs between graph versions, emitted in the graph store's patch format
+so they can be replayed with apply_patch for snapshots, caches and client sync
+"""
+from typing import Dict, Any, List, Optional, Set, Tuple
+import hashlib
+import json
+
+from .graph_store import GraphVersion, link_key
+
+LinkKey = Tuple[str, str, Optional[str]]
+LinkChange = Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]
+
+
+def content_hash(item: Dict[str, Any]) -> str:
+    """Stable 64-bit hash of a node or link's content, independent of key order"""
+    encoded = json.dumps(item, sort_keys=True, separators=(',', ':'), default=str).encode('utf-8')
+    return hashlib.blake2b(encoded, digest_size=8).hexdigest()
+
+
+class GraphFingerprint:
+    """
+    Content hashes of one graph version's nodes and links
+    Hashes are computed on first use and cached, so a diff only hashes what it compares
+    """
+
+    def __init__(self, graph: GraphVersion):
+        self.nodes = graph.node_index
+        self.link_list = graph.links
+        self.node_hashes: Dict[str, str] = {}
+        self.link_hashes: Dict[LinkKey, str] = {}
+        self._links: Optional[Dict[LinkKey, Dict[str, Any]]] = None
+        self._digest: Optional[str] = None
+
+    @classmethod
+    def for_graph(cls, graph: GraphVersion) -> 'GraphFingerprint':
+        """Get the fingerprint of a graph version, creating it on first use"""
+        return graph.derived('fingerprint', cls)
+
+    @property
+    def links(self) -> Dict[LinkKey, Dict[str, Any]]:
+        """Links by (source, target, relationship)"""
+        if self._links is None:
+            self._links = {link_key(link): link for link in self.link_list}
+        return self._links
+
+    def node_hash(self, node_id: str) -> Optional[str]:
+        """Content hash of a node, or None if the version does not have it"""
+        if node_id not in self.node_hashes:
+            node = self.nodes.get(node_id)
+            if node is None:
+                return None
+            self.node_hashes[node_id] = content_hash(node)
+        return self.node_hashes[node_id]
+
+    def link_hash(self, link: Dict[str, Any]) -> str:
+        """Content hash of one of this version's links"""
+        key = link_key(link)
+        if key not in self.link_hashes:
+            self.link_hashes[key] = content_hash(link)
+        return self.link_hashes[key]
+
+    def digest(self) -> str:
+        """Hash of the whole graph, equal for versions with the same content"""
+        if self._digest is None:
+            hasher = hashlib.blake2b(digest_size=16)
+            for node_id in sorted(self.nodes):
+                hasher.update(self.node_hash(node_id).encode('ascii'))
+            for link in sorted(self.link_list, key=lambda link: self.link_hash(link)):
+                hasher.update(self.link_hash(link).encode('ascii'))
+            self._digest = hasher.hexdigest()
+        return self._digest
+
+
+def _chain_changes(
+    old: GraphVersion,
+    new: GraphVersion,
+    max_steps: int = 64
+) -> Optional[Tuple[Set[str], Dict[LinkKey, LinkChange]]]:
+    """
+    Node ids and (old link, new link) pairs touched between two versions on one patch
+    chain, read from the recorded deltas; None if neither descends from the other
+    """
+    if old is new:
+        return set(), {}
+
+    for descendant, ancestor, reverse in ((new, old, False), (old, new, True)):
+        deltas = []
+        version = descendant
+        while version is not None and version is not ancestor and version.delta is not None and len(deltas) < max_steps:
+            deltas.append(version.delta)
+            version = version.parent()
+        if version is not ancestor:
+            continue
+
+        node_ids: Set[str] = set()
+        links: Dict[LinkKey, List[Optional[Dict[str, Any]]]] = {}
+        # Oldest delta first: the first time a link is touched records its old state
+        for delta in reversed(deltas):
+            node_ids.update(delta['nodes_added'], delta['nodes_removed'], delta['nodes_updated'])
+            for link in delta['links_removed']:
+                links.setdefault(link_key(link), [link, None])[1] = None
+            for link in delta['links_added']:
+                links.setdefault(link_key(link), [None, link])[1] = link
+
+        if reverse:
+            return node_ids, {key: (after, before) for key, (before, after) in links.items()}
+        return node_ids, {key: (before, after) for key, (before, after) in links.items()}
+
+    return None
+
+
+def diff_graphs(old: GraphVersion, new: GraphVersion) -> Dict[str, Any]:
+    """
+    Patch that turns old into new, in the graph store's patch format
+    Versions on one patch chain are compared only where their deltas record changes;
+    unrelated versions (full uploads, inline graphs) compare every content hash
+    Modified nodes are sent as an update carrying only the changed attributes, or
+    re-added whole when attributes were dropped; links dropped with a removed node
+    are left implicit, since apply_patch removes dangling links itself
+    """
+    old_prints, new_prints = GraphFingerprint.for_graph(old), GraphFingerprint.for_graph(new)
+    changes = _chain_changes(old, new)
+    if changes is None:
+        node_ids = set(old.node_index) | set(new.node_index)
+        link_changes = {
+            key: (old_prints.links.get(key), new_prints.links.get(key))
+            for key in old_prints.links.keys() | new_prints.links.keys()
+        }
+    else:
+        node_ids, link_changes = changes
+
+    added, updated, removed = [], [], []
+    for node_id in sorted(node_ids):
+        before, after = old.get_node(node_id), new.get_node(node_id)
+        if after is None:
+            if before is not None:
+                removed.append(node_id)
+        elif before is None:
+            added.append(after)
+        elif before is not after and old_prints.node_hash(node_id) != new_prints.node_hash(node_id):
+            if before.keys() <= after.keys():
+                updated.append({'id': node_id, **{
+                    key: value for key, value in after.items()
+                    if key not in before or before[key] != value
+                }})
+            else:
+                added.append(after)
+
+    links_added, links_removed = [], []
+    for key in sorted(link_changes, key=lambda key: (key[0], key[1], key[2] or '')):
+        before, after = link_changes[key]
+        if after is None:
+            if before is not None and key[0] in new.node_index and key[1] in new.node_index:
+                links_removed.append({'source': key[0], 'target': key[1], 'relationship': key[2]})
+        elif before is None or (before is not after and old_prints.link_hash(before) != new_prints.link_hash(after)):
+            links_added.append(after)
+
+    patch: Dict[str, Any] = {}
+    node_patch = {name: items for name, items in (('add', added), ('update', updated), ('remove', removed)) if items}
+    link_patch = {name: items for name, items in (('add', links_added), ('remove', links_removed)) if items}
+    if node_patch:
+        patch['nodes'] = node_patch
+    if link_patch:
+        patch['links'] = link_patch
+    return patch
+
+
+def summarize_patch(
+    patch: Dict[str, Any],
+    base: GraphVersion,
+    new: Optional[GraphVersion] = None
+) -> Dict[str, List[Any]]:
+    """
+    Ids of the nodes and [source, target, relationship] keys of the links a patch changes in base
+    When new (the version the patch leads to) shares a patch chain with base, whether an added
+    link already existed is read from the chain's deltas rather than by indexing every link of base
+    """
+    node_patch = patch.get('nodes', {})
+    link_patch = patch.get('links', {})
+    added_keys = [link_key(link) for link in link_patch.get('add', [])]
+    chain = _chain_changes(base, new) if new is not None else None
+    link_changes = chain[1] if chain is not None else {}
+    if all(key in link_changes for key in added_keys):
+        existing = {key for key in added_keys if link_changes[key][0] is not None}
+    else:
+        base_links = GraphFingerprint.for_graph(base).links
+        existing = {key for key in added_keys if key in base_links}
+    added_links = [list(key) for key in added_keys]
+
+    return {
+        'added_nodes': [node['id'] for node in node_patch.get('add', []) if node['id'] not in base.node_index],
+        'modified_nodes': [node['id'] for node in node_patch.get('update', [])] + [
+            node['id'] for node in node_patch.get('add', []) if node['id'] in base.node_index
+        ],
+        'removed_nodes': list(node_patch.get('remove', [])),
+        'added_edges': [key for key in added_links if tuple(key) not in existing],
+        'modified_edges': [key for key in added_links if tuple(key) in existing],
+        'removed_edges': [list(link_key(link)) for link in link_patch.get('remove', [])]
+    }
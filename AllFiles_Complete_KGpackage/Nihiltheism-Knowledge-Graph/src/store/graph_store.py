@@ -0,0 +1,358 @@
+"""
+Graph Store for AI Brain
+Server-side versioned storage of knowledge graphs, so clients can reference a graph
+by id and version (or send a small patch) instead of uploading the whole graph
+"""
+from typing import Dict, Any, List, Optional, Callable, Tuple
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+import hashlib
+import json
+import threading
+import time
+import uuid
+import weakref
+
+
+class GraphNotFoundError(KeyError):
+    """Raised when a request references an unknown graph or an evicted version"""
+
+
+class VersionConflictError(ValueError):
+    """Raised when a patch is based on a version that is no longer the latest"""
+
+
+def link_key(link: Dict[str, Any]) -> Tuple[str, str, Optional[str]]:
+    """Identity of a link within a graph: (source, target, relationship)"""
+    return (link['source'], link['target'], link.get('relationship'))
+
+
+class GraphVersion:
+    """
+    A single immutable version of a stored graph
+    Derived structures (indexes, analyses) are cached per version via derived()
+    """
+
+    def __init__(
+        self,
+        graph_id: Optional[str],
+        version: int,
+        nodes: List[Dict[str, Any]],
+        links: List[Dict[str, Any]]
+    ):
+        self.graph_id = graph_id
+        self.version = version
+        self.nodes = nodes
+        self.links = links
+        self.data: Dict[str, Any] = {'nodes': nodes, 'links': links}
+        self.node_index: Dict[str, Dict[str, Any]] = {node['id']: node for node in nodes}
+        self.created_at = time.time()
+        self.delta: Optional[Dict[str, List[Any]]] = None
+        self._parent: Optional[weakref.ref] = None
+        self._derived: Dict[str, Any] = {}
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_data(
+        cls,
+        graph_data: Dict[str, Any],
+        graph_id: Optional[str] = None,
+        version: int = 0
+    ) -> 'GraphVersion':
+        """Build a version from graph data in the client JSON schema"""
+        return cls(
+            graph_id,
+            version,
+            list(graph_data.get('nodes', [])),
+            list(graph_data.get('links', []))
+        )
+
+    def get_node(self, node_id: str) -> Optional[Dict[str, Any]]:
+        """Get a node by id"""
+        return self.node_index.get(node_id)
+
+    def parent(self) -> Optional['GraphVersion']:
+        """Version this one was patched from, while it is still alive"""
+        return self._parent() if self._parent else None
+
+    def derived(self, key: str, builder: Callable[['GraphVersion'], Any]) -> Any:
+        """Get a structure derived from this version, building it once on first use"""
+        if key in self._derived:
+            return self._derived[key]
+        with self._lock:
+            if key not in self._derived:
+                self._derived[key] = builder(self)
+            return self._derived[key]
+
+    def cached(self, key: str) -> Any:
+        """Structure derived from this version under key if already built, else None (never builds it)"""
+        return self._derived.get(key)
+
+    def derived_incremental(
+        self,
+        key: str,
+        builder: Callable[['GraphVersion'], Any],
+        updater: Callable[[Any, 'GraphVersion'], None]
+    ) -> Any:
+        """
+        Like derived(), but a structure built for the parent version is copied (with its
+        copy() method) and brought up to date with updater(copy, self) instead of rebuilt
+        The parent's structure is left untouched, since other requests may still be reading it
+        """
+        if key in self._derived:
+            return self._derived[key]
+        with self._lock:
+            if key not in self._derived:
+                parent = self.parent()
+                inherited = parent._derived.get(key) if parent is not None else None
+                if inherited is not None:
+                    structure = inherited.copy()
+                    updater(structure, self)
+                    self._derived[key] = structure
+                else:
+                    self._derived[key] = builder(self)
+            return self._derived[key]
+
+    def apply_patch(self, patch: Dict[str, Any], version: int) -> 'GraphVersion':
+        """Return a new version with the patch applied; this version is left untouched"""
+        node_patch = patch.get('nodes', {})
+        link_patch = patch.get('links', {})
+
+        nodes = dict(self.node_index)
+        changed = set()
+        for node_id in node_patch.get('remove', []):
+            nodes.pop(node_id, None)
+        for update in node_patch.get('update', []):
+            if update['id'] not in nodes:
+                raise KeyError(f"Cannot update missing node '{update['id']}'")
+            nodes[update['id']] = {**nodes[update['id']], **update}
+            changed.add(update['id'])
+        for node in node_patch.get('add', []):
+            nodes[node['id']] = node
+            changed.add(node['id'])
+
+        links = {link_key(link): link for link in self.links}
+        removed_pairs = set()
+        for link in link_patch.get('remove', []):
+            if 'relationship' in link:
+                links.pop(link_key(link), None)
+            else:
+                # Without a relationship, remove every link between the pair
+                removed_pairs.add((link['source'], link['target']))
+        if removed_pairs:
+            links = {
+                key: existing for key, existing in links.items()
+                if key[:2] not in removed_pairs
+            }
+        for link in link_patch.get('add', []):
+            links[link_key(link)] = link
+
+        # Drop links left dangling by removed nodes
+        live_links = [
+            link for link in links.values()
+            if link['source'] in nodes and link['target'] in nodes
+        ]
+
+        patched = GraphVersion(self.graph_id, version, list(nodes.values()), live_links)
+
+        # Record what changed so derived structures can be updated incrementally
+        old_links = {link_key(link): link for link in self.links}
+        new_links = {link_key(link): link for link in live_links}
+        patched.delta = {
+            'nodes_added': [node_id for node_id in changed if node_id not in self.node_index],
+            'nodes_removed': [node_id for node_id in self.node_index if node_id not in nodes],
+            'nodes_updated': [node_id for node_id in changed if node_id in self.node_index],
+            'links_added': [link for key, link in new_links.items() if old_links.get(key) is not link],
+            'links_removed': [link for key, link in old_links.items() if new_links.get(key) is not link]
+        }
+        patched._parent = weakref.ref(self)
+
+        return patched
+
+    def reference(self) -> Dict[str, Any]:
+        """Compact reference returned to clients in place of the graph"""
+        return {
+            'graph_id': self.graph_id,
+            'version': self.version,
+            'node_count': len(self.nodes),
+            'edge_count': len(self.links)
+        }
+
+
+class BackgroundBuilds:
+    """
+    Builds expensive derived structures of graph versions on a worker thread, so a request
+    never blocks on one; callers get None until the structure is ready and simply ask again
+    Builders cache their result on the version (through derived() or derived_incremental())
+    under the key they are requested by
+    """
+
+    def __init__(self, max_workers: int = 1, thread_name_prefix: str = 'derived'):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=thread_name_prefix)
+        self._lock = threading.Lock()
+        # In-flight builds by (graph object id, key); the worker holds the graph alive until done
+        self._pending: Dict[Tuple[int, str], Future] = {}
+
+    def get(
+        self,
+        graph: GraphVersion,
+        key: str,
+        builder: Callable[[GraphVersion], Any],
+        inline: bool = False
+    ) -> Optional[Any]:
+        """The structure derived under key if built (or built now when inline); otherwise start building it and return None"""
+        structure = graph.cached(key)
+        if structure is not None:
+            return structure
+        if inline:
+            return builder(graph)
+
+        pending = (id(graph), key)
+        with self._lock:
+            if pending in self._pending:
+                return None
+            future = self._executor.submit(builder, graph)
+            self._pending[pending] = future
+        future.add_done_callback(lambda _: self._finished(pending))
+        return None
+
+    def _finished(self, pending: Tuple[int, str]):
+        """Forget a finished build (a failed one is retried by the next request)"""
+        with self._lock:
+            self._pending.pop(pending, None)
+
+
+class GraphStore:
+    """Store graphs by id with monotonically increasing versions"""
+
+    def __init__(self, max_versions: int = 5, max_inline: int = 4):
+        self.max_versions = max_versions
+        self.graphs: Dict[str, Dict[int, GraphVersion]] = {}
+        self.latest: Dict[str, int] = {}
+        # Recent inline graphs by content digest, so a client re-sending the same graph
+        # reuses its derived structures instead of rebuilding them per request
+        self.max_inline = max_inline
+        self.inline: 'OrderedDict[str, GraphVersion]' = OrderedDict()
+        self._lock = threading.RLock()
+
+    def create_graph(
+        self,
+        graph_data: Dict[str, Any],
+        graph_id: Optional[str] = None
+    ) -> GraphVersion:
+        """Store a new graph and return its first version"""
+        graph_id = graph_id or str(uuid.uuid4())
+        with self._lock:
+            if graph_id in self.graphs:
+                raise ValueError(f"Graph '{graph_id}' already exists")
+            self.graphs[graph_id] = {}
+            return self._commit(GraphVersion.from_data(graph_data, graph_id, 1))
+
+    def put_graph(self, graph_id: str, graph_data: Dict[str, Any]) -> GraphVersion:
+        """Replace a graph's contents with a full upload, creating a new version"""
+        with self._lock:
+            if graph_id not in self.graphs:
+                return self.create_graph(graph_data, graph_id)
+            version = self.latest[graph_id] + 1
+            return self._commit(GraphVersion.from_data(graph_data, graph_id, version))
+
+    def apply_patch(
+        self,
+        graph_id: str,
+        patch: Dict[str, Any],
+        base_version: Optional[int] = None
+    ) -> GraphVersion:
+        """
+        Apply a patch to the latest version of a graph
+        Raises GraphNotFoundError for unknown graphs and VersionConflictError
+        if base_version is not the latest version
+        """
+        with self._lock:
+            current = self.get_graph(graph_id)
+            if current is None:
+                raise GraphNotFoundError(f"Graph '{graph_id}' not found")
+            if base_version is not None and base_version != current.version:
+                raise VersionConflictError(
+                    f"Version conflict for graph '{graph_id}': "
+                    f"patch is based on {base_version}, latest is {current.version}"
+                )
+            return self._commit(current.apply_patch(patch, current.version + 1))
+
+    def get_graph(self, graph_id: str, version: Optional[int] = None) -> Optional[GraphVersion]:
+        """Get a specific version of a graph, or the latest version"""
+        versions = self.graphs.get(graph_id)
+        if not versions:
+            return None
+        if version is None:
+            version = self.latest[graph_id]
+        return versions.get(version)
+
+    def resolve(
+        self,
+        graph_data: Optional[Dict[str, Any]] = None,
+        graph_id: Optional[str] = None,
+        version: Optional[int] = None,
+        patch: Optional[Dict[str, Any]] = None
+    ) -> Optional[GraphVersion]:
+        """
+        Resolve the graph referenced by a request
+        A graph_id (with optional version or patch) is read from the store; inline
+        graph_data is still accepted and wrapped in an unstored version, shared by
+        requests that send identical graph data
+        """
+        if graph_id:
+            if patch:
+                return self.apply_patch(graph_id, patch, base_version=version)
+            graph = self.get_graph(graph_id, version)
+            if graph is None:
+                raise GraphNotFoundError(f"Graph '{graph_id}' version {version or 'latest'} not found")
+            return graph
+
+        if graph_data:
+            return self._inline_graph(graph_data)
+
+        return None
+
+    def _inline_graph(self, graph_data: Dict[str, Any]) -> GraphVersion:
+        """Unstored version for inline graph data, reused while recent requests send the same data"""
+        digest = hashlib.blake2b(
+            json.dumps(graph_data, separators=(',', ':'), default=str).encode('utf-8'), digest_size=16
+        ).hexdigest()
+        with self._lock:
+            graph = self.inline.get(digest)
+            if graph is not None:
+                self.inline.move_to_end(digest)
+                return graph
+            graph = GraphVersion.from_data(graph_data)
+            self.inline[digest] = graph
+            while len(self.inline) > self.max_inline:
+                self.inline.popitem(last=False)
+            return graph
+
+    def delete_graph(self, graph_id: str) -> bool:
+        """Delete a graph and all its versions"""
+        with self._lock:
+            if graph_id in self.graphs:
+                del self.graphs[graph_id]
+                del self.latest[graph_id]
+                return True
+            return False
+
+    def list_graphs(self) -> List[Dict[str, Any]]:
+        """List references to the latest version of every graph"""
+        return [self.get_graph(graph_id).reference() for graph_id in list(self.latest)]
+
+    def _commit(self, graph: GraphVersion) -> GraphVersion:
+        """Record a new version and evict versions beyond the retention limit"""
+        versions = self.graphs[graph.graph_id]
+        versions[graph.version] = graph
+        self.latest[graph.graph_id] = graph.version
+
+        for old_version in sorted(versions)[:-self.max_versions]:
+            del versions[old_version]
+
+        return graph
+
+
+# Global graph store instance
+graph_store = GraphStore()
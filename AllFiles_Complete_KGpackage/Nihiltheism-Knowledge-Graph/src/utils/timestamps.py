@@ -0,0 +1,24 @@
+"""
+Timestamps for AI Brain
+Core structures store epoch seconds from time.time() and format ISO 8601 strings only
+when they are serialized, so hot paths neither build nor parse date strings
+"""
+from typing import Any, Callable, Dict, Iterable, Optional
+from datetime import datetime
+
+
+def iso_timestamp(epoch: Optional[float]) -> Optional[str]:
+    """ISO 8601 local time of epoch seconds (None stays None)"""
+    return datetime.fromtimestamp(epoch).isoformat() if epoch is not None else None
+
+
+def epoch_timestamp(value: Any) -> Optional[float]:
+    """Epoch seconds of an ISO 8601 string or a number, as read back from serialized data"""
+    if value is None or isinstance(value, (int, float)):
+        return value
+    return datetime.fromisoformat(value).timestamp()
+
+
+def convert_times(item: Dict[str, Any], keys: Iterable[str], convert: Callable[[Any], Any]) -> Dict[str, Any]:
+    """Copy of a dict with those of the given time fields it has passed through convert"""
+    return dict(item, **{key: convert(item[key]) for key in keys if key in item})
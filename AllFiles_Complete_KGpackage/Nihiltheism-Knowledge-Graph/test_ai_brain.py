@@ -5,11 +5,51 @@ Simple test file to validate AI Brain functionality
 
 import sys
 import os
+import gzip
+import json
+import math
+import tempfile
+import threading
+import time
+import numpy as np
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from src.core.ai_brain import AIBrain
-from src.core.context_manager import ConversationContext
+from src.core.context_manager import ConversationContext, Message, MessageHistory, OperationRegistry, CONTEXT_FIELDS, MAX_SNAPSHOTS, PHILOSOPHICAL_KEYWORDS, context_store, estimate_tokens
 from src.core.provenance_tracker import ProvenanceTracker, QualityLevel
+from src.store.graph_store import GraphStore, GraphVersion, VersionConflictError, graph_store
+from src.store.graph_diff import GraphFingerprint, diff_graphs, summarize_patch
+from src.core.compact_graph import CompactGraph
+from src.core.graph_index import AdjacencyIndex
+from src.core.search_index import SearchIndex
+from src.core.trigram_index import TrigramIndex
+from src.core.label_automaton import LabelAutomaton
+from src.core.graph_analytics import GraphAnalytics
+from src.core.graph_metrics import GraphMetrics
+from src.core.community_detection import CommunityDetector, CommunityService, community_suggestions
+from src.core.link_prediction import LinkPredictor
+from src.core.expansion_service import ExpansionService, bounded_bfs
+from src.core.embedding_index import EmbeddingIndex
+from src.core.ego_network import EgoNetworks
+from src.core.path_finder import PathFinder
+from src.core.graph_layout import GraphLayout, LayoutService, _QuadTree
+from src.core.graph_summary import GraphSummary, SummaryService
+from src.utils.timestamps import iso_timestamp, epoch_timestamp
+from src.core.wire_format import BINARY_MIMETYPE, WireRequest, decode_binary, encode_binary, decode_payload, encode_payload, init_wire_format, stream_json
+from src.routes.ai_brain import ai_brain_bp
+
+SAMPLE_GRAPH = {
+    'nodes': [
+        {'id': 'nihiltheism', 'label': 'Nihiltheism', 'description': 'The overarching framework', 'category': 'core'},
+        {'id': 'void', 'label': 'The Void', 'description': 'Fundamental nothingness', 'category': 'core'},
+        {'id': 'anxiety', 'label': 'Existential Anxiety', 'description': 'Dread before nothingness', 'category': 'sub_concept'},
+        {'id': 'cioran', 'label': 'Cioran', 'description': 'Romanian philosopher of despair', 'category': 'thinker'}
+    ],
+    'links': [
+        {'source': 'nihiltheism', 'target': 'void', 'relationship': 'explores'},
+        {'source': 'void', 'target': 'anxiety', 'relationship': 'leads to'}
+    ]
+}
 
 def test_basic_functionality():
     """Test basic AI Brain initialization and message processing"""
@@ -38,6 +78,246 @@ def test_context_manager():
     
     return True
 
+def test_message_history():
+    """Test the ring-buffer message history and compact message records"""
+    print("\n🔁 Testing Message History...")
+    
+    # Wrapping around keeps the newest messages, oldest first
+    history = MessageHistory(3)
+    for i in range(7):
+        history.append(Message('user', f'message {i}', timestamp=float(i)))
+    assert len(history) == 3
+    assert [m.content for m in history] == ['message 4', 'message 5', 'message 6']
+    assert [m.content for m in history.recent(2)] == ['message 5', 'message 6']
+    assert history[0].content == 'message 4' and history[-1].content == 'message 6'
+    assert history.recent(10) == list(history) and history.recent(0) == []
+    try:
+        history[3]
+        assert False, "indexing past the history should raise"
+    except IndexError:
+        pass
+    
+    # Roles are interned and empty metadata is not stored per message
+    role = ''.join(['assis', 'tant'])
+    message = Message(role, 'hello')
+    assert message.role is sys.intern('assistant') and message.metadata is None
+    
+    # Contexts trim to max_history and survive a round trip
+    context = ConversationContext(max_history=5)
+    for i in range(12):
+        context.add_message('user' if i % 2 else 'assistant', f'turn {i}', {'turn': i} if i % 3 == 0 else None)
+    recent = context.get_recent_context(3)
+    assert [m['content'] for m in recent] == ['turn 9', 'turn 10', 'turn 11']
+    assert recent[0]['metadata'] == {'turn': 9} and recent[1]['metadata'] == {}
+    restored = ConversationContext.from_dict(json.loads(json.dumps(context.to_dict())))
+    assert [m.to_dict() for m in restored.messages] == [m.to_dict() for m in context.messages]
+    print(f"✅ Ring buffer kept {len(context.messages)} of 12 messages; round trip preserved them")
+    
+    return True
+
+def test_conversation_summary():
+    """Test the incrementally maintained conversation summary"""
+    print("\n🧾 Testing Conversation Summary...")
+    
+    context = ConversationContext(max_history=4)
+    context.add_message('user', 'The Void and existential anxiety')
+    context.add_message('assistant', 'Anxiety opens onto the void')
+    context.add_message('user', 'What of the divine?')
+    summary = context.get_conversation_summary()
+    assert summary['message_count'] == 3
+    assert summary['topics_discussed'] == ['existential', 'anxiety', 'void', 'divine']
+    
+    # Topics leave the summary once every message mentioning them has been dropped
+    context.add_message('assistant', 'Transcendence through despair')
+    context.add_message('user', 'And nothingness?')
+    assert context.topic_counts['void'] == 1 and context.topic_counts['existential'] == 0
+    context.add_message('assistant', 'Nothingness, again')
+    context.add_message('user', 'Enough')
+    topics = context.get_conversation_summary()['topics_discussed']
+    assert topics == ['nothingness', 'transcendence', 'despair']
+    rescanned = [k for k in PHILOSOPHICAL_KEYWORDS if any(k in m.content.lower() for m in context.messages)]
+    assert topics == rescanned
+    
+    context.track_operation('expand', {'node': 'void'})
+    restored = ConversationContext.from_dict(context.to_dict())
+    assert restored.get_conversation_summary()['topics_discussed'] == rescanned
+    assert restored.get_conversation_summary()['operations_performed'] == 1
+    context.clear_context()
+    assert context.get_conversation_summary()['topics_discussed'] == []
+    print(f"✅ Summary tracked topics {topics} over the last {len(restored.messages)} messages")
+    
+    return True
+
+def test_timestamps():
+    """Test epoch timestamps stored in core structures and formatted on serialization"""
+    print("\n🕰️ Testing Timestamps...")
+    
+    assert iso_timestamp(None) is None and epoch_timestamp(None) is None
+    assert epoch_timestamp(iso_timestamp(1700000000.25)) == 1700000000.25
+    
+    context = ConversationContext()
+    context.add_message('user', 'What is the void?')
+    context.track_operation('analyze', {})
+    context.complete_operation('analyze', {})
+    context.add_graph_snapshot(SAMPLE_GRAPH, 'test')
+    assert isinstance(context.metadata['last_updated'], float)
+    assert context.metadata['last_updated'] == context.messages[-1].timestamp
+    
+    # ISO strings appear only in the serialized form, and parse back to the same epochs
+    data = json.loads(json.dumps(context.to_dict()))
+    assert isinstance(data['metadata']['created_at'], str) and isinstance(data['graph_snapshots'][0]['timestamp'], str)
+    assert isinstance(data['active_operations'][0]['completed_at'], str)
+    restored = ConversationContext.from_dict(data)
+    assert abs(restored.metadata['created_at'] - context.metadata['created_at']) < 1e-3
+    assert abs(restored.active_operations[0]['started_at'] - context.active_operations[0]['started_at']) < 1e-3
+    assert abs(restored.graph_state_snapshots[0]['timestamp'] - context.graph_state_snapshots[0]['timestamp']) < 1e-3
+    
+    tracker = ProvenanceTracker()
+    record = tracker.track_ai_content('void-idea', 'suggestion', 'AI Brain v1.0', 0.8, 'test')
+    record.add_review('reviewer', 4, 'good')
+    assert isinstance(record.metadata['created_at'], float) and isinstance(record.lineage[0]['timestamp'], float)
+    serialized = record.to_dict()
+    assert abs(epoch_timestamp(serialized['reviews'][0]['timestamp']) - record.reviews[0]['timestamp']) < 1e-3
+    assert isinstance(serialized['metadata']['last_updated'], str) and isinstance(record.metadata['last_updated'], float)
+    print(f"✅ Stored epochs serialize as ISO strings, e.g. {serialized['metadata']['created_at']}")
+    
+    return True
+
+def test_context_window():
+    """Test token-budgeted context windows and the summary of evicted history"""
+    print("\n🪟 Testing Context Window...")
+    
+    assert estimate_tokens("What is the void, really?") == 7
+    context = ConversationContext(max_history=6)
+    for i in range(10):
+        context.add_message('user' if i % 2 else 'assistant', f"Turn {i} on the void" + " and despair" * i)
+    messages = list(context.messages)
+    assert [m.tokens for m in messages] == [estimate_tokens(m.content) for m in messages]
+    
+    # The window is the longest run of newest messages that fits
+    budget = messages[-1].tokens + messages[-2].tokens + 1
+    window = context.get_context_window(budget, include_summary=False)
+    assert [m['content'] for m in window['messages']] == [m.content for m in messages[-2:]]
+    assert window['token_count'] == budget - 1 and window['omitted_messages'] == 4
+    assert context.get_context_window(messages[-1].tokens - 1)['messages'] == []
+    
+    # Evicted messages are summarized; the summary joins the window when it still fits
+    summary = context.evicted_summary
+    assert summary.message_count == 4 and summary.user_messages == 2
+    assert 'void' in summary.text and '"Turn 3 on the void' in summary.text
+    full = context.get_context_window(10000)
+    assert full['summary'] == summary.text and len(full['messages']) == 6 and full['summarized_messages'] == 4
+    assert full['token_count'] == summary.tokens + sum(m.tokens for m in messages)
+    
+    restored = ConversationContext.from_dict(json.loads(json.dumps(context.to_dict())))
+    assert restored.evicted_summary.text == summary.text
+    context.clear_context()
+    assert context.get_context_window(100) == {
+        'summary': None, 'messages': [], 'token_count': 0, 'token_budget': 100,
+        'omitted_messages': 0, 'summarized_messages': 0
+    }
+    print(f"✅ Window of {len(full['messages'])} messages and a {summary.tokens}-token summary fit {full['token_count']} tokens")
+    
+    return True
+
+def test_context_export():
+    """Test paged, field-selected and streamed context exports"""
+    print("\n📤 Testing Context Export...")
+    
+    context = ConversationContext(max_history=8)
+    context_store.contexts["test_session_export"] = context
+    graph = GraphVersion.from_data(SAMPLE_GRAPH)
+    for i in range(12):
+        context.add_message('user', f'Question {i} about the void')
+    for i in range(MAX_SNAPSHOTS + 2):
+        graph = graph.apply_patch({'nodes': {'add': [{'id': f'export-{i}', 'label': f'Export {i}'}]}}, i + 1)
+        context.add_graph_snapshot(graph.data, 'test', graph)
+    
+    # Cursors are sequence numbers: walking next_cursor visits every retained message once
+    seen, cursor = [], 0
+    while cursor is not None:
+        page = context.export(['messages'], messages_cursor=cursor, messages_limit=3)
+        assert set(page) == {'messages', 'pages'}
+        seen += [m['content'] for m in page['messages']]
+        cursor = page['pages']['messages']['next_cursor']
+    assert seen == [f'Question {i} about the void' for i in range(4, 12)]
+    
+    snapshots = context.export(['graph_snapshots'], snapshots_cursor=11, snapshots_limit=5)
+    assert len(snapshots['graph_snapshots']) == 1
+    assert snapshots['pages']['graph_snapshots'] == {'cursor': 11, 'next_cursor': None, 'first': 2, 'count': MAX_SNAPSHOTS}
+    assert context.export() == context.to_dict() and set(context.to_dict()) == set(CONTEXT_FIELDS) | {'pages'}
+    lazy = context.export(['messages', 'graph_snapshots'], lazy=True)
+    assert not isinstance(lazy['messages'], list)
+    assert json.loads(b''.join(stream_json(lazy))) == json.loads(json.dumps(context.export(['messages', 'graph_snapshots'])))
+    
+    # A restored context keeps numbering where the export left off, so earlier cursors stay valid
+    restored = ConversationContext.from_dict(json.loads(json.dumps(context.to_dict())))
+    assert restored.export(['messages'], messages_cursor=10)['messages'] == context.export(['messages'], messages_cursor=10)['messages']
+    assert restored.export(['graph_snapshots'], snapshots_cursor=11)['pages'] == snapshots['pages']
+    try:
+        context.export(['messages', 'secrets'])
+        assert False, "unknown fields should raise"
+    except ValueError:
+        pass
+    
+    # The route streams the same document, gzipped when asked
+    from flask import Flask
+    app = Flask(__name__)
+    init_wire_format(app)
+    app.register_blueprint(ai_brain_bp, url_prefix='/api')
+    client = app.test_client()
+    url = '/api/brain/context/test_session_export'
+    plain = client.get(url + '?fields=metadata,messages&messages_limit=2').get_json()
+    streamed = client.get(url + '?fields=metadata,messages&messages_limit=2&stream=true')
+    assert streamed.is_streamed and json.loads(streamed.data) == plain
+    zipped = client.get(url + '?stream=1', headers={'Accept-Encoding': 'gzip'})
+    assert zipped.headers['Content-Encoding'] == 'gzip'
+    assert json.loads(gzip.decompress(zipped.data))['context']['pages']['graph_snapshots']['count'] == MAX_SNAPSHOTS
+    assert client.get(url + '?fields=bogus').status_code == 400
+    
+    value = {'ids': tuple(range(1000)), 'nested': [{'a': [1, 2]}, [3, 'é']], 'empty': [], 'none': None}
+    assert json.loads(b''.join(stream_json(value, chunk_size=16))) == json.loads(json.dumps(value))
+    context_store.delete_context("test_session_export")
+    print(f"✅ Paged {len(seen)} messages three at a time; streamed {len(zipped.data)} gzipped bytes")
+    
+    return True
+
+def test_operation_registry():
+    """Test keyed operations, retention of completed ones and duration statistics"""
+    print("\n⏱️ Testing Operation Registry...")
+    
+    context = ConversationContext()
+    first = context.track_operation('expansion', {'node': 'a'})
+    second = context.track_operation('expansion', {'node': 'b'})
+    analysis = context.track_operation('analysis', {})
+    
+    # Without an id the oldest active operation of the type completes; with one, that operation does
+    assert context.complete_operation('expansion', {'ok': 1})['id'] == first
+    assert context.complete_operation('analysis', {'ok': 2}, operation_id=analysis)['details'] == {}
+    assert context.complete_operation('analysis', {}) is None
+    assert [op['id'] for op in context.operations.active_of_type('expansion')] == [second]
+    assert [op['status'] for op in context.active_operations] == ['completed', 'active', 'completed']
+    
+    # Completed operations are retained up to a bound; statistics keep counting past it
+    registry = OperationRegistry()
+    registry.max_completed = 5
+    for i in range(20):
+        registry.complete(registry.start('search', {'i': i}))
+    assert len(registry.completed) == 5 and registry.get(next(iter(registry.completed)))['details'] == {'i': 15}
+    stats = registry.statistics()['search']
+    assert stats['started'] == stats['completed'] == 20 and stats['active'] == 0
+    assert 0 <= stats['min_duration'] <= stats['mean_duration'] <= stats['max_duration']
+    
+    summary = context.get_conversation_summary()
+    assert summary['operations_performed'] == 3 and summary['operations_active'] == 1
+    
+    restored = ConversationContext.from_dict(context.to_dict())
+    assert restored.operations.statistics() == context.operations.statistics()
+    assert restored.complete_operation('expansion', {})['id'] == second
+    print(f"✅ Retained {len(registry.completed)} of {stats['completed']} completed operations")
+    
+    return True
+
 def test_provenance_tracker():
     """Test content quality tracking"""
     print("\n🔍 Testing Provenance Tracker...")
@@ -53,6 +333,821 @@ def test_provenance_tracker():
     
     return True
 
+def test_graph_store():
+    """Test versioned graph storage and patching"""
+    print("\n🗄️ Testing Graph Store...")
+    
+    store = GraphStore(max_versions=2)
+    graph = store.create_graph(SAMPLE_GRAPH, 'test-graph')
+    assert graph.version == 1
+    
+    patched = store.apply_patch('test-graph', {
+        'nodes': {
+            'add': [{'id': 'despair', 'label': 'Despair', 'category': 'sub_concept'}],
+            'update': [{'id': 'void', 'description': 'The abyss'}],
+            'remove': ['cioran']
+        },
+        'links': {'add': [{'source': 'anxiety', 'target': 'despair', 'relationship': 'leads to'}]}
+    }, base_version=1)
+    assert patched.version == 2
+    assert patched.get_node('void')['description'] == 'The abyss'
+    assert patched.get_node('cioran') is None
+    assert len(patched.links) == 3
+    assert store.get_graph('test-graph', 1).get_node('cioran') is not None
+    
+    try:
+        store.apply_patch('test-graph', {}, base_version=1)
+        assert False, 'stale patch should conflict'
+    except VersionConflictError:
+        pass
+    
+    store.put_graph('test-graph', SAMPLE_GRAPH)
+    assert store.get_graph('test-graph', 1) is None  # evicted beyond max_versions
+    
+    # Inline graphs are shared by content, so their derived structures outlive one request
+    inline = store.resolve(json.loads(json.dumps(SAMPLE_GRAPH)))
+    assert store.resolve(json.loads(json.dumps(SAMPLE_GRAPH))) is inline and inline.graph_id is None
+    assert store.resolve({'nodes': SAMPLE_GRAPH['nodes'][:1], 'links': []}) is not inline
+    
+    stored = graph_store.create_graph(SAMPLE_GRAPH)
+    brain = AIBrain("test-session-graph")
+    response = brain.process_message("Find void", graph_id=stored.graph_id)
+    print(f"✅ Graph store served version {brain.graph.version} with {len(response['results'])} search results")
+    
+    return True
+
+def test_graph_diff():
+    """Test content-hash diffs between graph versions"""
+    print("\n🧮 Testing Graph Diff...")
+    
+    store = GraphStore()
+    base = store.create_graph(SAMPLE_GRAPH, 'diff-graph')
+    store.apply_patch('diff-graph', {
+        'nodes': {'update': [{'id': 'void', 'description': 'The abyss'}], 'remove': ['cioran']}
+    })
+    latest = store.apply_patch('diff-graph', {
+        'nodes': {'add': [{'id': 'dread', 'label': 'Dread', 'description': ''}]},
+        'links': {
+            'add': [{'source': 'anxiety', 'target': 'dread', 'relationship': 'deepens'}],
+            'remove': [{'source': 'nihiltheism', 'target': 'void'}]
+        }
+    })
+    
+    patch = diff_graphs(base, latest)
+    assert patch['nodes'] == {
+        'add': [{'id': 'dread', 'label': 'Dread', 'description': ''}],
+        'update': [{'id': 'void', 'description': 'The abyss'}],
+        'remove': ['cioran']
+    }
+    assert patch['links'] == {
+        'add': [{'source': 'anxiety', 'target': 'dread', 'relationship': 'deepens'}],
+        'remove': [{'source': 'nihiltheism', 'target': 'void', 'relationship': 'explores'}]
+    }
+    
+    # Replaying the patch (or its reverse) reproduces the other version exactly
+    replayed = base.apply_patch(patch, 99)
+    assert GraphFingerprint.for_graph(replayed).digest() == GraphFingerprint.for_graph(latest).digest()
+    reverted = latest.apply_patch(diff_graphs(latest, base), 99)
+    assert GraphFingerprint.for_graph(reverted).digest() == GraphFingerprint.for_graph(base).digest()
+    
+    # Unrelated versions are diffed by content hash; unchanged content gives an empty patch
+    uploaded = store.put_graph('diff-graph', latest.data)
+    assert diff_graphs(latest, uploaded) == {}
+    
+    context = ConversationContext()
+    context.add_graph_snapshot(base.data, 'test', base)
+    context.add_graph_snapshot(latest.data, 'test', latest)
+    changes = context.graph_state_snapshots[-1]['recent_changes']
+    assert changes['modified_nodes'] == ['void'] and changes['added_edges'] == [['anxiety', 'dread', 'deepens']]
+    
+    # Along a patch chain, changed links are classified from the deltas without indexing the base's links
+    renamed = store.apply_patch('diff-graph', {'nodes': {'update': [{'id': 'dread', 'label': 'Deep Dread'}]}})
+    reweighted = store.apply_patch('diff-graph', {'links': {'add': [
+        {'source': 'anxiety', 'target': 'dread', 'relationship': 'deepens', 'weight': 2},
+        {'source': 'dread', 'target': 'void', 'relationship': 'returns to'}
+    ]}})
+    summary = summarize_patch(diff_graphs(renamed, reweighted), renamed, reweighted)
+    assert summary['modified_edges'] == [['anxiety', 'dread', 'deepens']] and summary['added_edges'] == [['dread', 'void', 'returns to']]
+    assert GraphFingerprint.for_graph(renamed)._links is None
+    assert summarize_patch(diff_graphs(renamed, reweighted), renamed) == summary
+    print(f"✅ Diff touched {sum(len(items) for section in patch.values() for items in section.values())} items and replayed exactly")
+    
+    return True
+
+def test_graph_snapshots():
+    """Test delta-encoded graph snapshots and on-demand id set reconstruction"""
+    print("\n📸 Testing Graph Snapshots...")
+    
+    graph = GraphVersion.from_data(SAMPLE_GRAPH)
+    context = ConversationContext()
+    node_sets = []
+    for step in range(MAX_SNAPSHOTS + 3):
+        graph = graph.apply_patch({'nodes': {
+            'add': [{'id': f'concept-{step}', 'label': f'Concept {step}'}],
+            'remove': [f'concept-{step - 2}'] if step >= 2 else []
+        }}, step + 1)
+        context.add_graph_snapshot(graph.data, 'test', graph)
+        node_sets.append(set(graph.node_index))
+    
+    # Only the oldest snapshot holds a full id set; the rest hold one added and one removed id
+    snapshots = context.graph_state_snapshots
+    assert len(snapshots) == MAX_SNAPSHOTS and 'nodes' not in snapshots[0]
+    assert len(snapshots[0]['nodes_added']) == len(node_sets[-MAX_SNAPSHOTS]) and snapshots[0]['nodes_removed'] == ()
+    assert all(len(s['nodes_added']) == 1 and len(s['nodes_removed']) == 1 for s in snapshots[1:])
+    assert [context.snapshot_nodes(i) for i in range(MAX_SNAPSHOTS)] == node_sets[-MAX_SNAPSHOTS:]
+    
+    # Fingerprints identify the id set: equal sets give equal fingerprints
+    same = ConversationContext()
+    same.add_graph_snapshot(graph.data, 'test', graph)
+    assert same.graph_state_snapshots[0]['fingerprint'] == snapshots[-1]['fingerprint']
+    assert len({s['fingerprint'] for s in snapshots}) == MAX_SNAPSHOTS
+    # Snapshotting the same version again records no change
+    same.add_graph_snapshot(graph.data, 'test', graph)
+    assert same.graph_state_snapshots[-1]['nodes_added'] == () and same.graph_state_snapshots[-1]['fingerprint'] == snapshots[-1]['fingerprint']
+    
+    # Ids are interned, so sessions share them rather than holding their own copies
+    copy = json.loads(json.dumps(graph.data))
+    other = ConversationContext()
+    other.add_graph_snapshot(copy, 'test')
+    assert other.graph_state_snapshots[0]['nodes_added'][0] is snapshots[0]['nodes_added'][0]
+    
+    # Sessions hold the previous graph weakly: an inline graph is gone after its snapshot
+    assert other.last_graph is None and context.last_graph is graph
+    other.add_graph_snapshot(SAMPLE_GRAPH, 'test')
+    assert other.graph_state_snapshots[-1]['recent_changes']['node_count_delta'] == len(SAMPLE_GRAPH['nodes']) - len(graph.nodes)
+    
+    # Restored contexts keep diffing by id, with fingerprints recomputed for this process
+    exported = json.loads(json.dumps(context.to_dict()))
+    for snapshot in exported['graph_snapshots']:
+        snapshot['fingerprint'] = '0' * 16
+    restored = ConversationContext.from_dict(exported)
+    assert restored.snapshot_nodes() == node_sets[-1]
+    assert [s['fingerprint'] for s in restored.graph_state_snapshots] == [s['fingerprint'] for s in snapshots]
+    restored.add_graph_snapshot(SAMPLE_GRAPH, 'test')
+    assert sorted(restored.graph_state_snapshots[-1]['recent_changes']['removed_nodes']) == [f'concept-{MAX_SNAPSHOTS + 1}', f'concept-{MAX_SNAPSHOTS + 2}']
+    print(f"✅ Kept {len(snapshots)} snapshots with one full id set of {len(snapshots[0]['nodes_added'])} nodes")
+    
+    return True
+
+def test_compact_graph():
+    """Test the columnar graph model and its JSON round trip"""
+    print("\n🗜️ Testing Compact Graph...")
+    
+    graph_data = {
+        'nodes': SAMPLE_GRAPH['nodes'] + [
+            {'id': 'heidegger', 'label': 'Heidegger', 'category': 'thinker', 'size': 15, 'color': '#10b981', 'era': 'modern'}
+        ],
+        'links': SAMPLE_GRAPH['links'] + [{'source': 'cioran', 'target': 'missing', 'relationship': 'cites'}]
+    }
+    compact = CompactGraph.from_data(graph_data)
+    assert compact.to_data() == graph_data  # extra attributes and dangling links survive
+    assert compact.node_count == 5 and compact.edge_count == 2
+    
+    void = compact.index['void']
+    assert compact.labels_lower[void] == 'the void'
+    assert compact.find_label('EXISTENTIAL anxiety') == compact.index['anxiety']
+    assert compact.category(compact.index['heidegger']) == 'thinker'
+    assert compact.category_counts() == {'core': 2, 'sub_concept': 1, 'thinker': 2}
+    assert compact.relationship(1) == 'leads to' and compact.ids[compact.targets[1]] == 'anxiety'
+    compact.add_node({'id': 'void-2', 'label': 'The VOID'})
+    assert compact.find_label('the void') == void  # the first node wins on duplicate labels
+    
+    # Analyzers share the version's compact form
+    graph = GraphVersion.from_data(graph_data)
+    assert AdjacencyIndex.for_graph(graph).index is CompactGraph.for_graph(graph).index
+    print(f"✅ Compact graph round-tripped {compact.node_count} nodes in {compact.memory_usage()} bytes")
+    
+    return True
+
+def test_adjacency_index():
+    """Test CSR adjacency index lookups"""
+    print("\n🕸️ Testing Adjacency Index...")
+    
+    graph = GraphVersion.from_data(SAMPLE_GRAPH)
+    index = AdjacencyIndex.for_graph(graph)
+    assert index is AdjacencyIndex.for_graph(graph)  # built once per version
+    assert index.degree('void') == 2
+    assert index.isolated_nodes() == ['cioran']
+    assert index.are_connected('anxiety', 'void')
+    assert not index.are_connected('nihiltheism', 'anxiety')
+    assert index.second_degree_neighbors('nihiltheism') == {'anxiety': 1}
+    
+    brain = AIBrain("test-session-adjacency")
+    analysis = brain._analyze_graph_structure(SAMPLE_GRAPH)
+    assert analysis['isolated_nodes'] == ['cioran']
+    assert analysis['avg_connections'] == 4 / 3
+    print(f"✅ Adjacency index built for {index.node_count} nodes and {index.edge_count} edges")
+    
+    return True
+
+def test_search_index():
+    """Test BM25 search with prefix queries and incremental updates"""
+    print("\n🔎 Testing Search Index...")
+    
+    store = GraphStore()
+    graph = store.create_graph(SAMPLE_GRAPH, 'search-graph')
+    index = SearchIndex.for_graph(graph)
+    
+    results = index.search('nothingness')
+    assert [node_id for node_id, _ in results] == ['void', 'anxiety']
+    assert index.search('nihil*')[0][0] == 'nihiltheism'
+    
+    patched = store.apply_patch('search-graph', {
+        'nodes': {
+            'add': [{'id': 'nothing', 'label': 'Nothingness', 'description': ''}],
+            'remove': ['void']
+        }
+    })
+    patched_index = SearchIndex.for_graph(patched)
+    assert patched_index is not index  # a copy is updated; readers of the parent are undisturbed
+    assert patched_index.search('nothingness')[0][0] == 'nothing'
+    assert 'void' not in patched_index.nodes
+    assert [node_id for node_id, _ in index.search('nothingness')] == ['void', 'anxiety']
+    
+    brain = AIBrain("test-session-search")
+    response = brain.process_message("Find existential", SAMPLE_GRAPH)
+    assert response['results'][0]['id'] == 'anxiety'
+    print(f"✅ Search index ranked {len(results)} results for 'nothingness'")
+    
+    return True
+
+def test_trigram_index():
+    """Test trigram substring and fuzzy lookups"""
+    print("\n🔤 Testing Trigram Index...")
+    
+    index = TrigramIndex.for_graph(GraphVersion.from_data(SAMPLE_GRAPH))
+    assert index.substring('theism') == ['nihiltheism']
+    assert index.substring('xyz') == []
+    assert index.similar('Existentail Anxeity', k=1)[0][0] == 'anxiety'
+    
+    # Matches come back in a fixed order: shortest label first, then by id
+    ordered = TrigramIndex.for_graph(GraphVersion.from_data({'nodes': [
+        {'id': node_id, 'label': label} for node_id, label in
+        [('z', 'Void'), ('b', 'The Void Within'), ('a', 'Void Mystic'), ('c', 'The Void')]
+    ], 'links': []}))
+    assert ordered.substring('void') == ['z', 'c', 'a', 'b']
+    assert [node_id for node_id, _ in ordered.similar('void', k=4, min_similarity=0.0)][:1] == ['z']
+    
+    brain = AIBrain("test-session-trigram")
+    assert brain._find_related_concepts('the void of cioran', SAMPLE_GRAPH) == ['The Void', 'Cioran']
+    print(f"✅ Trigram index covers {len(index.postings)} trigrams")
+    
+    return True
+
+def test_label_automaton():
+    """Test single-pass label mention detection"""
+    print("\n🤖 Testing Label Automaton...")
+    
+    graph = GraphVersion.from_data({
+        'nodes': SAMPLE_GRAPH['nodes'] + [{'id': 'anx', 'label': 'Anxiety'}],
+        'links': []
+    })
+    automaton = LabelAutomaton.for_graph(graph)
+    message = 'Expand Existential Anxiety, the Void and Cioranesque thought'
+    assert automaton.mentioned_nodes(message) == ['anxiety', 'void', 'anx']
+    assert automaton.find_mentions('voidness') == []  # whole words only
+    
+    brain = AIBrain("test-session-automaton")
+    assert brain._extract_expansion_target(message, graph.data) == 'Existential Anxiety'
+    print(f"✅ Label automaton built with {len(automaton.goto)} states")
+    
+    return True
+
+def test_graph_analytics():
+    """Test vectorised structural metrics"""
+    print("\n📊 Testing Graph Analytics...")
+    
+    graph = GraphVersion.from_data({
+        'nodes': SAMPLE_GRAPH['nodes'] + [{'id': 'despair', 'label': 'Despair'}],
+        'links': SAMPLE_GRAPH['links'] + [{'source': 'cioran', 'target': 'despair'}]
+    })
+    analytics = GraphAnalytics.for_graph(graph)
+    summary = analytics.summary()
+    assert summary['component_count'] == 2
+    assert summary['component_representatives'] == ['cioran']
+    assert summary['bridging_concepts'] == ['void']
+    assert summary['degree_distribution'] == {1: 4, 2: 1}
+    assert abs(analytics.pagerank.sum() - 1.0) < 1e-6
+    
+    # Long chains: frontiers stay sparse and betweenness stops at max_depth hops
+    chain = GraphVersion.from_data({
+        'nodes': [{'id': f'c{i}'} for i in range(20000)],
+        'links': [{'source': f'c{i}', 'target': f'c{i + 1}'} for i in range(19999)]
+    })
+    chain_analytics = GraphAnalytics.for_graph(chain)
+    assert chain_analytics.core_numbers.max() == 1 and chain_analytics.betweenness.max() > 0
+    
+    brain = AIBrain("test-session-analytics")
+    evaluation = brain._evaluate_graph_quality(graph.data)
+    actions = [suggestion['action'] for suggestion in evaluation['improvements']]
+    assert 'bridge_components' in actions
+    print(f"✅ Graph analytics found {summary['component_count']} components")
+    
+    return True
+
+def test_graph_metrics():
+    """Test incrementally maintained structure metrics"""
+    print("\n📈 Testing Graph Metrics...")
+    
+    store = GraphStore()
+    graph = store.create_graph(SAMPLE_GRAPH, 'metrics-graph')
+    metrics = GraphMetrics.for_graph(graph)
+    assert metrics.structure()['isolated_nodes'] == ['cioran']
+    assert metrics.component_count() == 2  # the isolated node is a component of its own
+    
+    patched = store.apply_patch('metrics-graph', {
+        'nodes': {
+            'add': [{'id': 'despair', 'label': 'Despair', 'category': 'sub_concept'}],
+            'update': [{'id': 'void', 'category': 'sub_concept'}]
+        },
+        'links': {
+            'add': [{'source': 'cioran', 'target': 'despair', 'relationship': 'explores'}],
+            'remove': [{'source': 'void', 'target': 'anxiety'}]
+        }
+    })
+    updated = GraphMetrics.for_graph(patched)
+    assert updated is not metrics and metrics.structure()['node_count'] == 4  # the parent's metrics are untouched
+    assert updated.structure() == GraphMetrics.from_graph(patched).structure()
+    assert updated.structure()['categories'] == {'core': 1, 'sub_concept': 3, 'thinker': 1}
+    assert updated.component_count() == 3
+    assert updated.structure()['isolated_nodes'] == ['anxiety']
+    
+    brain = AIBrain("test-session-metrics")
+    issues = brain._evaluate_graph_quality(patched.data)['issues']
+    assert "Graph is split into 3 disconnected components (1 of them isolated nodes)" in issues
+    
+    # Removing a link on a cycle keeps the components; removing a bridge marks them for a rebuild
+    triangle = GraphMetrics()
+    for node_id in 'abcd':
+        triangle.add_node({'id': node_id})
+    for source, target in ('ab', 'bc', 'ca', 'cd'):
+        triangle.add_link({'source': source, 'target': target})
+    triangle.remove_link({'source': 'a', 'target': 'b'})
+    assert not triangle.components_stale and triangle.component_count() == 1
+    triangle.remove_link({'source': 'c', 'target': 'd'})
+    assert triangle.components_stale and triangle.component_count() == 2  # d is left on its own
+    print(f"✅ Graph metrics maintained across {patched.version} versions")
+    
+    return True
+
+def test_community_detection():
+    """Test community detection and the suggestions built from it"""
+    print("\n🧩 Testing Community Detection...")
+    
+    # Two triangles of core concepts joined by one link, with a thinker inside the first
+    nodes = [{'id': f'c{i}', 'label': f'Concept {i}', 'category': 'core'} for i in range(6)]
+    nodes[0]['category'] = 'thinker'
+    links = [
+        {'source': a, 'target': b, 'relationship': 'relates to'}
+        for a, b in [('c0', 'c1'), ('c1', 'c2'), ('c0', 'c2'), ('c3', 'c4'), ('c4', 'c5'), ('c3', 'c5'), ('c2', 'c3')]
+    ]
+    graph = GraphVersion.from_data({'nodes': nodes, 'links': links})
+    
+    for method in ('louvain', 'label_propagation'):
+        partition = CommunityDetector.for_graph(graph, method)
+        assert sorted(sorted(partition.members(c)) for c in range(len(partition.sizes))) == [
+            ['c0', 'c1', 'c2'], ['c3', 'c4', 'c5']
+        ]
+        assert partition.modularity > 0.3
+        assert CommunityDetector.for_graph(graph, method) is partition  # cached per version
+    
+    # Large graphs run Louvain over label-propagation communities, off the request thread
+    detector = CommunityDetector()
+    detector.coarsen_node_limit = 0
+    assert detector.detect(graph).summary()['community_count'] == 2
+    service = CommunityService()
+    service.inline_node_limit = 0
+    background = GraphVersion.from_data({'nodes': nodes, 'links': links})
+    assert service.partition(background) is None
+    service._executor.shutdown(wait=True)
+    assert service.partition(background) is background.cached('communities:louvain') is not None
+    
+    suggestions = community_suggestions(graph, CommunityDetector.for_graph(graph))
+    recategorize = [s for s in suggestions if s.get('action') == 'recategorize'][0]
+    assert recategorize['details']['nodes'][0]['node'] == 'c0'
+    assert recategorize['details']['nodes'][0]['suggested_category'] == 'core'
+    assert any(s['type'] == 'connection' for s in suggestions)
+    print(f"✅ Found {len(partition.sizes)} communities, {len(suggestions)} suggestions")
+    
+    return True
+
+def test_link_prediction():
+    """Test sparse link prediction scores and the connect intent"""
+    print("\n🔗 Testing Link Prediction...")
+    
+    graph = GraphVersion.from_data(SAMPLE_GRAPH)
+    predictor = LinkPredictor.for_graph(graph)
+    assert LinkPredictor.for_graph(graph) is predictor
+    
+    # Nihiltheism and Existential Anxiety share The Void, which has degree 2
+    scores = predictor.score_pairs([('nihiltheism', 'anxiety'), ('nihiltheism', 'missing')])
+    assert scores[0] == {
+        'common_neighbors': 1.0, 'jaccard': 1.0,
+        'adamic_adar': 1 / math.log(2), 'resource_allocation': 0.5
+    }
+    assert scores[1] is None
+    
+    # Existing links and self-pairs are never candidates
+    assert predictor.top_k(['nihiltheism', 'cioran'], k=5) == {
+        'nihiltheism': [('anxiety', 0.5)],
+        'cioran': []
+    }
+    assert predictor.predict(k=5, metric='jaccard') == [('nihiltheism', 'anxiety', 1.0)]
+    
+    brain = AIBrain("test_session_links")
+    response = brain.process_message("Connect Nihiltheism with Existential Anxiety", SAMPLE_GRAPH)
+    assert response['intent'] == 'connect'
+    assert response['suggestions'][0]['source'] == 'nihiltheism'
+    assert response['suggestions'][0]['target'] == 'anxiety'
+    assert response['suggestions'][0]['scores']['common_neighbors'] == 1.0
+    print(f"✅ Predicted {len(response['suggestions'])} structural connection(s)")
+    
+    return True
+
+def test_expansion_service():
+    """Test bounded server-side expansion jobs"""
+    print("\n🌱 Testing Expansion Service...")
+    
+    graph = GraphVersion.from_data(SAMPLE_GRAPH)
+    batches = list(bounded_bfs(graph, 'nihiltheism', max_depth=2, max_nodes=10, max_edges=10))
+    assert [(b['depth'], [n['id'] for n in b['nodes']]) for b in batches] == [(1, ['void']), (2, ['anxiety'])]
+    assert sum(len(b['edges']) for b in batches) == 2
+    
+    # Budgets are hard limits
+    limited = list(bounded_bfs(graph, 'nihiltheism', max_depth=3, max_nodes=1, max_edges=1))
+    assert sum(len(b['nodes']) for b in limited) == 1
+    assert sum(len(b['edges']) for b in limited) == 1
+    
+    service = ExpansionService(max_workers=1)
+    job = service.start(graph, 'void', max_depth=1)
+    streamed = []
+    job.subscribe(lambda job, batch: streamed.append(batch))
+    for _ in range(100):
+        if job.finished:
+            break
+        time.sleep(0.01)
+    assert job.status == 'completed'
+    assert job.node_count == 2 and streamed[-1] is None
+    assert job.batches_since(0) == streamed[:-1]
+    assert not service.cancel(job.id)  # already finished
+    
+    # A cancelled job stops before expanding any node
+    blocker = threading.Event()
+    service._executor.submit(blocker.wait)
+    cancelled = service.start(graph, 'void')
+    assert service.cancel(cancelled.id)
+    blocker.set()
+    for _ in range(100):
+        if cancelled.finished:
+            break
+        time.sleep(0.01)
+    assert cancelled.status == 'cancelled' and cancelled.node_count == 0
+    assert cancelled.graph is None and cancelled.to_dict()['graph'] == graph.reference()
+    
+    # Finished jobs are dropped once their time-to-live has passed
+    expiring = ExpansionService(max_workers=1, finished_ttl=0)
+    short_lived = expiring.start(graph, 'void', max_depth=1)
+    for _ in range(100):
+        if expiring.get_job(short_lived.id) is None:
+            break
+        time.sleep(0.01)
+    assert short_lived.finished and expiring.get_job(short_lived.id) is None
+    print(f"✅ Expansion job streamed {len(job.batches)} batch(es); cancellation honoured")
+    
+    return True
+
+def test_embedding_index():
+    """Test local semantic lookups, incremental updates and persistence"""
+    print("\n🧬 Testing Embedding Index...")
+    
+    storage_dir = EmbeddingIndex.storage_dir
+    with tempfile.TemporaryDirectory() as directory:
+        EmbeddingIndex.storage_dir = directory
+        try:
+            store = GraphStore()
+            graph = store.create_graph(SAMPLE_GRAPH, 'embedding-graph')
+            index = EmbeddingIndex.for_graph(graph)
+            assert index.query('existential dread and anxiety', k=1)[0][0] == 'anxiety'
+            assert index.similar_nodes('void', k=3)[0][0] != 'void'
+            assert os.path.exists(EmbeddingIndex.storage_path('embedding-graph'))
+            assert EmbeddingIndex.storage_path('a/b') != EmbeddingIndex.storage_path('a_b')
+            
+            patched = store.apply_patch('embedding-graph', {
+                'nodes': {'add': [{'id': 'despair', 'label': 'Despair', 'description': 'Cioran on despair'}]}
+            })
+            patched_index = EmbeddingIndex.for_graph(patched)
+            assert patched_index is not index and 'despair' not in index.rows  # the parent's index is untouched
+            assert patched_index.similar_nodes('despair', k=1)[0][0] == 'cioran'
+            # The embedding matrix is shared; the patched version keeps its changed rows aside
+            assert patched_index.embeddings is index.embeddings and list(patched_index.overrides) == [patched_index.rows['despair']]
+            assert not index.embeddings[patched_index.rows['despair']].any()
+            
+            # LSH candidates find the same nearest neighbour as the exact scan
+            exact = patched_index.query('philosopher of despair', k=1)
+            patched_index.exact_limit = 0
+            assert patched_index.query('philosopher of despair', k=1)[0][0] == exact[0][0]
+            
+            # A fresh process reloads the persisted embeddings
+            patched_index.save(EmbeddingIndex.storage_path('embedding-graph'))
+            reloaded = EmbeddingIndex.from_graph(patched)
+            assert reloaded.rows.keys() == patched_index.rows.keys()
+            assert [n for n, _ in reloaded.query('existential dread', k=2)] == [n for n, _ in patched_index.query('existential dread', k=2)]
+            
+            # Brainstorming over an unstored graph grounds on label trigrams without embedding it
+            brain = AIBrain("test-session-embedding")
+            grounded = brain._ground_in_graph([
+                {'label': 'Existential Anxiety', 'description': 'Dread'},
+                {'label': 'Void Mysticism', 'description': 'Union with the void'}
+            ], SAMPLE_GRAPH)
+            assert [s['label'] for s in grounded] == ['Void Mysticism'] and 'void' in grounded[0]['related_nodes']
+            assert brain.graph.cached('embedding_index') is None
+        finally:
+            EmbeddingIndex.storage_dir = storage_dir
+    print(f"✅ Embedding index answered semantic queries over {len(reloaded.rows)} nodes and reloaded from disk")
+    
+    return True
+
+def test_ego_network():
+    """Test k-hop ego networks with relationship filters, caps and caching"""
+    print("\n🎯 Testing Ego Network...")
+    
+    graph = GraphVersion.from_data(SAMPLE_GRAPH)
+    networks = EgoNetworks.for_graph(graph)
+    one_hop = networks.query(graph, ['void'])
+    assert one_hop['hops'] == {'void': 0, 'nihiltheism': 1, 'anxiety': 1}
+    assert len(one_hop['links']) == 2 and not one_hop['truncated']
+    assert networks.query(graph, ['void']) is one_hop  # cached per query and version
+    
+    # Several seeds, k hops, and only the allowed relationships are followed
+    two_hop = networks.query(graph, ['nihiltheism', 'cioran', 'unknown'], k=2)
+    assert two_hop['hops'] == {'cioran': 0, 'nihiltheism': 0, 'void': 1, 'anxiety': 2}
+    assert two_hop['missing_seeds'] == ['unknown']
+    filtered = networks.query(graph, ['nihiltheism'], k=3, relationships=['explores'])
+    assert set(filtered['hops']) == {'nihiltheism', 'void'}
+    assert [link['relationship'] for link in filtered['links']] == ['explores']
+    
+    # Caps are hard limits and reported
+    capped = networks.query(graph, ['void'], max_nodes=2, max_edges=0)
+    assert len(capped['nodes']) == 2 and capped['links'] == [] and capped['truncated']
+    try:
+        networks.query(graph, ['unknown'])
+        assert False, "unknown seeds should raise"
+    except KeyError:
+        pass
+    
+    # Analysis and expansion responses carry the concept's neighbourhood
+    brain = AIBrain("ego-session")
+    response = brain._handle_expand("Expand on The Void", SAMPLE_GRAPH)
+    assert set(response['neighborhood']['hops']) == {'void', 'nihiltheism', 'anxiety'}
+    print(f"✅ Ego network of 'void' has {len(one_hop['nodes'])} nodes and {len(one_hop['links'])} links")
+    
+    return True
+
+def test_path_finder():
+    """Test shortest and alternative paths, relationship costs and the connect explanation"""
+    print("\n🧭 Testing Path Finder...")
+    
+    # A square with a diagonal tail: two routes of two links from a to c
+    graph = GraphVersion.from_data({
+        'nodes': [{'id': name, 'label': name.upper()} for name in 'abcde'],
+        'links': [
+            {'source': 'a', 'target': 'b', 'relationship': 'critiques'},
+            {'source': 'c', 'target': 'b', 'relationship': 'explores'},
+            {'source': 'a', 'target': 'd', 'relationship': 'explores'},
+            {'source': 'd', 'target': 'c', 'relationship': 'explores'},
+            {'source': 'c', 'target': 'e', 'relationship': 'explores'}
+        ]
+    })
+    finder = PathFinder.for_graph(graph)
+    result = finder.paths('a', 'e', k=5)
+    assert result['distance'] == 3.0
+    assert sorted(path['nodes'] for path in result['paths']) == [['a', 'b', 'c', 'e'], ['a', 'd', 'c', 'e']]
+    assert finder.paths('a', 'e', k=5) is result  # cached per query and version
+    
+    # Pricing a relationship steers the cheapest path away from it
+    priced = finder.paths('a', 'c', k=1, relationship_costs={'critiques': 5})
+    assert priced['paths'][0]['nodes'] == ['a', 'd', 'c'] and priced['distance'] == 2.0
+    assert finder.paths('a', 'a')['paths'][0]['nodes'] == ['a']
+    bad_costs = ({'explores': 0}, {'explores': 'cheap'}, {'explores': float('inf')}, ['explores'])
+    bad_queries = [lambda: finder.paths('a', 'missing')]
+    bad_queries += [lambda costs=costs: finder.paths('a', 'c', relationship_costs=costs) for costs in bad_costs]
+    for bad_query in bad_queries:
+        try:
+            bad_query()
+            assert False, "invalid path queries should raise"
+        except (KeyError, ValueError):
+            pass
+    
+    # Unreachable pairs have no paths
+    isolated = GraphVersion.from_data({'nodes': SAMPLE_GRAPH['nodes'], 'links': SAMPLE_GRAPH['links']})
+    assert PathFinder.for_graph(isolated).paths('cioran', 'void')['paths'] == []
+    linkless = PathFinder.for_graph(GraphVersion.from_data({'nodes': SAMPLE_GRAPH['nodes'], 'links': []}))
+    first, second = SAMPLE_GRAPH['nodes'][0]['id'], SAMPLE_GRAPH['nodes'][1]['id']
+    assert linkless.paths(first, second, relationship_costs={'explores': 2})['paths'] == []
+    
+    brain = AIBrain("test_session_paths")
+    response = brain.process_message("How does Nihiltheism relate to Existential Anxiety?", SAMPLE_GRAPH)
+    connection = response['connection']
+    assert connection['paths'][0]['nodes'] == ['nihiltheism', 'void', 'anxiety']
+    assert connection['explanation'] == 'Nihiltheism explores The Void; The Void leads to Existential Anxiety'
+    print(f"✅ Found {len(result['paths'])} path(s) of {int(result['distance'])} links; explained: {connection['explanation']}")
+    
+    return True
+
+def test_graph_layout():
+    """Test Barnes-Hut forces, cached layouts and incremental placement"""
+    print("\n📐 Testing Graph Layout...")
+    
+    # Barnes-Hut repulsion stays close to the exact all-pairs sum
+    points = np.random.default_rng(0).normal(0, 100, (500, 2))
+    delta = points[:, None, :] - points[None, :, :]
+    distance_squared = (delta ** 2).sum(axis=2)
+    np.fill_diagonal(distance_squared, np.inf)
+    exact = (delta / distance_squared[:, :, None]).sum(axis=1)
+    approximate = _QuadTree(points, 6).repulsion(np.arange(500), 1.0, 1.0)
+    assert np.linalg.norm(approximate - exact, axis=1).mean() < 0.02 * np.linalg.norm(exact, axis=1).mean()
+    
+    # Crowded points get a deeper tree rather than quadratic leaves, and leaf pairs are chunked
+    crowded = np.vstack([points, np.random.default_rng(1).normal(0, 0.01, (2000, 2))])
+    depth = _QuadTree.depth_for(crowded, 16)
+    assert depth > 7 and np.unique(_QuadTree(crowded, depth).codes, return_counts=True)[1].max() <= 16
+    tree = _QuadTree(crowded, depth)
+    assert np.allclose(tree.repulsion(np.arange(500), 1.0, 1.0, pair_budget=64), tree.repulsion(np.arange(500), 1.0, 1.0))
+    
+    # A 10 x 10 grid: neighbours end up much closer than random pairs
+    grid = {
+        'nodes': [{'id': f'{i}-{j}', 'label': f'{i}-{j}'} for i in range(10) for j in range(10)],
+        'links': [{'source': f'{i}-{j}', 'target': f'{i + 1}-{j}'} for i in range(9) for j in range(10)] +
+                 [{'source': f'{i}-{j}', 'target': f'{i}-{j + 1}'} for i in range(10) for j in range(9)]
+    }
+    store = GraphStore()
+    graph = store.create_graph(grid, 'layout-graph')
+    layout = GraphLayout.for_graph(graph)
+    assert layout is GraphLayout.for_graph(graph)  # computed once per version
+    positions = layout.positions
+    edge_length = np.linalg.norm(positions[layout.sources] - positions[layout.targets], axis=1).mean()
+    assert np.isfinite(positions).all()
+    assert edge_length * 3 < np.linalg.norm(positions[:, None] - positions[None, :], axis=2).mean()
+    
+    # Adding a node places it near its neighbour and leaves unrelated nodes alone
+    before = {node_id: layout.position(node_id) for node_id in layout.ids}
+    patched = store.apply_patch('layout-graph', {
+        'nodes': {'add': [{'id': 'corner', 'label': 'Corner'}], 'remove': ['5-5']},
+        'links': {'add': [{'source': 'corner', 'target': '0-0'}]}
+    })
+    patched_layout = GraphLayout.for_graph(patched)
+    assert patched_layout is not layout and layout.position('5-5') is not None  # the parent's layout is untouched
+    moved = [node_id for node_id in patched_layout.ids if node_id in before and patched_layout.position(node_id) != before[node_id]]
+    assert moved == ['0-0']
+    corner, anchor = np.array(patched_layout.position('corner')), np.array(patched_layout.position('0-0'))
+    assert np.linalg.norm(corner - anchor) < 3 * edge_length
+    assert patched_layout.position('5-5') is None
+    
+    drawing = patched_layout.to_dict()
+    assert len(drawing['ids']) == len(drawing['x']) == len(patched.nodes)
+    
+    # Large first layouts are built in the background; patched versions reuse them inline
+    service = LayoutService()
+    service.inline_node_limit = 10
+    background = store.create_graph(grid, 'background-layout-graph')
+    assert service.layout(background) is None and service.layout(background) is None
+    service._executor.shutdown(wait=True)
+    assert service.layout(background) is background.cached('layout') is not None
+    child = store.apply_patch('background-layout-graph', {'nodes': {'add': [{'id': 'extra', 'label': 'Extra'}]}})
+    assert service.layout(child).position('extra') is not None
+    print(f"✅ Layout placed {len(drawing['ids'])} nodes; mean edge length {edge_length:.1f}")
+    
+    return True
+
+def test_graph_summary():
+    """Test the supernode hierarchy, expansion and incremental updates after patches"""
+    print("\n🗺️ Testing Graph Summary...")
+    
+    # 40 dense groups of 20 nodes, joined in a ring by single links
+    groups = {
+        'nodes': [{'id': f'g{g}-{i}', 'label': f'G{g} {i}', 'category': 'thinker' if g % 2 else 'theme'} for g in range(40) for i in range(20)],
+        'links': [{'source': f'g{g}-{i}', 'target': f'g{g}-{j}'} for g in range(40) for i in range(20) for j in range(i + 1, 20) if (i + j) % 3] +
+                 [{'source': f'g{g}-0', 'target': f'g{(g + 1) % 40}-0'} for g in range(40)]
+    }
+    store = GraphStore()
+    graph = store.create_graph(groups, 'summary-graph')
+    summary = GraphSummary.for_graph(graph)
+    assert summary is GraphSummary.for_graph(graph)  # built once per version
+    
+    overview = summary.overview()
+    top = overview['children']
+    assert 1 < len(top) <= GraphSummary.max_children
+    assert sum(node['size'] for node in top) == 800
+    assert sum(edge['weight'] for edge in overview['edges']) + sum(node['internal_links'] for node in top) == len(groups['links'])
+    # Leaf clusters follow the groups
+    leaves = summary.level(1)['supernodes']
+    assert all(len({node_id.split('-')[0] for node_id in summary.clusters[leaf['id']].children}) == 1 for leaf in leaves)
+    assert sum(leaf['categories'].get('thinker', 0) for leaf in leaves) == 400
+    
+    # Expanding down to a leaf reaches nodes and their links
+    cluster = top[0]
+    while cluster['level'] > 1:
+        cluster = summary.expand(cluster['id'])['children'][0]
+    expansion = summary.expand(cluster['id'])
+    assert len(expansion['children']) == cluster['size'] and expansion['edges']
+    try:
+        summary.expand('missing')
+        assert False, "unknown supernodes should raise"
+    except KeyError:
+        pass
+    
+    # A patch updates a copy of the hierarchy; new nodes join their neighbours' cluster
+    leaf_of = summary.node_cluster['g3-1']
+    patched = store.apply_patch('summary-graph', {
+        'nodes': {'add': [{'id': f'new-{i}', 'label': f'New {i}', 'category': 'theme'} for i in range(60)], 'remove': ['g7-5']},
+        'links': {'add': [{'source': f'new-{i}', 'target': 'g3-1'} for i in range(60)]}
+    })
+    patched_summary = GraphSummary.for_graph(patched)
+    assert patched_summary is not summary and summary.root.size == 800 and summary.overview() == overview
+    assert patched_summary.root.size == 859 and 'g7-5' not in patched_summary.node_cluster
+    assert patched_summary.clusters[patched_summary.node_cluster['new-0']].parent == patched_summary.clusters[leaf_of].parent
+    # The overflowing leaf was split, so no leaf grows past twice its bound
+    assert all(len(leaf.children) <= 2 * GraphSummary.leaf_size for leaf in patched_summary.clusters.values() if leaf.level == 1)
+    assert sum(node['size'] for node in patched_summary.overview()['children']) == 859
+    
+    # Large first summaries are built in the background; patched versions update them inline
+    service = SummaryService()
+    service.inline_node_limit = 10
+    background = store.create_graph(groups, 'background-summary-graph')
+    assert service.summary(background) is None and service.summary(background) is None
+    service._executor.shutdown(wait=True)
+    assert service.summary(background) is background.cached('summary') is not None
+    child = store.apply_patch('background-summary-graph', {'nodes': {'remove': ['g0-1']}})
+    assert service.summary(child).root.size == 799
+    print(f"✅ Summary of 800 nodes has {len(top)} supernodes over {summary.levels} levels")
+    
+    return True
+
+def test_wire_format():
+    """Test binary and compressed bodies with content negotiation"""
+    print("\n📦 Testing Wire Format...")
+    
+    graph_data = {
+        'nodes': SAMPLE_GRAPH['nodes'] * 50 + [{'id': 'odd', 'size': 2.5, 'tags': ['a', None, True], 'weight': -2 ** 70}],
+        'links': SAMPLE_GRAPH['links'] * 50
+    }
+    data = encode_binary(graph_data)
+    assert decode_binary(data) == graph_data
+    assert len(data) < len(json.dumps(graph_data))
+    try:
+        decode_binary(data[:-3])
+        assert False, "truncated payload should not decode"
+    except EOFError:
+        pass
+    
+    from flask import Flask, jsonify, request
+    app = Flask(__name__)
+    init_wire_format(app)
+    
+    @app.route('/echo', methods=['POST'])
+    def echo():
+        return jsonify(request.get_json())
+    
+    client = app.test_client()
+    response = client.post('/echo', data=gzip.compress(data), headers={
+        'Content-Type': BINARY_MIMETYPE, 'Content-Encoding': 'gzip',
+        'Accept': BINARY_MIMETYPE, 'Accept-Encoding': 'gzip'
+    })
+    assert response.status_code == 200 and response.mimetype == BINARY_MIMETYPE
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert decode_binary(gzip.decompress(response.data)) == graph_data
+    
+    plain = client.post('/echo', json=SAMPLE_GRAPH)
+    assert plain.get_json() == SAMPLE_GRAPH and 'Content-Encoding' not in plain.headers
+    assert client.post('/echo', data=b'KGB1\xff', content_type=BINARY_MIMETYPE).status_code == 400
+    assert client.post('/echo', data=data, headers={'Content-Encoding': 'zstd'}).status_code == 415
+    
+    # Socket payloads are answered in the format they arrived in
+    payload, payload_format = decode_payload(gzip.compress(data))
+    assert payload == graph_data and payload_format == 'binary+gzip'
+    assert decode_payload(encode_payload(payload, payload_format)) == (graph_data, 'binary+gzip')
+    assert decode_payload({'message': 'hi'}) == ({'message': 'hi'}, 'json')
+    
+    # Compressed socket payloads are inflated incrementally and rejected past the size limit
+    bomb = gzip.compress(b'[' + b' ' * (8 * 1024 * 1024) + b']')
+    try:
+        decode_payload(bomb, max_size=1024 * 1024)
+        assert False, "oversized payload was decoded"
+    except ValueError:
+        pass
+    assert decode_payload(bomb) == ([], 'json+gzip')
+    
+    # Route handlers answer oversized request bodies with 413, not a blanket 500
+    api = Flask(__name__)
+    init_wire_format(api)
+    api.request_class = type('SmallRequest', (WireRequest,), {'max_decoded_size': 1024 * 1024})
+    api.register_blueprint(ai_brain_bp, url_prefix='/api')
+    oversized = api.test_client().post('/api/brain/message', data=bomb, headers={'Content-Type': 'application/json', 'Content-Encoding': 'gzip'})
+    assert oversized.status_code == 413 and oversized.get_json()['success'] is False
+    print(f"✅ Wire format sent {len(json.dumps(graph_data))} bytes of JSON as {len(data)} binary bytes")
+    
+    return True
+
 def main():
     """Run all AI Brain tests"""
     print("🚀 Starting AI Brain Tests...\n")
@@ -60,7 +1155,32 @@ def main():
     try:
         test_basic_functionality()
         test_context_manager()
+        test_message_history()
+        test_conversation_summary()
+        test_timestamps()
+        test_context_window()
+        test_context_export()
+        test_operation_registry()
         test_provenance_tracker()
+        test_graph_store()
+        test_graph_diff()
+        test_graph_snapshots()
+        test_compact_graph()
+        test_adjacency_index()
+        test_search_index()
+        test_trigram_index()
+        test_label_automaton()
+        test_graph_analytics()
+        test_graph_metrics()
+        test_community_detection()
+        test_link_prediction()
+        test_expansion_service()
+        test_embedding_index()
+        test_ego_network()
+        test_path_finder()
+        test_graph_layout()
+        test_graph_summary()
+        test_wire_format()
         
         print("\n🎉 All AI Brain tests completed successfully!")
         print("✅ AI Brain system is ready for use")